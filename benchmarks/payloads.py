@@ -0,0 +1,73 @@
+"""The payloads of the benchmark suite and the rpc functions it calls; the values are fixed,
+so the runs are comparable."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Union
+
+from wwwpy.common.result import Result
+
+
+@dataclass
+class Flat:
+    name: str
+    age: int
+    score: float
+    active: bool
+
+
+@dataclass
+class Address:
+    city: str
+    zip_code: int
+
+
+@dataclass
+class Nested:
+    person: Flat
+    address: Address
+    tags: list[str]
+    scores: dict[str, float]
+    nickname: Optional[str] = None
+
+
+def _flat(i: int) -> Flat:
+    return Flat(f'name-{i}', i % 100, i * 0.5, i % 2 == 0)
+
+
+flat = _flat(1)
+nested = Nested(_flat(1), Address('city', 10000), ['a', 'b', 'c'], {'x': 1.5, 'y': 2.5}, 'nick')
+long_list = [_flat(i) for i in range(1000)]
+unions: list[Union[int, str, Flat]] = [[i, f's{i}', _flat(i)][i % 3] for i in range(300)]
+results: list[Result[Flat, str]] = [Result.success(_flat(i)) if i % 2 else Result.failure(f'error {i}')
+                                    for i in range(300)]
+datetimes = [datetime(2024, 1, 1) + timedelta(minutes=i) for i in range(300)]
+blob = bytes(range(256)) * 256
+
+cases: dict[str, tuple[object, type]] = {
+    'flat': (flat, Flat),
+    'nested': (nested, Nested),
+    'list': (long_list, list[Flat]),
+    'union': (unions, list[Union[int, str, Flat]]),
+    'result': (results, list[Result[Flat, str]]),
+    'datetime': (datetimes, list[datetime]),
+    'bytes': (blob, bytes),
+}
+"""The name of the case: the value and its type"""
+
+
+def echo_flat(value: Flat) -> Flat:
+    return value
+
+
+def echo_nested(value: Nested) -> Nested:
+    return value
+
+
+def echo_list(value: list[Flat]) -> list[Flat]:
+    return value
+
+
+async def echo_list_async(value: list[Flat]) -> list[Flat]:
+    return value
@@ -0,0 +1,65 @@
+"""Micro benchmark of the server side dispatch of an rpc call, with and without the DispatchCache.
+
+Run it from the repository root with:
+    python -m benchmarks.rpc_dispatch_bench
+"""
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from wwwpy.common.http_transport import ServerHttpTransport
+from wwwpy.common.rpc2.default_skeleton import DefaultSkeleton
+from wwwpy.common.rpc2.dispatch_cache import DispatchCache
+from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder
+
+# language=python
+_module_source = '''
+from dataclasses import dataclass
+
+@dataclass
+class Car:
+    name: str
+    year: int
+
+def make(name: str, year: int) -> Car:
+    return Car(name, year)
+'''
+
+
+def _calls_per_second(dispatch_cache_factory, duration: float = 1.0) -> float:
+    encdec = JsonEncoderDecoder()
+    encoder = encdec.encoder()
+    for value, cls in [('bench_rpc_module', str), ('make', str), ('Toyota', str), (2017, int)]:
+        encoder.encode(value, cls)
+    request = encoder.buffer
+    allowed = {'bench_rpc_module'}
+
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            transport = ServerHttpTransport(request)
+            DefaultSkeleton(transport, encdec, allowed, dispatch_cache_factory()).invoke_sync()
+        count += 100
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    folder = Path(tempfile.mkdtemp())
+    (folder / 'bench_rpc_module.py').write_text(_module_source)
+    sys.path.insert(0, str(folder))
+
+    shared = DispatchCache()
+    before = _calls_per_second(DispatchCache)
+    after = _calls_per_second(lambda: shared)
+    print(f'no cache     {before:12,.0f} calls/s')
+    print(f'shared cache {after:12,.0f} calls/s')
+    print(f'speedup      {after / before:12.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Serialization of a list of dataclasses, with the compiled plans and with the generic implementation.
+
+Run it from the repository root with:
+    python -m benchmarks.serialization_bench
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from wwwpy.common.rpc import serialization
+
+
+@dataclass
+class Address:
+    city: str
+    zip_code: int
+
+
+@dataclass
+class Person:
+    name: str
+    age: int
+    score: float
+    address: Address
+    tags: list[str]
+    nickname: Optional[str] = None
+
+
+_cls = list[Person]
+_obj = [Person(f'name-{i}', i % 100, i * 0.5, Address('city', 10000 + i), ['a', 'b'], None if i % 2 else 'nick')
+        for i in range(2000)]
+
+
+def _per_second(func, duration: float = 1.0) -> float:
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while time.perf_counter() < deadline:
+        func()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    generic_path = [f'{_cls}']  # an explicit path selects the generic implementation
+    data = serialization.serialize(_obj, _cls)
+    assert data == serialization.serialize(_obj, _cls, generic_path)
+
+    rows = [
+        ('serialize', lambda: serialization.serialize(_obj, _cls, generic_path),
+         lambda: serialization.serialize(_obj, _cls)),
+        ('deserialize', lambda: serialization.deserialize(data, _cls, generic_path),
+         lambda: serialization.deserialize(data, _cls)),
+    ]
+    print(f'{len(_obj)} dataclasses per operation')
+    for name, generic, plan in rows:
+        before = _per_second(generic)
+        after = _per_second(plan)
+        print(f'{name:12} generic {before:8.1f} ops/s  plan {after:8.1f} ops/s  speedup {after / before:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""The benchmark suite of the serialization and of the rpc stack: serialization.to_json/from_json,
+the JsonEncoderDecoder round trip and the DefaultStub -> DefaultSkeleton round trip over an in-memory transport,
+on the payloads of benchmarks.payloads. Each case reports the ops/s (the best of the repeats, as timeit does)
+and the peak of the memory allocated by one op, traced with tracemalloc.
+
+Run it from the repository root and save the results with:
+    python -m benchmarks.suite --output baseline.json
+after the change, compare with the saved results; it exits with 1 when a case regressed beyond the threshold:
+    python -m benchmarks.suite --compare baseline.json --threshold 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable
+
+from benchmarks import payloads
+from wwwpy.common.http_transport import ServerHttpTransport
+from wwwpy.common.rpc import serialization
+from wwwpy.common.rpc2.default_skeleton import DefaultSkeleton
+from wwwpy.common.rpc2.default_stub import DefaultStub
+from wwwpy.common.rpc2.dispatch_cache import DispatchCache
+from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder, JsonEncoderDecoder
+from wwwpy.common.rpc2.transport import Transport
+from wwwpy.common.rpc2.typed_function import get_typed_function
+
+
+@dataclass(frozen=True)
+class Measure:
+    ops_per_second: float
+    peak_alloc_bytes: int
+    """The peak of the memory allocated while running one op"""
+
+
+@dataclass(frozen=True)
+class Regression:
+    case: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        return self.current / self.baseline - 1 if self.baseline else 0.0
+
+
+def _serialization_cases() -> dict[str, Callable[[], object]]:
+    cases = {}
+    for name, (obj, cls) in payloads.cases.items():
+        text = serialization.to_json(obj, cls)
+        cases[f'to_json[{name}]'] = lambda obj=obj, cls=cls: serialization.to_json(obj, cls)
+        cases[f'from_json[{name}]'] = lambda text=text, cls=cls: serialization.from_json(text, cls)
+    return cases
+
+
+def _encoder_decoder_cases() -> dict[str, Callable[[], object]]:
+    encdec = JsonEncoderDecoder()
+
+    def round_trip(obj, cls):
+        encoder = encdec.encoder()
+        encoder.encode(obj, cls)
+        return encdec.decoder(encoder.buffer).decode(cls)
+
+    return {f'json_encdec[{name}]': lambda obj=obj, cls=cls: round_trip(obj, cls)
+            for name, (obj, cls) in payloads.cases.items()}
+
+
+class _LoopbackTransport(Transport):
+    """Each request is handed to a new DefaultSkeleton, as RpcRoute does for the http requests"""
+
+    def __init__(self, encdec: EncoderDecoder):
+        self._encdec = encdec
+        self._allowed = {payloads.__name__}
+        self._dispatch_cache = DispatchCache()
+        self._response = None
+
+    def _skeleton(self, payload: str | bytes) -> tuple[DefaultSkeleton, ServerHttpTransport]:
+        server = ServerHttpTransport(payload)
+        return DefaultSkeleton(server, self._encdec, self._allowed, self._dispatch_cache), server
+
+    def send_sync(self, payload: str | bytes):
+        skeleton, server = self._skeleton(payload)
+        skeleton.invoke_sync()
+        self._response = server.response
+
+    async def send_async(self, payload: str | bytes):
+        skeleton, server = self._skeleton(payload)
+        await skeleton.invoke_async()
+        self._response = server.response
+
+    def recv_sync(self) -> str | bytes:
+        return self._response
+
+    async def recv_async(self) -> str | bytes:
+        return self._response
+
+
+def _rpc_cases(loop: asyncio.AbstractEventLoop) -> dict[str, Callable[[], object]]:
+    encdec = JsonEncoderDecoder()
+    stub = DefaultStub(_LoopbackTransport(encdec), encdec, payloads.__name__)
+    cases = {}
+    for name, func, arg in [('flat', payloads.echo_flat, payloads.flat),
+                            ('nested', payloads.echo_nested, payloads.nested),
+                            ('list', payloads.echo_list, payloads.long_list)]:
+        cases[f'rpc_sync[{name}]'] = lambda f=get_typed_function(func), arg=arg: stub.invoke_sync(f, [arg])
+    f = get_typed_function(payloads.echo_list_async)
+    cases['rpc_async[list]'] = lambda: loop.run_until_complete(stub.invoke_async(f, [payloads.long_list]))
+    return cases
+
+
+def measure(op: Callable[[], object], repeat: int = 5) -> Measure:
+    """The number of ops of each repeat is chosen by timeit, so each one lasts at least 0.2 seconds"""
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        op()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Measure(number / best, peak - start)
+
+
+def run(selected: str = '', repeat: int = 5, out=sys.stdout) -> dict[str, Measure]:
+    """selected filters the cases, by substring of their name"""
+    loop = asyncio.new_event_loop()
+    try:
+        cases = {**_serialization_cases(), **_encoder_decoder_cases(), **_rpc_cases(loop)}
+        results = {}
+        for name, op in cases.items():
+            if selected not in name:
+                continue
+            results[name] = result = measure(op, repeat)
+            print(f'{name:28} {result.ops_per_second:14,.1f} ops/s {result.peak_alloc_bytes:14,} bytes', file=out)
+        return results
+    finally:
+        loop.close()
+
+
+def save(path: Path, results: dict[str, Measure]):
+    document = {'python': platform.python_version(), 'platform': platform.platform(),
+                'cases': {name: asdict(result) for name, result in results.items()}}
+    path.write_text(json.dumps(document, indent=2))
+
+
+def load(path: Path) -> dict[str, Measure]:
+    return {name: Measure(**result) for name, result in json.loads(path.read_text())['cases'].items()}
+
+
+def compare(baseline: dict[str, Measure], current: dict[str, Measure], threshold: float) -> list[Regression]:
+    """threshold is the tolerated change, e.g., 0.1 tolerates 10% less ops/s and 10% more allocated bytes;
+    the cases missing from either side are not compared"""
+    regressions = []
+    for name in baseline.keys() & current.keys():
+        before, after = baseline[name], current[name]
+        if after.ops_per_second < before.ops_per_second * (1 - threshold):
+            regressions.append(Regression(name, 'ops_per_second', before.ops_per_second, after.ops_per_second))
+        if after.peak_alloc_bytes > before.peak_alloc_bytes * (1 + threshold):
+            regressions.append(Regression(name, 'peak_alloc_bytes', before.peak_alloc_bytes, after.peak_alloc_bytes))
+    return sorted(regressions, key=lambda r: (r.case, r.metric))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Serialization and rpc benchmarks')
+    parser.add_argument('--output', type=Path, help='save the results to this json file')
+    parser.add_argument('--compare', type=Path, help='compare the results with this json file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='tolerated change, default 0.1 (10%%)')
+    parser.add_argument('--filter', default='', help='run only the cases whose name contains this')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.repeat)
+    if args.output:
+        save(args.output, results)
+    if args.compare:
+        regressions = compare(load(args.compare), results, args.threshold)
+        for r in regressions:
+            print(f'REGRESSION {r.case} {r.metric}: {r.baseline:,.1f} -> {r.current:,.1f} ({r.change:+.1%})')
+        if regressions:
+            return 1
+        print(f'No regression beyond {args.threshold:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Bandwidth and CPU of the permessage-deflate compression of the websocket, on the messages of the hot reload:
+the sync_delta2 payloads of DesignerRpc.hotreload_notify_changes, as WebsocketPool.broadcast_rpc encodes them.
+
+Each message is compressed as WsTornado does (see WebsocketCompression): raw deflate with the context kept
+between the messages of the connection, a sync flush per message, and the messages below min_size sent as they are.
+Run it from the repository root with:
+    python -m benchmarks.websocket_compression_bench
+the project of the messages is the wwwpy package itself, the saved files are its modules, one per message.
+"""
+from __future__ import annotations
+
+import time
+import zlib
+from pathlib import Path
+
+import wwwpy
+from wwwpy.common.filesystem import sync
+from wwwpy.common.filesystem.sync import sync_delta2
+from wwwpy.common.rpc.serializer import RpcRequest
+
+_levels = [1, 6, 9]
+_min_sizes = [0, 256, 1024, 4096]
+
+
+def _messages(directory: Path) -> list[bytes]:
+    """One hot reload message per module of the directory, as if each one were saved once"""
+    messages = []
+    for path in sorted(directory.rglob('*.py')):
+        payload = sync_delta2.sync_source(directory, [sync.Event('modified', False, str(path))])
+        message = RpcRequest.to_json('wwwpy.remote.designer.rpc', 'DesignerRpc.hotreload_notify_changes',
+                                     True, payload)
+        messages.append(message.encode())
+    return messages
+
+
+def _compress(messages: list[bytes], level: int, min_size: int) -> tuple[int, float]:
+    """The bytes sent and the seconds spent compressing"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, 8)
+    sent = 0
+    start = time.perf_counter()
+    for message in messages:
+        if len(message) < min_size:
+            sent += len(message)
+        else:
+            sent += len(compressor.compress(message) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4  # the tail is cut
+    return sent, time.perf_counter() - start
+
+
+def main():
+    messages = _messages(Path(wwwpy.__file__).parent)
+    total = sum(len(m) for m in messages)
+    sizes = sorted(len(m) for m in messages)
+    print(f'{len(messages)} messages, {total:,} bytes, median {sizes[len(sizes) // 2]:,} bytes')
+    print(f'{"level":>5} {"min_size":>8} {"sent bytes":>12} {"ratio":>6} {"cpu ms":>8} {"us/message":>10}')
+    print(f'{"-":>5} {"-":>8} {total:12,} {1:6.2f} {0:8.2f} {0:10.1f}')
+    for level in _levels:
+        for min_size in _min_sizes:
+            sent, seconds = min(_compress(messages, level, min_size) for _ in range(5))
+            print(f'{level:5} {min_size:8} {sent:12,} {sent / total:6.2f} {seconds * 1000:8.2f} '
+                  f'{seconds * 1e6 / len(messages):10.1f}')
+
+
+if __name__ == '__main__':
+    main()
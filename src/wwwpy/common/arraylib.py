@@ -0,0 +1,80 @@
+"""Numeric arrays, array.array and numpy.ndarray, as raw little-endian buffers with their dtype and shape.
+
+They are converted in bulk, with no loop over the elements: an array.array is copied once from the buffer,
+a numpy.ndarray is a view of it (read-only when the buffer is). numpy is optional, it is never imported here
+unless a numpy type is given.
+"""
+from __future__ import annotations
+
+import array
+import sys
+import typing
+from dataclasses import dataclass
+
+_typecodes = 'bBhHiIlLqQfd'
+"""The array.array typecodes with a numeric dtype; the first one of each (kind, size) is used to decode"""
+
+
+@dataclass(frozen=True)
+class ArrayHeader:
+    dtype: str
+    """The typestr of the numpy array interface, e.g., '<f8' or '|u1'"""
+    shape: tuple[int, ...]
+
+
+def is_array_type(cls: type) -> bool:
+    return cls is array.array or is_ndarray_type(cls)
+
+
+def is_ndarray_type(cls: type) -> bool:
+    """True for numpy.ndarray and its generic aliases (e.g., numpy.typing.NDArray[numpy.float64])"""
+    cls = typing.get_origin(cls) or cls
+    return getattr(cls, '__module__', None) == 'numpy' and getattr(cls, '__name__', None) == 'ndarray'
+
+
+def to_buffer(obj: any) -> tuple[ArrayHeader, memoryview]:
+    """The buffer is a view of the array when it is already little-endian and contiguous"""
+    if isinstance(obj, array.array):
+        if obj.typecode not in _typecodes:
+            raise TypeError(f'Unsupported array typecode: {obj.typecode}')
+        if sys.byteorder == 'big':
+            obj = array.array(obj.typecode, obj)
+            obj.byteswap()
+        return ArrayHeader(_typestr(obj.typecode, obj.itemsize), (len(obj),)), memoryview(obj).cast('B')
+    if is_ndarray_type(type(obj)):
+        import numpy
+        if obj.dtype.kind not in 'biufc':
+            raise TypeError(f'Unsupported array dtype: {obj.dtype}')
+        obj = numpy.ascontiguousarray(obj, dtype=obj.dtype.newbyteorder('<'))
+        return ArrayHeader(obj.dtype.str, tuple(obj.shape)), memoryview(obj.reshape(-1).view(numpy.uint8))
+    raise TypeError(f'Expected a numeric array, got {type(obj).__name__}')
+
+
+def from_buffer(header: ArrayHeader, buffer: bytes | bytearray | memoryview, cls: type) -> any:
+    """cls is array.array or a numpy.ndarray type; the array has the dtype of the header"""
+    if is_ndarray_type(cls):
+        import numpy
+        return numpy.frombuffer(buffer, dtype=numpy.dtype(header.dtype)).reshape(header.shape)
+    if cls is not array.array:
+        raise TypeError(f'Expected a numeric array type, got {cls}')
+    if len(header.shape) != 1:
+        raise TypeError(f'An array.array has one dimension, got shape {header.shape}')
+    result = array.array(_typecode(header.dtype))
+    result.frombytes(buffer)
+    if header.dtype[0] in '<>' and (header.dtype[0] == '>') != (sys.byteorder == 'big'):
+        result.byteswap()
+    return result
+
+
+def _typestr(typecode: str, itemsize: int) -> str:
+    kind = 'f' if typecode in 'fd' else 'i' if typecode.islower() else 'u'
+    return f'{"|" if itemsize == 1 else "<"}{kind}{itemsize}'
+
+
+def _typecode(typestr: str) -> str:
+    kind, size = typestr[1], int(typestr[2:])
+    kind = 'u' if kind == 'b' else kind  # bool, as unsigned bytes
+    for typecode in _typecodes:
+        if array.array(typecode).itemsize == size and _typestr(typecode, size)[1] == kind:
+            return typecode
+    raise TypeError(f'No array.array typecode for dtype {typestr}')
@@ -1,19 +1,110 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+from typing import AsyncIterator
 
 from wwwpy.common.escapelib import escape_string
+from wwwpy.common.rpc2 import deadline, admission
+from wwwpy.common.rpc2.batch import Batcher, BatchTransport, batch_content_type
+from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder, encoder_decoder_for, payload_content_type
+from wwwpy.common.rpc2.idempotent import encode_query
+from wwwpy.common.rpc2.stream import ChunkDecoder, is_stream
 from wwwpy.common.rpc2.transport import Transport
+from wwwpy.common.rpc2.websocket_transport import WebsocketTransport
 
 logger = logging.getLogger(__name__)
 
+_x_user_defined = {0xF700 + b: b for b in range(0x80, 0x100)}
+"""The charset x-user-defined maps the bytes 0x80-0xFF to U+F780-U+F7FF"""
+
+
+def _x_user_defined_bytes(text: str) -> bytes:
+    """The bytes of a sync XMLHttpRequest response read with the charset x-user-defined"""
+    return text.translate(_x_user_defined).encode('latin-1')
+
+
 try:
     import js
 
 
+    async def _fetch(url: str, text: bool, method: str = 'GET', body=None, headers: dict[str, str] | None = None,
+                     with_deadline: bool = True) -> str | bytes:
+        """It returns the response body. The remaining seconds of the current deadline are sent in the timeout
+        header; when the caller is cancelled the request is aborted, the server sees the disconnection
+        and cancels the call"""
+        from pyodide.ffi import to_js
+        headers = dict(headers or {})
+        remaining = deadline.remaining() if with_deadline else None
+        if remaining is not None:
+            headers[deadline.timeout_header] = deadline.format_timeout(remaining)
+        controller = js.AbortController.new()
+        options = {'method': method, 'signal': controller.signal,
+                   'headers': to_js(headers, dict_converter=js.Object.fromEntries)}
+        if body is not None:
+            options['body'] = body
+        try:
+            response = await js.fetch(url, **options)
+            _check_overloaded(response.status, response.headers.get(admission.retry_after_header))
+            if text:
+                return await response.text()
+            return (await response.arrayBuffer()).to_bytes()
+        except asyncio.CancelledError:
+            controller.abort()
+            raise
+
+
+    def _check_overloaded(status: int, retry_after: str | None):
+        """The server rejected the call, the stub retries it"""
+        if status == admission.overloaded_http_status:
+            from wwwpy.exceptions import RemoteOverloadedError
+            raise RemoteOverloadedError('The server is overloaded', admission.parse_retry_after(retry_after))
+
+
+    def _check_overloaded_xhr(xhr):
+        _check_overloaded(xhr.status, xhr.getResponseHeader(admission.retry_after_header))
+
+
+    async def _fetch_binary(rpc_url: str, payload: bytes, content_type: str, with_deadline: bool = True) -> bytes:
+        from pyodide.ffi import to_js
+        return await _fetch(rpc_url, False, 'POST', to_js(payload), {'Content-Type': content_type}, with_deadline)
+
+
+    async def _fetch_stream(rpc_url: str, payload: str | bytes, content_type: str):
+        from pyodide.ffi import to_js
+        from wwwpy.exceptions import RemoteError
+        text = isinstance(payload, str)
+        body = payload if text else to_js(payload)
+        headers = to_js({'Content-Type': content_type}, dict_converter=js.Object.fromEntries)
+        response = await js.fetch(rpc_url, method='POST', body=body, headers=headers)
+        if not response.ok:
+            raise RemoteError(f'Stream request failed with http status {response.status}')
+        if not is_stream(response.headers.get('Content-Type')):
+            # e.g., an error raised before the function was invoked
+            yield (await response.text()) if text else (await response.arrayBuffer()).to_bytes()
+            return
+
+        reader = response.body.getReader()
+        chunks = ChunkDecoder(text)
+        done = False
+        try:
+            while not done:
+                result = await reader.read()
+                done = result.done
+                if not done:
+                    for message in chunks.feed(result.value.to_bytes()):
+                        yield message
+        finally:
+            if not done:
+                reader.cancel()  # the server sees the disconnection and closes the function iterator
+
+
     class RemoteHttpTransport(Transport):
-        def __init__(self, rpc_url: str):
+        def __init__(self, rpc_url: str, content_type: str = JsonEncoderDecoder.content_type):
+            """content_type is the one of the EncoderDecoder, sent with the payloads;
+            the parts payloads are sent with the parts content type, see PartsEncoderDecoder"""
             self.rpc_url = rpc_url
+            self.content_type = content_type
             self.response = None
 
         def _buf(self, payload: str | bytes):
@@ -28,10 +119,16 @@ try:
             self.response = None
             return response
 
+        def recv_stream_async(self, payload: str | bytes):
+            return _fetch_stream(self.rpc_url, payload, self.content_type)
+
         async def send_async(self, payload: str | bytes):
+            content_type = payload_content_type(payload, self.content_type)
+            if isinstance(payload, bytes):
+                self._buf(await _fetch_binary(self.rpc_url, payload, content_type))
+                return
             logger.debug(f'send_async payload: `{escape_string(payload)}`')
-            json_response = await js.fetch(self.rpc_url, method='POST', body=payload)
-            text = await json_response.text()
+            text = await _fetch(self.rpc_url, True, 'POST', payload, {'Content-Type': content_type})
             # response = RpcResponse.from_json(json_response)
             # ex = response.exception
             # if ex is not None and ex != '':
@@ -43,8 +140,21 @@ try:
             # import js
             xhr = js.XMLHttpRequest.new()
             xhr.open('POST', self.rpc_url, False)
-            xhr.setRequestHeader('Content-Type', 'application/json')
+            remaining = deadline.remaining()
+            if remaining is not None:  # a sync request cannot time out, but the server can stop the function
+                xhr.setRequestHeader(deadline.timeout_header, deadline.format_timeout(remaining))
+            if isinstance(payload, bytes):
+                from pyodide.ffi import to_js
+                xhr.setRequestHeader('Content-Type', payload_content_type(payload, self.content_type))
+                # a sync request cannot have responseType='arraybuffer', this keeps the bytes in the text
+                xhr.overrideMimeType('text/plain; charset=x-user-defined')
+                xhr.send(to_js(payload))
+                _check_overloaded_xhr(xhr)
+                self._buf(_x_user_defined_bytes(xhr.responseText))
+                return
+            xhr.setRequestHeader('Content-Type', payload_content_type(payload, self.content_type))
             xhr.send(payload)
+            _check_overloaded_xhr(xhr)
             json_response = xhr.responseText
             # response = RpcResponse.from_json(json_response)
             # ex = response.exception
@@ -58,6 +168,57 @@ try:
         async def recv_async(self) -> str | bytes:
             return self._consume()
 
+        def _get_url(self, payload: str | bytes) -> str:
+            return f'{self.rpc_url}?{encode_query(payload, payload_content_type(payload, self.content_type))}'
+
+        async def call_idempotent_async(self, payload: str | bytes) -> str | bytes:
+            """A GET, so the browser http cache can answer it or revalidate it with If-None-Match"""
+            return await _fetch(self._get_url(payload), isinstance(payload, str))
+
+        def call_idempotent_sync(self, payload: str | bytes) -> str | bytes:
+            xhr = js.XMLHttpRequest.new()
+            xhr.open('GET', self._get_url(payload), False)
+            if isinstance(payload, str):
+                xhr.send()
+                _check_overloaded_xhr(xhr)
+                return xhr.responseText
+            xhr.overrideMimeType('text/plain; charset=x-user-defined')
+            xhr.send()
+            _check_overloaded_xhr(xhr)
+            return _x_user_defined_bytes(xhr.responseText)
+
+
+    _batchers: dict[str, Batcher] = {}
+
+
+    class RemoteBatchHttpTransport(BatchTransport):
+        """The async calls issued in the same event loop iteration, from any stub using the same rpc_url,
+        are sent with a single fetch"""
+
+        def __init__(self, rpc_url: str, content_type: str = JsonEncoderDecoder.content_type):
+            key = f'{content_type} {rpc_url}'
+            batcher = _batchers.get(key, None)
+            if batcher is None:
+                async def post(payload: str | bytes, batch: bool) -> str | bytes:
+                    # the deadline is of one of the calls, not of the batch; the stubs enforce it anyway
+                    request_content_type = batch_content_type(content_type) if batch else content_type
+                    if isinstance(payload, bytes):
+                        return await _fetch_binary(rpc_url, payload, request_content_type, with_deadline=False)
+                    return await _fetch(rpc_url, True, 'POST', payload, {'Content-Type': request_content_type},
+                                        with_deadline=False)
+
+                batcher = Batcher(post, encoder_decoder_for(content_type))
+                _batchers[key] = batcher
+            super().__init__(batcher, RemoteHttpTransport(rpc_url, content_type))
+
+
+    class RemoteWebsocketTransport(WebsocketTransport):
+        """The async calls go through the /wwwpy/ws websocket; http is used when the socket is down"""
+
+        def __init__(self, rpc_url: str, content_type: str = JsonEncoderDecoder.content_type):
+            from wwwpy.remote.websocket import websocket_calls
+            super().__init__(websocket_calls(), RemoteHttpTransport(rpc_url, content_type))
+
 
     class ServerHttpTransport(Transport):
         pass
@@ -91,6 +252,18 @@ except:
         async def send_async(self, payload: str | bytes):
             self._buf(payload)
 
+        async def send_stream_async(self, messages: AsyncIterator[str | bytes]):
+            """The response is the async iterator, the webserver sends its messages as they are produced"""
+            self._buf(messages)
+
 
     class RemoteHttpTransport(Transport):
         ...
+
+
+    class RemoteBatchHttpTransport(Transport):
+        ...
+
+
+    class RemoteWebsocketTransport(Transport):
+        ...
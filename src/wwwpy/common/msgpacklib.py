@@ -0,0 +1,199 @@
+"""A pure python subset of MessagePack (https://msgpack.org/), it is needed because in Pyodide we cannot
+assume the availability of native packages.
+
+Supported: None, bool, int (64 bits), float (64 bits), str, bytes (also bytearray and memoryview), list, tuple
+and dict. Extension types are not supported. Tuples are packed as arrays and unpacked as lists.
+"""
+from __future__ import annotations
+
+import struct
+from typing import Any
+
+_pack_f64 = struct.Struct('>d').pack
+_unpack_f64 = struct.Struct('>d').unpack_from
+_unpack_f32 = struct.Struct('>f').unpack_from
+
+
+class MsgpackError(Exception):
+    pass
+
+
+def packb(obj: Any) -> bytes:
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def pack_into(obj: Any, out: bytearray) -> None:
+    _pack(obj, out)
+
+
+def _pack(obj: Any, out: bytearray) -> None:
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        _pack_int(obj, out)
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += _pack_f64(obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        n = len(data)
+        if n < 32:
+            out.append(0xa0 | n)
+        elif n < 0x100:
+            out += b'\xd9' + n.to_bytes(1, 'big')
+        elif n < 0x10000:
+            out += b'\xda' + n.to_bytes(2, 'big')
+        else:
+            out += b'\xdb' + n.to_bytes(4, 'big')
+        out += data
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        n = obj.nbytes if isinstance(obj, memoryview) else len(obj)
+        if n < 0x100:
+            out += b'\xc4' + n.to_bytes(1, 'big')
+        elif n < 0x10000:
+            out += b'\xc5' + n.to_bytes(2, 'big')
+        else:
+            out += b'\xc6' + n.to_bytes(4, 'big')
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _pack_header(len(obj), out, 0x90, 0xdc)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        _pack_header(len(obj), out, 0x80, 0xde)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise MsgpackError(f'Unsupported type: {type(obj).__name__}')
+
+
+def _pack_header(n: int, out: bytearray, fix: int, marker16: int) -> None:
+    if n < 16:
+        out.append(fix | n)
+    elif n < 0x10000:
+        out.append(marker16)
+        out += n.to_bytes(2, 'big')
+    else:
+        out.append(marker16 + 1)
+        out += n.to_bytes(4, 'big')
+
+
+def _pack_int(obj: int, out: bytearray) -> None:
+    if 0 <= obj < 0x80:
+        out.append(obj)
+    elif -32 <= obj < 0:
+        out.append(obj & 0xff)
+    elif obj >= 0:
+        if obj < 0x100:
+            out += b'\xcc' + obj.to_bytes(1, 'big')
+        elif obj < 0x10000:
+            out += b'\xcd' + obj.to_bytes(2, 'big')
+        elif obj < 0x100000000:
+            out += b'\xce' + obj.to_bytes(4, 'big')
+        elif obj < 0x10000000000000000:
+            out += b'\xcf' + obj.to_bytes(8, 'big')
+        else:
+            raise MsgpackError(f'Integer too large: {obj}')
+    else:
+        if obj >= -0x80:
+            out += b'\xd0' + obj.to_bytes(1, 'big', signed=True)
+        elif obj >= -0x8000:
+            out += b'\xd1' + obj.to_bytes(2, 'big', signed=True)
+        elif obj >= -0x80000000:
+            out += b'\xd2' + obj.to_bytes(4, 'big', signed=True)
+        elif obj >= -0x8000000000000000:
+            out += b'\xd3' + obj.to_bytes(8, 'big', signed=True)
+        else:
+            raise MsgpackError(f'Integer too small: {obj}')
+
+
+def unpackb(data: bytes) -> Any:
+    unpacker = Unpacker(data)
+    obj = unpacker.unpack()
+    if not unpacker.at_end():
+        raise MsgpackError(f'Extra data at offset {unpacker.offset}')
+    return obj
+
+
+class Unpacker:
+    """It unpacks the objects of a buffer one after the other"""
+
+    def __init__(self, data: bytes | bytearray | memoryview):
+        self._data = bytes(data) if not isinstance(data, bytes) else data
+        self.offset = 0
+
+    def at_end(self) -> bool:
+        return self.offset >= len(self._data)
+
+    def unpack(self) -> Any:
+        try:
+            return self._unpack()
+        except IndexError as e:
+            raise MsgpackError('Unexpected end of data') from e
+
+    def _take(self, n: int) -> bytes:
+        start = self.offset
+        end = start + n
+        if end > len(self._data):
+            raise MsgpackError('Unexpected end of data')
+        self.offset = end
+        return self._data[start:end]
+
+    def _uint(self, n: int) -> int:
+        return int.from_bytes(self._take(n), 'big')
+
+    def _unpack(self) -> Any:
+        data = self._data
+        b = data[self.offset]
+        self.offset += 1
+        if b < 0x80:
+            return b
+        if b >= 0xe0:
+            return b - 0x100
+        if 0xa0 <= b <= 0xbf:
+            return self._take(b & 0x1f).decode('utf-8')
+        if 0x90 <= b <= 0x9f:
+            return [self._unpack() for _ in range(b & 0x0f)]
+        if 0x80 <= b <= 0x8f:
+            return self._unpack_map(b & 0x0f)
+        if b == 0xc0:
+            return None
+        if b == 0xc2:
+            return False
+        if b == 0xc3:
+            return True
+        if b == 0xcb:
+            value = _unpack_f64(data, self.offset)[0]
+            self.offset += 8
+            return value
+        if b == 0xca:
+            value = _unpack_f32(data, self.offset)[0]
+            self.offset += 4
+            return value
+        if 0xcc <= b <= 0xcf:
+            return self._uint(1 << (b - 0xcc))
+        if 0xd0 <= b <= 0xd3:
+            return int.from_bytes(self._take(1 << (b - 0xd0)), 'big', signed=True)
+        if 0xd9 <= b <= 0xdb:
+            return self._take(self._uint(1 << (b - 0xd9))).decode('utf-8')
+        if 0xc4 <= b <= 0xc6:
+            return self._take(self._uint(1 << (b - 0xc4)))
+        if b == 0xdc or b == 0xdd:
+            return [self._unpack() for _ in range(self._uint(2 if b == 0xdc else 4))]
+        if b == 0xde or b == 0xdf:
+            return self._unpack_map(self._uint(2 if b == 0xde else 4))
+        raise MsgpackError(f'Unsupported type code: 0x{b:02x}')
+
+    def _unpack_map(self, n: int) -> dict:
+        result = {}
+        for _ in range(n):
+            key = self._unpack()
+            result[key] = self._unpack()
+        return result
@@ -1,5 +1,4 @@
 import asyncio
-import base64
 import logging
 
 import js
@@ -109,8 +108,7 @@ class UploadProgressComponent(wpc.Component):
                 array_buffer = await self._read_chunk(chunk)
                 # Process the chunk_text as needed
                 logger.info(f'offset={offset}')
-                b64str = base64.b64encode(array_buffer.to_py()).decode()
-                await rpc.upload_append(file.name, b64str)
+                await rpc.upload_append(file.name, array_buffer.to_bytes())
                 offset += chunk_size
                 self.progress.value = offset
                 # percentage with two decimals
@@ -1,4 +1,3 @@
-import base64
 import logging
 from pathlib import Path
 
@@ -13,12 +12,12 @@ async def upload_init(name: str, size: int):
     return None
 
 
-async def upload_append(name: str, b64str: str):
-    logger.info(f'upload_append name={name} len(b64str)={len(b64str)}')
+async def upload_append(name: str, data: memoryview):
+    # the chunk travels as a binary part of the rpc message, it is a view of the request body
+    logger.info(f'upload_append name={name} len(data)={len(data)}')
     file = _resolve_file(name)
-    bytes_append = base64.b64decode(b64str)
     with file.open('ab') as f:
-        f.write(bytes_append)
+        f.write(data)
     return None
 
 
@@ -5,6 +5,14 @@ import sys
 
 logger = logging.getLogger(__name__)
 
+_generation = 0
+
+
+def generation() -> int:
+    """It is incremented every time some modules are unloaded; caches of resolved modules can compare it
+    to know when they are stale"""
+    return _generation
+
 
 def reload(module):
     import importlib
@@ -27,6 +35,7 @@ def unload_path(path: str, skip_wwwpy: bool = False):
         except:
             return False
 
+    global _generation
     names = [name for name, module in sys.modules.items() if accept(module)]
 
     for name in names:
@@ -35,3 +44,7 @@ def unload_path(path: str, skip_wwwpy: bool = False):
         else:
             logger.debug(f'hot-reload: unload module `{name}`')
             del (sys.modules[name])
+
+    # after the deletion: what is resolved meanwhile (e.g., on the event loop) is still in the old generation
+    if names:
+        _generation += 1
@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import ast
 import importlib.util
-from ast import Module, FunctionDef, ClassDef
+import logging
+from ast import Module, FunctionDef, AsyncFunctionDef, ClassDef
 from typing import NamedTuple, List
 
+logger = logging.getLogger(__name__)
+
 
 class Function(NamedTuple):
     name: str
@@ -69,26 +72,120 @@ def function_definitions(source_code) -> List[Function]:
     return functions
 
 
+_remote_only_modules = ('js', 'pyodide', 'pyodide_js', 'wwwpy.remote', 'remote')
+"""The modules that exist only in the browser, the server proxies cannot import them"""
+
+_data_bases = {'Enum', 'IntEnum', 'StrEnum', 'Flag', 'IntFlag', 'NamedTuple', 'TypedDict'}
+
+
 def source_to_proxy(module_name: str, source: str) -> str:
+    """The sync methods are fire-and-forget, they call send_endpoint.dispatch; the async methods are awaited
+    and return the result of the remote method, see remote_call.call.
+    The data classes (e.g., dataclasses and enums) are copied as they are, and the imports they and the annotations
+    of the async methods use are kept, so their types are available on the server. An async method whose
+    annotations use something the server cannot import (e.g., js) is fire-and-forget, like the sync ones."""
     tree: Module = ast.parse(source)
     content = ''
     # todo OptionalCoroutine
-    # add detecting unsupported structure (e.g, nested class, AsyncFunctionDef, functions with results), log a warning message
+    # add detecting unsupported structure (e.g, nested class), log a warning message
+    imports = [b for b in tree.body if isinstance(b, (ast.Import, ast.ImportFrom))]
+    unavailable = {name for b in imports if _is_remote_only(b) for name in _imported_names(b)}
+    data_classes = []
+    for b in tree.body:
+        if isinstance(b, ClassDef) and _is_data_class(b):
+            if _names(b) & unavailable:
+                unavailable.add(b.name)
+            else:
+                data_classes.append(b)
+    used_names = set().union(*(_names(b) for b in data_classes))
+    awaited = False
 
     for b in tree.body:
-        if isinstance(b, ClassDef):
+        if isinstance(b, ClassDef) and not _is_data_class(b):
             content += f'class {b.name}:\n' \
                        '    def __init__(self, send_endpoint):\n' \
                        '        self.send_endpoint = send_endpoint\n'
 
             for f in b.body:
-                if isinstance(f, FunctionDef):
-                    fqn = b.name + '.' + f.name
-                    if len(f.args.args) > 1:  # beyond self
-                        args = ', ' + ', '.join([a.arg for a in f.args.args[1:]])
-                    else:
-                        args = ''
+                if not isinstance(f, (FunctionDef, AsyncFunctionDef)) or f.name.startswith('_'):
+                    continue
+                fqn = b.name + '.' + f.name
+                if len(f.args.args) > 1:  # beyond self
+                    args = ', ' + ', '.join([a.arg for a in f.args.args[1:]])
+                else:
+                    args = ''
+                annotation_names = set().union(*(_annotation_names(a.annotation) for a in f.args.args if a.annotation),
+                                               _annotation_names(f.returns) if f.returns else set())
+                if isinstance(f, AsyncFunctionDef) and annotation_names & unavailable:
+                    logger.warning(f'{module_name}.{fqn} uses types the server cannot import, it is not awaitable: '
+                                   f'{", ".join(sorted(annotation_names & unavailable))}')
+                if isinstance(f, FunctionDef) or annotation_names & unavailable:
                     content += f'    def {f.name}(self{args}):\n' \
                                f'       self.send_endpoint.dispatch("{module_name}", "{fqn}"{args})\n'
+                else:
+                    awaited = True
+                    used_names.update(annotation_names)
+                    signature = ast.AsyncFunctionDef(name=f.name, args=f.args, body=[], decorator_list=[],
+                                                     returns=f.returns, lineno=0)
+                    content += f'    {ast.unparse(signature)}\n' \
+                               f'        return await _remote_call(self.send_endpoint, "{module_name}", "{fqn}", ' \
+                               f'self.{f.name}{args})\n'
+
+    if awaited or data_classes:
+        header = ['from __future__ import annotations']
+        if awaited:
+            header.append('from wwwpy.common.rpc.remote_call import call as _remote_call')
+        header += [ast.unparse(b) for b in imports if not _is_remote_only(b) and _imported_names(b) & used_names]
+        header += [ast.unparse(b) for b in data_classes]
+        content = '\n'.join([*header, content])
 
     return content
+
+
+def _is_remote_only(node: ast.Import | ast.ImportFrom) -> bool:
+    if isinstance(node, ast.ImportFrom):
+        modules = [node.module or ''] if node.level == 0 else None  # a relative import is of the remote package
+    else:
+        modules = [alias.name for alias in node.names]
+    return modules is None or any(m == r or m.startswith(r + '.') for m in modules for r in _remote_only_modules)
+
+
+def _imported_names(node: ast.Import | ast.ImportFrom) -> set[str]:
+    if isinstance(node, ast.ImportFrom):
+        return {alias.asname or alias.name for alias in node.names}
+    return {alias.asname or alias.name.split('.')[0] for alias in node.names}
+
+
+def _is_data_class(node: ClassDef) -> bool:
+    """The classes that hold data (e.g., the dataclasses): they are copied to the server, not proxied"""
+    for decorator in node.decorator_list:
+        target = decorator.func if isinstance(decorator, ast.Call) else decorator
+        if ast.unparse(target).split('.')[-1] == 'dataclass':
+            return True
+    return any(ast.unparse(base).split('.')[-1] in _data_bases for base in node.bases)
+
+
+def _names(node: ast.AST) -> set[str]:
+    """The global names the node uses, also inside its string annotations"""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            names.add(child.id)
+        elif isinstance(child, (ast.AnnAssign, ast.arg)) and child.annotation:
+            names |= _annotation_names(child.annotation)
+        elif isinstance(child, (FunctionDef, AsyncFunctionDef)) and child.returns:
+            names |= _annotation_names(child.returns)
+    return names
+
+
+def _annotation_names(annotation: ast.expr) -> set[str]:
+    names = set()
+    for child in ast.walk(annotation):
+        if isinstance(child, ast.Name):
+            names.add(child.id)
+        elif isinstance(child, ast.Constant) and isinstance(child.value, str):  # a forward reference
+            try:
+                names |= _annotation_names(ast.parse(child.value, mode='eval').body)
+            except SyntaxError:
+                pass
+    return names
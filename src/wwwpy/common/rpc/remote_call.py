@@ -0,0 +1,183 @@
+"""The server to remote calls that return a result.
+
+The async methods of the remote rpc classes become awaitable on the server (see func_registry.source_to_proxy):
+their proxies send the call with `call` and wait for the result, the remote runs it with RemoteDispatcher.
+They travel as the rpc2 websocket frames, with a correlation id; the arguments and the result are encoded
+with serialization, with the types of the annotations of the remote method.
+
+    title = await endpoint.rpc(Component1).get_title('prefix')
+
+The call expires at the current deadline (see rpc2.deadline) or after default_timeout.
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import logging
+import traceback
+from types import MethodType
+from typing import Callable, NamedTuple
+
+from wwwpy.common import reloader
+from wwwpy.common.asynclib import create_task_safe
+from wwwpy.common.rpc import serialization
+from wwwpy.common.rpc2 import deadline
+from wwwpy.common.rpc2.typed_function import get_typed_function, TypedFunction
+from wwwpy.common.rpc2.websocket_transport import decode_frame, decode_request_frame, encode_frame, \
+    cancel_prefix, response_prefix
+from wwwpy.exceptions import RemoteException, RemoteError, RemoteTimeoutError
+
+logger = logging.getLogger(__name__)
+
+default_timeout = 30.0
+"""The seconds a call waits for the remote when there is no deadline, e.g., the page can be stuck"""
+
+_typed_methods: dict[Callable, TypedFunction] = {}
+_typed_generation = reloader.generation()
+
+
+async def call(endpoint, module: str, func_name: str, method: MethodType, *args) -> any:
+    """endpoint is the websocket of one client, see WebsocketEndpoint.calls; method is the proxy method,
+    its annotations are the types of the arguments and of the result"""
+    calls = getattr(endpoint, 'calls', None)
+    if calls is None:
+        raise RemoteError(f'{module}.{func_name} returns a result, it can be called on a single client')
+    typed_function = _typed_method(method)
+    payload = json.dumps([module, func_name, _serialize_args(args, typed_function.args_types)])
+    timeout = deadline.remaining()
+    if timeout is None:
+        timeout = default_timeout
+    with deadline.timeout(timeout):  # the frame carries the remaining seconds
+        future = calls.call(payload)
+    try:
+        response = await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise RemoteTimeoutError(f'The deadline of {module}.{func_name} expired')
+    status, value = json.loads(response)
+    if status == 'ex':
+        raise RemoteException(value)
+    if status != 'ok':
+        raise RemoteError(f'Unknown status: `{status}`')
+    return serialization.deserialize(value, typed_function.return_type)
+
+
+def _typed_method(method: MethodType) -> TypedFunction:
+    """The types of a proxy method, reflected once; the proxies are replaced by the hot reload"""
+    global _typed_methods, _typed_generation
+    generation = reloader.generation()
+    if generation != _typed_generation:
+        _typed_methods = {}
+        _typed_generation = generation
+    typed_function = _typed_methods.get(method.__func__, None)
+    if typed_function is None:
+        typed_function = get_typed_function(method)
+        _typed_methods[method.__func__] = typed_function
+    return typed_function
+
+
+def _serialize_args(args: tuple, args_types: list[type]) -> list:
+    if len(args) != len(args_types):
+        raise TypeError(f'Expected {len(args_types)} arguments, got {len(args)}')
+    return [serialization.serialize(arg, arg_type) for arg, arg_type in zip(args, args_types)]
+
+
+class DispatchTarget(NamedTuple):
+    cls: type
+    method_name: str
+    typed_function: TypedFunction | None
+    """None when the method is not async, it cannot return a result"""
+
+    def bind(self) -> Callable:
+        """Each call has its own instance of the class, as the fire-and-forget calls always had"""
+        return getattr(self.cls(), self.method_name)
+
+
+class RemoteDispatcher:
+    """It runs the server to remote calls. The dispatch table keeps, for each module and 'Class.method',
+    the class and the types of the method, so each call only instantiates the class.
+    It is rebuilt when the reloader generation changes, that is when the hot reload unloads the modules."""
+
+    def __init__(self, send: Callable[[str], None]):
+        self._send = send
+        self._table: dict[tuple[str, str], DispatchTarget] = {}
+        self._generation = reloader.generation()
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def resolve(self, module_name: str, func_name: str) -> DispatchTarget:
+        generation = reloader.generation()
+        if generation != self._generation:
+            self._table = {}
+            self._generation = generation
+
+        key = (module_name, func_name)
+        target = self._table.get(key, None)
+        if target is None:
+            class_name, method_name = func_name.split('.')
+            cls = getattr(importlib.import_module(module_name), class_name)
+            function = getattr(cls, method_name)
+            # bound to the class only to reflect on the arguments after self
+            typed_function = get_typed_function(MethodType(function, cls)) \
+                if asyncio.iscoroutinefunction(function) else None
+            target = DispatchTarget(cls, method_name, typed_function)
+            self._table[key] = target
+        return target
+
+    def __len__(self):
+        return len(self._table)
+
+    def dispatch(self, module_name: str, func_name: str, args: list) -> None:
+        """A fire-and-forget call, as sent by WebsocketEndpoint.dispatch; the arguments are plain json"""
+        result = self.resolve(module_name, func_name).bind()(*args)
+        if asyncio.iscoroutine(result):
+            create_task_safe(result)
+
+    def on_message(self, message: str | bytes) -> bool:
+        """It returns True if the message was a call or the cancellation of a call, i.e., it was consumed"""
+        cancel = decode_frame(cancel_prefix, message)
+        if cancel is not None:
+            task = self._tasks.pop(cancel[0], None)
+            if task is not None:
+                task.cancel()
+            return True
+        frame = decode_request_frame(message)
+        if frame is None:
+            return False
+        call_id, payload, timeout = frame
+
+        async def invoke():
+            try:
+                response = await self._invoke(payload, timeout)
+                self._send(encode_frame(response_prefix, call_id, response))
+            finally:
+                self._tasks.pop(call_id, None)
+
+        self._tasks[call_id] = create_task_safe(invoke())
+        return True
+
+    def on_close(self):
+        """The server is gone, nobody waits for the results"""
+        tasks = self._tasks
+        self._tasks = {}
+        for task in tasks.values():
+            task.cancel()
+
+    async def _invoke(self, payload: str, timeout: float | None) -> str:
+        try:
+            module_name, func_name, args = json.loads(payload)
+            target = self.resolve(module_name, func_name)
+            if target.typed_function is None:
+                raise TypeError(f'{module_name}.{func_name} is not async, it cannot return a result to the server')
+            args_types = target.typed_function.args_types
+            if len(args) != len(args_types):
+                raise TypeError(f'Expected {len(args_types)} arguments, got {len(args)}')
+            args = [serialization.deserialize(arg, arg_type) for arg, arg_type in zip(args, args_types)]
+            method = target.bind()
+            if timeout is None:
+                result = await method(*args)
+            else:
+                with deadline.timeout(timeout):
+                    result = await method(*args)
+            return json.dumps(['ok', serialization.serialize(result, target.typed_function.return_type)])
+        except Exception:
+            return json.dumps(['ex', traceback.format_exc()])
@@ -5,17 +5,34 @@ import enum
 import importlib
 import json
 import re
+import zlib
 import sys
 import types
 import typing
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import is_dataclass
 from datetime import datetime
 from typing import Any, Type, get_origin, get_args, TypeVar, List, Optional
 
-from wwwpy.common import result
+from wwwpy.common import result, reloader, arraylib
 
 T = TypeVar('T')
 
+_native_bytes: ContextVar[bool] = ContextVar('_native_bytes', default=False)
+
+
+@contextmanager
+def native_bytes():
+    """Within this context serialize leaves bytes as they are, instead of encoding them in base64.
+    It is meant for the binary formats that can carry bytes natively; deserialize accepts both forms"""
+    token = _native_bytes.set(True)
+    try:
+        yield
+    finally:
+        _native_bytes.reset(token)
+
+
 class SerializationError(Exception):
     """Custom exception for serialization errors with path tracking."""
     def __init__(self, message: str, path: List[str]):
@@ -39,6 +56,11 @@ def serialize(obj: T, cls: Type[T], path: Optional[List[str]] = None) -> Any:
     Raises:
         SerializationError: If serialization fails with detailed path information
     """
+    if path is None:
+        try:
+            return _plans.serializer(cls)(obj)
+        except Exception:
+            pass  # the generic implementation below reports the error with its path
     path = path or [f"{cls}"]
 
     try:
@@ -58,6 +80,9 @@ def serialize(obj: T, cls: Type[T], path: Optional[List[str]] = None) -> Any:
         if origin is result.Result:
             return _serialize_result(obj, cls, path)
 
+        if arraylib.is_array_type(cls):
+            return _serialize_array(obj)
+
         # Type checking
         if origin is not None:
             if not isinstance(obj, origin):
@@ -81,7 +106,7 @@ def serialize(obj: T, cls: Type[T], path: Optional[List[str]] = None) -> Any:
         elif isinstance(obj, datetime):
             return obj.isoformat()
         elif isinstance(obj, bytes):
-            return base64.b64encode(obj).decode('utf-8')
+            return obj if _native_bytes.get() else base64.b64encode(obj).decode('utf-8')
         elif isinstance(obj, (int, float, str, bool)):
             return obj
         elif isinstance(obj, enum.Enum):
@@ -101,6 +126,19 @@ def serialize(obj: T, cls: Type[T], path: Optional[List[str]] = None) -> Any:
         ) from e
 
 
+def _serialize_array(obj: Any) -> dict:
+    """The elements are in one little-endian buffer, see arraylib; it is base64 unless native_bytes"""
+    header, buffer = arraylib.to_buffer(obj)
+    data = buffer if _native_bytes.get() else base64.b64encode(buffer).decode('utf-8')
+    return {'dtype': header.dtype, 'shape': list(header.shape), 'data': data}
+
+
+def _deserialize_array(data: dict, cls: Type) -> Any:
+    raw = data['data']
+    buffer = raw if isinstance(raw, (bytes, bytearray, memoryview)) else base64.b64decode(raw.encode('utf-8'))
+    return arraylib.from_buffer(arraylib.ArrayHeader(data['dtype'], tuple(data['shape'])), buffer, cls)
+
+
 def _serialize_union(obj: Any, cls: Type, path: List[str]) -> Any:
     """Handle serialization of Union types."""
     args = set(get_args(cls))
@@ -114,7 +152,7 @@ def _serialize_union(obj: Any, cls: Type, path: List[str]) -> Any:
 
     try:
         obj_ser = serialize(obj, obj_type, path)
-        return [str(obj_type), obj_ser]
+        return [_plans.union_tags(cls).tags[obj_type], obj_ser]
     except Exception as e:
         raise SerializationError(
             f"Failed to serialize union type {obj_type.__name__}", path
@@ -140,7 +178,7 @@ def _serialize_result(obj: Any, cls: Type, path: List[str]) -> Any:
     value_path = path + ["value"]
     try:
         obj_ser = serialize(obj._value, obj_type, value_path)
-        return [str(type(obj)), obj_ser]
+        return [_result_tags[type(obj)], obj_ser]
     except Exception as e:
         raise SerializationError(
             f"Failed to serialize Result value of type {obj_type.__name__}", path
@@ -264,6 +302,11 @@ def deserialize(data: Any, cls: Type[T], path: Optional[List[str]] = None) -> T:
     Raises:
         DeserializationError: If deserialization fails with detailed path information
     """
+    if path is None:
+        try:
+            return _plans.deserializer(cls)(data)
+        except Exception:
+            pass  # the generic implementation below reports the error with its path
     path = path or [f"{cls}"]
 
     try:
@@ -283,6 +326,9 @@ def deserialize(data: Any, cls: Type[T], path: Optional[List[str]] = None) -> T:
         if origin is result.Result:
             return _deserialize_result(data, cls, path)
 
+        if arraylib.is_array_type(cls):
+            return _deserialize_array(data, cls)
+
         # Handle different types
         if is_dataclass(cls):
             return _deserialize_dataclass(data, cls, path)
@@ -302,6 +348,8 @@ def deserialize(data: Any, cls: Type[T], path: Optional[List[str]] = None) -> T:
                     f"Invalid datetime format: {data}", path
                 ) from e
         elif cls == bytes:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                return bytes(data)
             try:
                 return base64.b64decode(data.encode('utf-8'))
             except Exception as e:
@@ -353,10 +401,10 @@ def _deserialize_union(data: list, cls: Type, path: List[str]) -> Any:
 
     args = set(get_args(cls))
     try:
-        obj_type = _get_type_from_string(data[0])
+        obj_type = _resolve_tag(data[0], _plans.union_tags(cls).types)
     except ValueError as e:
         raise DeserializationError(
-            f"Invalid type string: {data[0]}", path
+            f"Invalid type tag: {data[0]}", path
         ) from e
 
     if obj_type not in args:
@@ -384,7 +432,7 @@ def _deserialize_result(data: list, cls: Type, path: List[str]) -> Any:
 
     args = list(get_args(cls))
     try:
-        obj_type = _get_type_from_string(data[0])
+        obj_type = _resolve_tag(data[0], _result_types)
         _assert_valid_result_type(obj_type)
     except ValueError as e:
         raise DeserializationError(str(e), path) from e
@@ -552,6 +600,43 @@ def _deserialize_subclass_list(data: list, cls: Type, origin, path: List[str]) -
             f"Expected a subclass of list, got {cls.__name__}", path
         )
 
+class _UnionTags:
+    """The discriminators of the members of a Union. The tag of a member is a short number derived from its
+    qualified name (see _type_tag), so the value of a different Union is still refused.
+    The members whose tags collide are tagged with the legacy str(type).
+    """
+
+    def __init__(self, members: tuple):
+        tags = [_type_tag(t) for t in members]
+        self.tags: dict[type, int | str] = {t: tag if tags.count(tag) == 1 else str(t)
+                                            for t, tag in zip(members, tags)}
+        self.types: dict[int | str, type] = {tag: t for t, tag in self.tags.items()}
+        self.types.update({str(t): t for t in members})  # the legacy payloads
+
+
+def _type_tag(cls: type) -> int:
+    """Deterministic across the processes, unlike hash()"""
+    name = f'{getattr(cls, "__module__", "")}.{getattr(cls, "__qualname__", str(cls))}'
+    return zlib.crc32(name.encode('utf-8')) & 0xffff
+
+
+_result_types = {0: result.Success, 1: result.Failure, str(result.Success): result.Success,
+                 str(result.Failure): result.Failure}
+"""The Result tags are fixed, the legacy str(type) is still accepted"""
+_result_tags = {result.Success: 0, result.Failure: 1}
+
+
+def _resolve_tag(tag: int | str, types_: dict[int | str, type]) -> type:
+    """types_ are the tags of the expected types; an unknown string tag is resolved as a legacy tag,
+    so the caller can report which type it was"""
+    obj_type = types_.get(tag, None)
+    if obj_type is not None:
+        return obj_type
+    if type(tag) is not str:
+        raise ValueError(f"Unknown type tag {tag}")
+    return _get_type_from_string(tag)
+
+
 def _get_type_from_string(type_str):
     """Convert a string representation of a type to the actual type object."""
     try:
@@ -610,6 +695,286 @@ def _is_union_type_3_9(origin):
 _is_union_type = _is_union_type_3_10 if sys.version_info >= (3, 10) else _is_union_type_3_9
 
 
+Plan = typing.Callable[[Any], Any]
+"""A specialized serializer or deserializer for one type annotation"""
+
+
+class _Plans:
+    """It compiles, once per type annotation, the closures that serialize and deserialize the values
+    of that type, so the type is not inspected again for every value.
+
+    The plans handle the common cases (exact types, dataclasses, containers, unions); anything else
+    is delegated to the generic implementation. The plans do not track the path: when a plan fails
+    serialize and deserialize run the generic implementation again, which raises the error with the path.
+
+    The plans are dropped when the reloader generation changes, because hot reload replaces the classes.
+    """
+
+    def __init__(self):
+        self._serializers: dict[Any, Plan] = {}
+        self._deserializers: dict[Any, Plan] = {}
+        self._union_tags: dict[Any, _UnionTags] = {}
+        self._generation = reloader.generation()
+
+    def _check_generation(self):
+        generation = reloader.generation()
+        if generation != self._generation:
+            self._serializers = {}
+            self._deserializers = {}
+            self._union_tags = {}
+            self._generation = generation
+
+    def union_tags(self, cls) -> _UnionTags:
+        self._check_generation()
+        tags = self._union_tags.get(cls, None)
+        if tags is None:
+            tags = _UnionTags(get_args(cls))
+            self._union_tags[cls] = tags
+        return tags
+
+    def serializer(self, cls) -> Plan:
+        self._check_generation()
+        plan = self._serializers.get(cls, None)
+        if plan is None:
+            plan = _compile_serializer(cls)
+            self._serializers[cls] = plan
+        return plan
+
+    def deserializer(self, cls) -> Plan:
+        self._check_generation()
+        plan = self._deserializers.get(cls, None)
+        if plan is None:
+            plan = _compile_deserializer(cls)
+            self._deserializers[cls] = plan
+        return plan
+
+
+_plans = _Plans()
+
+
+def _generic_serializer(cls) -> Plan:
+    path = [f"{cls}"]
+    return lambda obj: serialize(obj, cls, path)
+
+
+def _generic_deserializer(cls) -> Plan:
+    path = [f"{cls}"]
+    return lambda data: deserialize(data, cls, path)
+
+
+def _compile_serializer(cls) -> Plan:
+    generic = _generic_serializer(cls)
+    optional_type = _get_optional_type(cls)
+    if optional_type:
+        value_plan = _plans.serializer(optional_type)
+        return lambda obj: None if obj is None else value_plan(obj)
+
+    origin = get_origin(cls)
+    args = get_args(cls)
+
+    if _is_union_type(origin):
+        tags = _plans.union_tags(cls).tags
+        tagged = {t: (tags[t], _plans.serializer(t)) for t in args}
+
+        def serialize_union(obj):
+            entry = tagged.get(type(obj), None)
+            if entry is None:
+                return generic(obj)
+            tag, plan = entry
+            return [tag, plan(obj)]
+
+        return serialize_union
+
+    if origin is result.Result:
+        tags = _result_tags
+        value_types = set(args)
+
+        def serialize_result(obj):
+            tag = tags.get(type(obj), None)
+            value_type = type(obj._value) if tag is not None else None
+            if value_type not in value_types:
+                return generic(obj)
+            return [tag, _plans.serializer(value_type)(obj._value)]
+
+        return serialize_result
+
+    if origin is list and len(args) == 1:
+        item_plan = _plans.serializer(args[0])
+        return lambda obj: [item_plan(item) for item in obj] if type(obj) is list else generic(obj)
+
+    if origin is tuple and args:
+        item_plans = [_plans.serializer(t) for t in args]
+        return lambda obj: [plan(item) for item, plan in zip(obj, item_plans)] if type(obj) is tuple else generic(obj)
+
+    if origin is dict and len(args) == 2:
+        key_plan = _plans.serializer(args[0])
+        value_plan = _plans.serializer(args[1])
+
+        def serialize_dict(obj):
+            if type(obj) is not dict:
+                return generic(obj)
+            return {key_plan(key): value_plan(value) for key, value in obj.items()}
+
+        return serialize_dict
+
+    if arraylib.is_array_type(cls):
+        return _serialize_array
+
+    if origin is not None or not isinstance(cls, type):
+        return generic
+
+    if is_dataclass(cls):
+        return _compile_dataclass_serializer(cls, generic)
+
+    if cls in (int, float, str, bool):
+        return lambda obj: obj if type(obj) is cls else generic(obj)
+
+    if cls is bytes:
+        def serialize_bytes(obj):
+            if type(obj) is not bytes:
+                return generic(obj)
+            return obj if _native_bytes.get() else base64.b64encode(obj).decode('utf-8')
+
+        return serialize_bytes
+
+    if cls is datetime:
+        return lambda obj: obj.isoformat() if type(obj) is datetime else generic(obj)
+
+    if cls is type(None):
+        return lambda obj: None if obj is None else generic(obj)
+
+    if issubclass(cls, enum.Enum):
+        return lambda obj: _plans.serializer(type(obj.value))(obj.value) if type(obj) is cls else generic(obj)
+
+    return generic
+
+
+def _compile_dataclass_serializer(cls, generic: Plan) -> Plan:
+    fields = None  # the field plans are compiled at the first use, so recursive dataclasses are supported
+
+    def serialize_dataclass(obj):
+        nonlocal fields
+        if type(obj) is not cls:
+            return generic(obj)
+        if fields is None:
+            fields = [(name, _plans.serializer(t)) for name, t in typing.get_type_hints(cls).items()]
+        return {name: plan(getattr(obj, name)) for name, plan in fields}
+
+    return serialize_dataclass
+
+
+def _compile_deserializer(cls) -> Plan:
+    generic = _generic_deserializer(cls)
+    optional_type = _get_optional_type(cls)
+    if optional_type:
+        value_plan = _plans.deserializer(optional_type)
+        return lambda data: None if data is None else value_plan(data)
+
+    origin = get_origin(cls)
+    args = get_args(cls)
+
+    if _is_union_type(origin):
+        tagged = {tag: _plans.deserializer(t) for tag, t in _plans.union_tags(cls).types.items()}
+
+        def deserialize_union(data):
+            plan = tagged.get(data[0], None) if type(data) is list and len(data) == 2 else None
+            if plan is None:
+                return generic(data)
+            return plan(data[1])
+
+        return deserialize_union
+
+    if origin is result.Result and len(args) == 2:
+        success_plan = _plans.deserializer(args[0])
+        failure_plan = _plans.deserializer(args[1])
+        success_tags = [tag for tag, t in _result_types.items() if t is result.Success]
+        failure_tags = [tag for tag, t in _result_types.items() if t is result.Failure]
+
+        def deserialize_result(data):
+            if type(data) is not list or len(data) != 2:
+                return generic(data)
+            tag = data[0]
+            if tag in success_tags:
+                return result.Success(success_plan(data[1]))
+            if tag in failure_tags:
+                return result.Failure(failure_plan(data[1]))
+            return generic(data)
+
+        return deserialize_result
+
+    if is_dataclass(cls) and isinstance(cls, type):
+        return _compile_dataclass_deserializer(cls, generic)
+
+    if origin is list and len(args) == 1:
+        item_plan = _plans.deserializer(args[0])
+        return lambda data: [item_plan(item) for item in data] if type(data) is list else generic(data)
+
+    if origin is tuple and args:
+        item_plans = [_plans.deserializer(t) for t in args]
+
+        def deserialize_tuple(data):
+            if type(data) is not list or len(data) != len(item_plans):
+                return generic(data)
+            return tuple(plan(item) for item, plan in zip(data, item_plans))
+
+        return deserialize_tuple
+
+    if origin is dict and len(args) == 2:
+        key_plan = _plans.deserializer(args[0])
+        value_plan = _plans.deserializer(args[1])
+
+        def deserialize_dict(data):
+            if type(data) is not dict:
+                return generic(data)
+            return {key_plan(key): value_plan(value) for key, value in data.items()}
+
+        return deserialize_dict
+
+    if arraylib.is_array_type(cls):
+        return lambda data: _deserialize_array(data, cls)
+
+    if origin is not None or not isinstance(cls, type):
+        return generic
+
+    if cls in (int, float, str, bool):
+        # the generic implementation refuses a list, while e.g. str(list) would succeed
+        return lambda data: generic(data) if isinstance(data, list) else cls(data)
+
+    if cls is bytes:
+        def deserialize_bytes(data):
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                return bytes(data)
+            return base64.b64decode(data.encode('utf-8'))
+
+        return deserialize_bytes
+
+    if cls is datetime:
+        return datetime.fromisoformat
+
+    if cls is type(None):
+        return lambda data: None if data is None else generic(data)
+
+    if issubclass(cls, enum.Enum) and len(cls) > 0:
+        value_plan = _plans.deserializer(type(next(iter(cls)).value))
+        return lambda data: cls(value_plan(data))
+
+    return generic
+
+
+def _compile_dataclass_deserializer(cls, generic: Plan) -> Plan:
+    fields = None  # the field plans are compiled at the first use, so recursive dataclasses are supported
+
+    def deserialize_dataclass(data):
+        nonlocal fields
+        if type(data) is not dict:
+            return generic(data)
+        if fields is None:
+            fields = [(name, _plans.deserializer(t)) for name, t in typing.get_type_hints(cls).items()]
+        return cls(**{name: plan(data[name]) for name, plan in fields if name in data})
+
+    return deserialize_dataclass
+
+
 def to_json(obj: Any, cls: Type[T]) -> str:
     """
     Serialize an object to a JSON string.
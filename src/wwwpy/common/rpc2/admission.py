@@ -0,0 +1,204 @@
+"""Admission control of the rpc calls: the concurrent executions are capped globally and per function,
+the calls above the cap wait in a bounded queue, and the calls that do not fit in the queue are rejected at once.
+
+The server answers a rejected call with http 503 and Retry-After (or with the overloaded status, when the response
+cannot carry an http status, e.g., websocket and batch); the remote stubs retry it after a jittered delay.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder
+from wwwpy.common.rpc2.prometheus import counter, gauge, function_labels
+
+overloaded_status = 'overloaded'
+"""The status of the response of a rejected call"""
+
+overloaded_http_status = 503
+
+retry_after_header = 'Retry-After'
+
+default_retry_after = 1.0
+
+default_max_concurrent = 1000
+"""The global cap of RpcRoute when none is given: the server sheds the load instead of queueing it without a bound"""
+
+
+class OverloadedError(Exception):
+    """Raised on the server when a call is rejected"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class AdmissionStats:
+    running: int
+    queue_depth: int
+    """Calls waiting for a free slot"""
+    rejected: int
+    """Calls rejected since the start"""
+
+
+class _Limiter:
+    def __init__(self, max_concurrent: int, max_queue: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.running = 0
+        self.rejected = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def stats(self) -> AdmissionStats:
+        return AdmissionStats(self.running, len(self._waiters), self.rejected)
+
+    async def acquire(self) -> bool:
+        """False when the call is rejected"""
+        if self.running < self.max_concurrent and not self._waiters:
+            self.running += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was handed over just before the cancellation
+            elif future in self._waiters:
+                self._waiters.remove(future)
+            raise
+        return True
+
+    def release(self):
+        """The slot is handed over to the first waiter, so a new call cannot overtake the queue"""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+
+class AdmissionControl:
+    """It caps the concurrent executions of the rpc functions, see the module docstring.
+    max_concurrent is the global cap, None means no global cap; max_queue is the number of calls that can wait
+    for a free slot, the others are rejected. The per module and per function caps are set with set_limit;
+    a call must be admitted by all of them. retry_after is the seconds suggested to the rejected callers.
+    It must be used from one event loop.
+    """
+
+    def __init__(self, max_concurrent: int | None = None, max_queue: int = 0,
+                 retry_after: float = default_retry_after):
+        self.retry_after = retry_after
+        self._global = None if max_concurrent is None else _new_limiter(max_concurrent, max_queue)
+        self._functions: dict[tuple[str, str], _Limiter] = {}
+        self._declared: dict[tuple[str, str], tuple[int, int] | None] = {}
+        """The limits of the max_concurrency decorator; None for the functions with a limit set by set_limit"""
+
+    def set_limit(self, module_name: str, func_name: str, max_concurrent: int | None, max_queue: int = 0):
+        """An empty func_name caps the functions of the module together. It takes precedence over
+        the max_concurrency decorator of the function. None removes the cap; the calls already admitted
+        keep their slot"""
+        key = (module_name, func_name)
+        if max_concurrent is None:
+            self._functions.pop(key, None)
+            self._declared.pop(key, None)
+        else:
+            self._functions[key] = _new_limiter(max_concurrent, max_queue)
+            self._declared[key] = None
+
+    def declare_limit(self, module_name: str, func_name: str, max_concurrent: int, max_queue: int = 0):
+        """The cap of the max_concurrency decorator of the function, declared at each call: it is applied
+        unless set_limit was used for the function, and again when it changes, e.g., with the hot reload"""
+        key = (module_name, func_name)
+        limit = (max_concurrent, max_queue)
+        declared = self._declared.get(key, ())
+        if declared is None or declared == limit:
+            return
+        self._functions[key] = _new_limiter(max_concurrent, max_queue)
+        self._declared[key] = limit
+
+    def stats(self) -> AdmissionStats:
+        """The stats of the global cap"""
+        return AdmissionStats(0, 0, 0) if self._global is None else self._global.stats()
+
+    def function_stats(self, module_name: str, func_name: str) -> AdmissionStats | None:
+        limiter = self._functions.get((module_name, func_name), None)
+        return None if limiter is None else limiter.stats()
+
+    @asynccontextmanager
+    async def admit(self, module_name: str, func_name: str):
+        """It waits for a slot and holds it for the block; it raises OverloadedError when the call is rejected"""
+        candidates = (self._functions.get((module_name, func_name), None),
+                      self._functions.get((module_name, ''), None), self._global)
+        limiters = [limiter for limiter in candidates if limiter is not None]
+        acquired = []
+        try:
+            for limiter in limiters:
+                if not await limiter.acquire():
+                    raise OverloadedError(f'Too many concurrent calls, {module_name}.{func_name} was rejected',
+                                          self.retry_after)
+                acquired.append(limiter)
+            yield
+        finally:
+            for limiter in acquired:
+                limiter.release()
+
+    def to_prometheus(self) -> str:
+        """The same format of RpcMetrics.to_prometheus; the global cap has no labels"""
+        items = [('', self._global)] if self._global is not None else []
+        items += [(function_labels(key), limiter) for key, limiter in sorted(self._functions.items())]
+        lines = []
+        gauge(lines, 'wwwpy_rpc_admission_running', 'Number of admitted rpc calls being executed',
+              [(labels, limiter.running) for labels, limiter in items])
+        gauge(lines, 'wwwpy_rpc_admission_queue_depth', 'Number of rpc calls waiting to be admitted',
+              [(labels, len(limiter._waiters)) for labels, limiter in items])
+        counter(lines, 'wwwpy_rpc_admission_rejected_total', 'Number of rpc calls rejected because of overload',
+                [(labels, limiter.rejected) for labels, limiter in items])
+        return '\n'.join(lines) + '\n'
+
+
+def _new_limiter(max_concurrent: int, max_queue: int) -> _Limiter:
+    if max_concurrent < 1:
+        raise ValueError(f'max_concurrent must be at least 1, got {max_concurrent}')
+    if max_queue < 0:
+        raise ValueError(f'max_queue must not be negative, got {max_queue}')
+    return _Limiter(max_concurrent, max_queue)
+
+
+def encode_overloaded(encdec: EncoderDecoder, error: OverloadedError) -> str | bytes:
+    """The response of a rejected call, DefaultStub raises RemoteOverloadedError"""
+    encoder = encdec.encoder()
+    encoder.encode(overloaded_status, str)
+    encoder.encode(str(error), str)
+    encoder.encode(float(error.retry_after), float)
+    return encoder.buffer
+
+
+def format_retry_after(seconds: float) -> str:
+    """The http header wants whole seconds"""
+    return str(max(1, math.ceil(seconds)))
+
+
+def parse_retry_after(value: str | None) -> float:
+    """The default when the value is missing or it is not in seconds (e.g., an http date)"""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return default_retry_after
+    return seconds if seconds >= 0 else default_retry_after
+
+
+def retry_delay(attempt: int, retry_after: float) -> float:
+    """The seconds to wait before the given retry (0 is the first one): the exponential backoff from retry_after
+    with half of it random, so the rejected callers do not come back all together"""
+    delay = retry_after * 2 ** attempt
+    return delay / 2 + random.uniform(0, delay / 2)
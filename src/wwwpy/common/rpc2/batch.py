@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Callable, Awaitable, AsyncIterator
+
+from wwwpy.common.asynclib import create_task_safe
+from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder, is_parts
+from wwwpy.common.rpc2.transport import Transport
+
+logger = logging.getLogger(__name__)
+
+batch_parameter = 'wwwpy-batch'
+"""The content type parameter that marks a request as a batch envelope"""
+
+
+def batch_content_type(content_type: str) -> str:
+    return f'{content_type}; {batch_parameter}=1'
+
+
+def is_batch(content_type: str | None) -> bool:
+    if not content_type:
+        return False
+    params = content_type.split(';')[1:]
+    return any(p.strip().split('=')[0] == batch_parameter for p in params)
+
+
+def encode_batch(encdec: EncoderDecoder, payloads: list[str | bytes]) -> str | bytes:
+    """The envelope is a list of payloads, each one is a complete request or response of the given encdec"""
+    encoder = encdec.encoder()
+    encoder.encode(payloads, list[_payload_type(payloads)])
+    return encoder.buffer
+
+
+def decode_batch(encdec: EncoderDecoder, envelope: str | bytes) -> list[str | bytes]:
+    decoder = encdec.decoder(envelope)
+    return decoder.decode(list[bytes if isinstance(envelope, bytes) else str])
+
+
+def _payload_type(payloads: list[str | bytes]) -> type:
+    return bytes if payloads and isinstance(payloads[0], bytes) else str
+
+
+PostFunction = Callable[[str | bytes, bool], Awaitable[str | bytes]]
+"""It sends the payload and returns the response; the bool argument tells if the payload is a batch envelope"""
+
+
+class Batcher:
+    """It collects the payloads submitted in the same event loop iteration and sends them with one post.
+    A single payload is sent as it is, without the envelope."""
+
+    def __init__(self, post: PostFunction, encdec: EncoderDecoder):
+        self._post = post
+        self._encdec = encdec
+        self._pending: list[tuple[str | bytes, asyncio.Future]] = []
+
+    def submit(self, payload: str | bytes) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            loop.call_soon(self._flush)
+        self._pending.append((payload, future))
+        return future
+
+    def _flush(self):
+        pending = self._pending
+        self._pending = []
+        create_task_safe(self._send(pending))
+
+    async def _send(self, pending: list[tuple[str | bytes, asyncio.Future]]):
+        try:
+            if len(pending) == 1:
+                responses = [await self._post(pending[0][0], False)]
+            else:
+                envelope = encode_batch(self._encdec, [payload for payload, _ in pending])
+                responses = decode_batch(self._encdec, await self._post(envelope, True))
+                if len(responses) != len(pending):
+                    raise Exception(f'Batch of {len(pending)} requests received {len(responses)} responses')
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), response in zip(pending, responses):
+            if not future.done():
+                future.set_result(response)
+
+
+class BatchTransport(Transport):
+    """A Transport that shares a Batcher; concurrent calls of the same event loop iteration travel in one post.
+    The response is kept per asyncio task, so concurrent calls through the same instance do not mix up.
+
+    Sync calls, streams, idempotent calls and parts payloads (see PartsEncoderDecoder) cannot be batched:
+    they are delegated to the sync_transport.
+    """
+
+    def __init__(self, batcher: Batcher, sync_transport: Transport):
+        self._batcher = batcher
+        self._sync_transport = sync_transport
+        self._responses: dict[asyncio.Task, str | bytes] = {}
+
+    async def send_async(self, payload: str | bytes):
+        task = asyncio.current_task()
+        if task in self._responses:
+            raise Exception('Cannot send twice with this implementation')
+        if is_parts(payload):
+            await self._sync_transport.send_async(payload)
+            self._responses[task] = await self._sync_transport.recv_async()
+        else:
+            self._responses[task] = await self._batcher.submit(payload)
+
+    async def recv_async(self) -> str | bytes:
+        response = self._responses.pop(asyncio.current_task(), None)
+        if response is None:
+            raise Exception('Cannot consume before sending')
+        return response
+
+    def recv_stream_async(self, payload: str | bytes) -> AsyncIterator[str | bytes]:
+        return self._sync_transport.recv_stream_async(payload)
+
+    async def call_idempotent_async(self, payload: str | bytes) -> str | bytes:
+        return await self._sync_transport.call_idempotent_async(payload)
+
+    def call_idempotent_sync(self, payload: str | bytes) -> str | bytes:
+        return self._sync_transport.call_idempotent_sync(payload)
+
+    def send_sync(self, payload: str | bytes):
+        self._sync_transport.send_sync(payload)
+
+    def recv_sync(self) -> str | bytes:
+        return self._sync_transport.recv_sync()
@@ -0,0 +1,59 @@
+"""The deadline of the rpc calls. The caller sets it around the calls:
+
+    with deadline.timeout(5):
+        await server.rpc.search('abc')
+
+The stub raises RemoteTimeoutError when it expires; the transports send the remaining seconds with the request,
+so the server stops waiting for the function too, see DefaultSkeleton.
+Seconds are sent instead of the deadline itself because the clocks of the caller and of the server may differ.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+timeout_header = 'wwwpy-timeout'
+"""The http header with the remaining seconds of the call"""
+
+timeout_status = 'timeout'
+"""The status of the response of a call whose deadline expired on the server"""
+
+_deadline: ContextVar[float | None] = ContextVar('wwwpy_rpc_deadline', default=None)
+
+
+@contextmanager
+def timeout(seconds: float):
+    """The calls inside expire after the given seconds; a nested timeout cannot extend the outer one"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and current < deadline:
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """The seconds left before the deadline, or None when there is no deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def format_timeout(seconds: float) -> str:
+    return f'{seconds:.3f}'
+
+
+def parse_timeout(value: str | None) -> float | None:
+    """None when the value is missing or malformed"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    return seconds if seconds >= 0 else None
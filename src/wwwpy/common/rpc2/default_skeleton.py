@@ -1,14 +1,20 @@
 from __future__ import annotations
 
+import inspect
 import traceback
 from contextlib import contextmanager
 from dataclasses import dataclass
 from types import FunctionType
+from typing import Callable, AsyncIterator
 
-from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder
+from wwwpy.common.rpc2 import deadline
+from wwwpy.common.rpc2.dispatch_cache import DispatchCache
+from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder, Decoder
+from wwwpy.common.rpc2.options import get_options, RpcOptions
 from wwwpy.common.rpc2.skeleton import Skeleton
+from wwwpy.common.rpc2.stream import item_status, end_status
 from wwwpy.common.rpc2.transport import Transport
-from wwwpy.common.rpc2.typed_function import get_typed_function, TypedFunction
+from wwwpy.common.rpc2.typed_function import TypedFunction
 from wwwpy.unasync import unasync
 
 
@@ -19,12 +25,18 @@ def _get_return_type(func): ...
 
 
 class DefaultSkeleton(Skeleton):
-    def __init__(self, transport: Transport, encdec: EncoderDecoder, allowed_modules: set[str]):
+    def __init__(self, transport: Transport, encdec: EncoderDecoder, allowed_modules: set[str],
+                 dispatch_cache: DispatchCache | None = None):
+        """The policies of the server (thread pool, caches, admission, metrics, deadline) are applied
+        by wwwpy.server.rpc_skeleton.RpcSkeleton"""
         self._transport = transport
         self._encdec = encdec
         self._allowed_modules = allowed_modules
+        self._dispatch_cache = dispatch_cache if dispatch_cache is not None else DispatchCache()
 
     def invoke_tobe_fixed(self):
+        """To be used only by callers that cannot await; coroutine functions are run with unasync,
+        i.e., in a new thread with its own event loop. Callers running on an event loop should use invoke_async"""
         recv_buffer = self._transport.recv_sync()
         args, func, target_function = self._decode_request(recv_buffer)
 
@@ -54,44 +66,108 @@ class DefaultSkeleton(Skeleton):
         send_buffer = self._encode_result(target_function, r)
         self._transport.send_sync(send_buffer)
 
-    async def invoke_async(self):
-        # raise Exception('Not implemented - see invoke_tobe_fixed')
+    async def invoke_async(self) -> RpcOptions:
+        """It returns the options of the invoked function"""
         recv_buffer = await self._transport.recv_async()
-        args, func, target_function = self._decode_request(recv_buffer)
+        decoder, module_name, func, target_function = self._decode_function(recv_buffer)
+        args = self._decode_args(decoder, target_function)
+
+        if target_function.is_stream:
+            await self._transport.send_stream_async(self._stream_messages(target_function, func, args))
+            return get_options(func)
+
+        r = await self._result_async(target_function, func, args)
+        await self._transport.send_async(self._encode_result(target_function, r))
+        return get_options(func)
 
+    async def _result_async(self, target_function: TypedFunction, func: FunctionType, args: list[any]) -> _Result:
         with _catch() as r:
-            r.value = await func(*args)
+            r.value = await self._execute_async(target_function, func, args)
+        return r
 
-        send_buffer = self._encode_result(target_function, r)
-        await self._transport.send_async(send_buffer)
+    async def _execute_async(self, target_function: TypedFunction, func: FunctionType, args: list[any]) -> any:
+        if target_function.is_coroutine:
+            return await func(*args)
+        return func(*args)
+
+    async def _stream_messages(self, target_function: TypedFunction, func: FunctionType, args: list[any],
+                               done: Callable[[int, bool], None] | None = None) -> AsyncIterator[str | bytes]:
+        """The function is iterated only when the transport asks for the next message, this gives the backpressure.
+        When the transport stops iterating (e.g., the caller went away) the function iterator is closed.
+        done is called at the end with the size of the messages and whether the function failed"""
+        iterator = None
+        size = 0
+        error = False
+        try:
+            item_type = target_function.item_type
+            iterator = func(*args)
+            if inspect.isawaitable(iterator):
+                iterator = await iterator
+            async for item in iterator:
+                encoder = self._encdec.encoder()
+                encoder.encode(item_status, str)
+                encoder.encode(item, item_type)
+                size += len(encoder.buffer)
+                yield encoder.buffer
+            encoder = self._encdec.encoder()
+            encoder.encode(end_status, str)
+            size += len(encoder.buffer)
+            yield encoder.buffer
+        except Exception:
+            error = True
+            buffer = encode_exception(self._encdec, traceback.format_exc())
+            size += len(buffer)
+            yield buffer
+        finally:
+            aclose = getattr(iterator, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+            if done is not None:
+                done(size, error)
 
     def _decode_request(self, recv_buffer) -> tuple[list[any], FunctionType, TypedFunction]:
+        decoder, _, func, target_function = self._decode_function(recv_buffer)
+        return self._decode_args(decoder, target_function), func, target_function
+
+    def _decode_function(self, recv_buffer) -> tuple[Decoder, str, FunctionType, TypedFunction]:
+        """It decodes the request up to the function; the decoder is left before the arguments"""
         decoder = self._encdec.decoder(recv_buffer)
         module_name = decoder.decode(str)
         if module_name not in self._allowed_modules:
             raise Exception(f'Not allowed module: {module_name}')
         func_name = decoder.decode(str)
-        import importlib
-        module = importlib.import_module(module_name)
-        func = getattr(module, func_name)
-        target_function = get_typed_function(func)
-        args = []
-        for arg_type in target_function.args_types:
-            args.append(decoder.decode(arg_type))
-        return args, func, target_function
+        func, target_function = self._dispatch_cache.resolve(module_name, func_name)
+        return decoder, module_name, func, target_function
+
+    def _decode_args(self, decoder: Decoder, target_function: TypedFunction) -> list[any]:
+        return [decoder.decode(arg_type) for arg_type in target_function.args_types]
 
     def _encode_result(self, target_function, result: _Result):
-        encoder = self._encdec.encoder()
         if result.exception_str:
-            encoder.encode('ex', str)
-            encoder.encode(result.exception_str, str)
-        else:
-            encoder.encode('ok', str)
-            encoder.encode(result.value, target_function.return_type)
+            return encode_exception(self._encdec, result.exception_str)
+        encoder = self._encdec.encoder()
+        encoder.encode('ok', str)
+        encoder.encode(result.value, target_function.return_type)
         send_buffer = encoder.buffer
         return send_buffer
 
 
+def encode_exception(encdec: EncoderDecoder, exception_str: str) -> str | bytes:
+    """The response of a failed call, as decoded by DefaultStub"""
+    encoder = encdec.encoder()
+    encoder.encode('ex', str)
+    encoder.encode(exception_str, str)
+    return encoder.buffer
+
+
+def encode_timeout(encdec: EncoderDecoder, function_name: str) -> str | bytes:
+    """The response of a call that did not complete before its deadline, DefaultStub raises RemoteTimeoutError"""
+    encoder = encdec.encoder()
+    encoder.encode(deadline.timeout_status, str)
+    encoder.encode(f'The deadline of {function_name} expired on the server', str)
+    return encoder.buffer
+
+
 @dataclass
 class _Result:
     value: any = None
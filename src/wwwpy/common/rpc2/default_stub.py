@@ -1,22 +1,34 @@
 from __future__ import annotations
 
+import asyncio
 import types
 from types import SimpleNamespace
+from typing import AsyncIterator
 
-from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder
+from wwwpy.common.rpc2 import deadline, admission
+from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder, PartsEncoderDecoder, is_part_type
+from wwwpy.common.rpc2.idempotent import fits_query
+from wwwpy.common.rpc2.options import get_options
+from wwwpy.common.rpc2.stream import item_status, end_status
 from wwwpy.common.rpc2.stub import Stub
 from wwwpy.common.rpc2.transport import Transport
 from wwwpy.common.rpc2.typed_function import TypedFunction, get_typed_function
-from wwwpy.exceptions import RemoteException, RemoteError
+from wwwpy.exceptions import RemoteException, RemoteError, RemoteTimeoutError, RemoteOverloadedError
 
 
 class DefaultStub(Stub):
 
-    def __init__(self, transport: Transport, encdec: EncoderDecoder, module_name: str):
+    def __init__(self, transport: Transport, encdec: EncoderDecoder, module_name: str, overload_retries: int = 3):
+        """overload_retries is the number of times an async call rejected by the overloaded server is retried,
+        after the jittered delay of admission.retry_delay; the sync calls are not retried.
+        The calls of the functions with binary or numeric array arguments or result use PartsEncoderDecoder
+        around encdec, so they travel out of band; the streaming functions always use encdec"""
+        self.overload_retries = overload_retries
         self.namespace = SimpleNamespace()
         self._module_name = module_name
         self._transport = transport
         self._encdec = encdec
+        self._parts = PartsEncoderDecoder(encdec)
 
     def setup_functions(self, *functions: types.FunctionType) -> None:
         for f in functions:
@@ -27,40 +39,106 @@ class DefaultStub(Stub):
 
     def _add_function(self, f):
         ft = get_typed_function(f)
+        idempotent = get_options(f).idempotent
 
         def fun_sync(*args):
-            return self.invoke_sync(ft, args)
+            return self.invoke_sync(ft, args, idempotent)
 
         async def fun_async(*args):
-            return await self.invoke_async(ft, args)
+            return await self.invoke_async(ft, args, idempotent)
 
-        fun = fun_async if ft.is_coroutine else fun_sync
+        def fun_stream(*args):
+            return self.invoke_stream(ft, args)
+
+        fun = fun_stream if ft.is_stream else fun_async if ft.is_coroutine else fun_sync
         setattr(self.namespace, ft.func_name, fun)
 
-    def invoke_sync(self, target_function: TypedFunction, args) -> any:
+    def invoke_sync(self, target_function: TypedFunction, args, idempotent: bool = False) -> any:
         send_buffer = self._encode_request(target_function, args)
 
-        self._transport.send_sync(send_buffer)
-
-        recv_buffer = self._transport.recv_sync()
+        if idempotent and fits_query(send_buffer):
+            recv_buffer = self._transport.call_idempotent_sync(send_buffer)
+        else:
+            self._transport.send_sync(send_buffer)
+            recv_buffer = self._transport.recv_sync()
         decode = self._decode_result(target_function, recv_buffer)
         return decode
 
-    async def invoke_async(self, target_function: TypedFunction, args) -> any:
+    async def invoke_async(self, target_function: TypedFunction, args, idempotent: bool = False) -> any:
         send_buffer = self._encode_request(target_function, args)
-
-        await self._transport.send_async(send_buffer)
-        recv_buffer = await self._transport.recv_async()
+        idempotent = idempotent and fits_query(send_buffer)
+
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt_async(target_function, send_buffer, idempotent)
+            except RemoteOverloadedError as e:
+                delay = admission.retry_delay(attempt, e.retry_after)
+                remaining = deadline.remaining()
+                if attempt >= self.overload_retries or (remaining is not None and delay >= remaining):
+                    raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _attempt_async(self, target_function: TypedFunction, send_buffer: str | bytes,
+                             idempotent: bool) -> any:
+        timeout = deadline.remaining()
+        exchange = self._exchange_async(send_buffer, idempotent)
+        if timeout is None:
+            recv_buffer = await exchange
+        else:
+            try:
+                recv_buffer = await asyncio.wait_for(exchange, timeout)
+            except asyncio.TimeoutError:
+                raise RemoteTimeoutError(f'The deadline of {self._module_name}.{target_function.func_name} expired')
 
         decode = self._decode_result(target_function, recv_buffer)
         return decode
 
+    async def _exchange_async(self, send_buffer: str | bytes, idempotent: bool) -> str | bytes:
+        """When it is cancelled (e.g., the deadline expired) the transport tells the server to cancel the call"""
+        if idempotent:
+            return await self._transport.call_idempotent_async(send_buffer)
+        await self._transport.send_async(send_buffer)
+        return await self._transport.recv_async()
+
+    async def invoke_stream(self, target_function: TypedFunction, args) -> AsyncIterator[any]:
+        """It yields the items as they arrive; closing it before the end cancels the call on the server"""
+        send_buffer = self._encode_request(target_function, args)
+        messages = self._transport.recv_stream_async(send_buffer)
+        try:
+            async for recv_buffer in messages:
+                decoder = self._encdec.decoder(recv_buffer)
+                status = decoder.decode(str)
+                if status == item_status:
+                    yield decoder.decode(target_function.item_type)
+                elif status == end_status:
+                    return
+                elif status == 'ex':
+                    raise RemoteException(decoder.decode(str))
+                else:
+                    raise RemoteError(f'Unknown status: `{status}`')
+            raise RemoteError('The stream ended without the end message')
+        finally:
+            await messages.aclose()
+
+    def _encdec_for(self, target_function: TypedFunction) -> EncoderDecoder:
+        if target_function.is_stream:
+            return self._encdec
+        types_ = [*target_function.args_types, target_function.return_type]
+        return self._parts if any(is_part_type(t) for t in types_) else self._encdec
+
     def _decode_result(self, target_function, recv_buffer):
-        decoder = self._encdec.decoder(recv_buffer)
+        decoder = self._encdec_for(target_function).decoder(recv_buffer)
         status = decoder.decode(str)
         if status == 'ex':
             exception = decoder.decode(str)
             raise RemoteException(exception)
+        elif status == deadline.timeout_status:
+            raise RemoteTimeoutError(decoder.decode(str))
+        elif status == admission.overloaded_status:
+            message = decoder.decode(str)
+            raise RemoteOverloadedError(message, decoder.decode(float))
         elif status == 'ok':
             decode = decoder.decode(target_function.return_type)
             return decode
@@ -68,7 +146,7 @@ class DefaultStub(Stub):
             raise RemoteError(f'Unknown status: `{status}`')
 
     def _encode_request(self, target_function, args):
-        encoder = self._encdec.encoder()
+        encoder = self._encdec_for(target_function).encoder()
         encoder.encode(self._module_name, str)
         encoder.encode(target_function.func_name, str)
         for arg, arg_type in zip(args, target_function.args_types):
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import importlib
+from types import FunctionType
+from typing import NamedTuple
+
+from wwwpy.common import reloader
+from wwwpy.common.rpc2.typed_function import get_typed_function, TypedFunction
+
+
+class DispatchEntry(NamedTuple):
+    func: FunctionType
+    typed_function: TypedFunction
+
+
+class DispatchCache:
+    """It caches the resolved function and its TypedFunction, keyed by (module, function).
+    Resolving requires importlib, getattr and the reflection done by get_typed_function,
+    so it is done only once per function.
+
+    The entries are dropped when the reloader generation changes, that is when the hot reload unloads modules.
+    """
+
+    def __init__(self):
+        self._entries: dict[tuple[str, str], DispatchEntry] = {}
+        self._generation = reloader.generation()
+
+    def resolve(self, module_name: str, func_name: str) -> DispatchEntry:
+        generation = reloader.generation()
+        if generation != self._generation:
+            self._entries = {}
+            self._generation = generation
+
+        key = (module_name, func_name)
+        entry = self._entries.get(key, None)
+        if entry is None:
+            entry = _resolve(module_name, func_name)
+            self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _resolve(module_name: str, func_name: str) -> DispatchEntry:
+    module = importlib.import_module(module_name)
+    func = getattr(module, func_name)
+    return DispatchEntry(func, get_typed_function(func))
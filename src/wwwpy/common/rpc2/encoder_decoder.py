@@ -1,7 +1,13 @@
 from __future__ import annotations
 
-from typing import TypeVar, Union, Type
+import struct
+import types
+import typing
+from typing import TypeVar, Union, Type, Optional
 
+from dataclasses import dataclass
+
+from wwwpy.common import msgpacklib, arraylib
 from wwwpy.common.rpc import serialization
 
 T = TypeVar('T')
@@ -24,6 +30,9 @@ class Decoder(EncoderDecoderType):
 
 
 class EncoderDecoder:
+    content_type: str
+    """The http content type of the buffers; it is used to select the EncoderDecoder on the server"""
+
     def decoder(self, buffer: str | bytes) -> Decoder: raise NotImplementedError
 
     def encoder(self) -> Encoder: raise NotImplementedError
@@ -52,6 +61,7 @@ class JsonDecoder(Decoder):
 
 
 class JsonEncoderDecoder(EncoderDecoder):
+    content_type = 'text/plain'
 
     def __init__(self):
         self._sep = '\n'
@@ -61,3 +71,204 @@ class JsonEncoderDecoder(EncoderDecoder):
 
     def encoder(self) -> Encoder:
         return JsonEncoder(sep=self._sep)
+
+
+class MsgpackEncoder(Encoder):
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def encode(self, obj: any, cls: Type[T]):
+        with serialization.native_bytes():
+            msgpacklib.pack_into(serialization.serialize(obj, cls), self._buffer)
+
+    @property
+    def buffer(self) -> bytes:
+        return bytes(self._buffer)
+
+
+class MsgpackDecoder(Decoder):
+    def __init__(self, buffer: bytes):
+        self._unpacker = msgpacklib.Unpacker(buffer)
+
+    def decode(self, cls: Type[T]) -> T:
+        if self._unpacker.at_end():
+            raise StopIteration('No more objects in the buffer')
+        return serialization.deserialize(self._unpacker.unpack(), cls)
+
+
+class MsgpackEncoderDecoder(EncoderDecoder):
+    """A binary alternative to JsonEncoderDecoder: the objects are a stream of MessagePack values, one after the other.
+    Bytes, ints and floats are carried natively, i.e., without base64 or text conversion. The buffers are smaller,
+    but msgpacklib is pure python: it is much faster than json with bytes and slower with many small values"""
+    content_type = 'application/msgpack'
+
+    def decoder(self, buffer: str | bytes) -> Decoder:
+        return MsgpackDecoder(buffer)
+
+    def encoder(self) -> Encoder:
+        return MsgpackEncoder()
+
+
+binary_types = (bytes, bytearray, memoryview)
+"""The types carried as out of band parts by PartsEncoderDecoder, together with the numeric arrays"""
+
+parts_media_type = 'application/x-wwwpy-parts'
+_parts_parameter = 'encoding'
+_parts_magic = b'\x00wpp'
+"""A parts message starts with it; no request of the other EncoderDecoders can, see is_parts"""
+_parts_count = struct.Struct('<I')
+_parts_length = struct.Struct('<Q')
+
+
+def is_part_type(cls: type) -> bool:
+    """True for the types carried as out of band parts: the binary types, the numeric arrays and their Optional"""
+    cls = _non_optional(cls)
+    return cls in binary_types or arraylib.is_array_type(cls)
+
+
+def _non_optional(cls: type) -> type:
+    origin = typing.get_origin(cls)
+    if origin is typing.Union or origin is types.UnionType:
+        args = typing.get_args(cls)
+        if len(args) == 2 and type(None) in args:
+            return args[0] if args[1] is type(None) else args[1]
+    return cls
+
+
+def is_parts(payload: str | bytes) -> bool:
+    return isinstance(payload, (bytes, bytearray, memoryview)) and bytes(payload[:len(_parts_magic)]) == _parts_magic
+
+
+def pack_parts(parts: list[bytes | bytearray | memoryview]) -> bytes:
+    """The magic, the number of parts, the length of each part and then the parts, one after the other"""
+    lengths = [_parts_length.pack(len(p)) for p in parts]
+    return b''.join([_parts_magic, _parts_count.pack(len(parts)), *lengths, *parts])
+
+
+def unpack_parts(buffer: bytes | bytearray | memoryview) -> list[memoryview]:
+    """The parts are views of the buffer, nothing is copied"""
+    view = memoryview(buffer)
+    if not is_parts(view):
+        raise ValueError('The buffer is not a parts message')
+    offset = len(_parts_magic)
+    count, = _parts_count.unpack_from(view, offset)
+    offset += _parts_count.size
+    lengths = [_parts_length.unpack_from(view, offset + i * _parts_length.size)[0] for i in range(count)]
+    offset += count * _parts_length.size
+    parts = []
+    for length in lengths:
+        if offset + length > len(view):
+            raise ValueError('The parts message is truncated')
+        parts.append(view[offset:offset + length])
+        offset += length
+    return parts
+
+
+@dataclass
+class _ArrayPart:
+    """What the inner EncoderDecoder carries for an array, the elements are in the part"""
+    dtype: str
+    shape: list[int]
+    part: int
+
+
+class PartsEncoder(Encoder):
+    def __init__(self, inner: Encoder):
+        self._inner = inner
+        self._parts: list[memoryview] = []
+
+    def encode(self, obj: any, cls: Type[T]):
+        if not is_part_type(cls):
+            self._inner.encode(obj, cls)
+        elif arraylib.is_array_type(_non_optional(cls)):
+            array_part = None
+            if obj is not None:
+                header, buffer = arraylib.to_buffer(obj)
+                array_part = _ArrayPart(header.dtype, list(header.shape), self._append(buffer))
+            self._inner.encode(array_part, Optional[_ArrayPart])
+        elif obj is None:
+            self._inner.encode(None, Optional[int])
+        else:
+            if not isinstance(obj, binary_types):
+                raise TypeError(f'Expected a bytes-like object for {cls}, got {type(obj)}')
+            self._inner.encode(self._append(memoryview(obj).cast('B')), Optional[int])
+
+    def _append(self, part: memoryview) -> int:
+        self._parts.append(part)
+        return len(self._parts) - 1
+
+    @property
+    def buffer(self) -> bytes:
+        header = self._inner.buffer
+        if isinstance(header, str):
+            header = header.encode('utf-8')
+        return pack_parts([header, *self._parts])
+
+
+class PartsDecoder(Decoder):
+    def __init__(self, buffer: bytes | bytearray | memoryview, inner: EncoderDecoder):
+        header, *self._parts = unpack_parts(buffer)
+        self._inner = inner.decoder(str(header, 'utf-8') if isinstance(inner, JsonEncoderDecoder) else header)
+
+    def decode(self, cls: Type[T]) -> T:
+        if not is_part_type(cls):
+            return self._inner.decode(cls)
+        cls = _non_optional(cls)
+        if arraylib.is_array_type(cls):
+            array_part = self._inner.decode(Optional[_ArrayPart])
+            if array_part is None:
+                return None
+            header = arraylib.ArrayHeader(array_part.dtype, tuple(array_part.shape))
+            return arraylib.from_buffer(header, self._parts[array_part.part], cls)
+        index = self._inner.decode(Optional[int])
+        if index is None:
+            return None
+        part = self._parts[index]
+        if cls is memoryview:
+            return part
+        if cls is bytearray:
+            return bytearray(part)
+        return bytes(part)
+
+
+class PartsEncoderDecoder(EncoderDecoder):
+    """It wraps another EncoderDecoder: the top level bytes, bytearray, memoryview and numeric arrays (e.g., the
+    arguments and the result of a function) travel as out of band parts of a length-prefixed binary message,
+    instead of being serialized (e.g., base64 in json). The other objects are left to the inner EncoderDecoder.
+
+    A memoryview and a numpy.ndarray are decoded as views of the received buffer, without copies; bytes, bytearray
+    and array.array are copied once from it, see arraylib. The part types nested in other types
+    (e.g., list[bytes]) are serialized by the inner EncoderDecoder"""
+
+    def __init__(self, inner: EncoderDecoder):
+        self.inner = inner
+        self.content_type = parts_content_type(inner.content_type)
+
+    def decoder(self, buffer: str | bytes) -> Decoder:
+        return PartsDecoder(buffer, self.inner)
+
+    def encoder(self) -> Encoder:
+        return PartsEncoder(self.inner.encoder())
+
+
+def parts_content_type(inner_content_type: str) -> str:
+    return f'{parts_media_type}; {_parts_parameter}={inner_content_type}'
+
+
+def payload_content_type(payload: str | bytes, content_type: str) -> str:
+    """The content type to send the payload with: the parts content type when the payload is a parts message;
+    content_type is the one of the inner EncoderDecoder"""
+    return parts_content_type(content_type) if is_parts(payload) else content_type
+
+
+def encoder_decoder_for(content_type: str | None) -> EncoderDecoder:
+    """It selects the EncoderDecoder by the media type, parameters excluded; the default is JsonEncoderDecoder.
+    The parts media type wraps the EncoderDecoder of its encoding parameter"""
+    media_type, *params = (content_type or '').split(';')
+    media_type = media_type.strip().lower()
+    if media_type == parts_media_type:
+        encoding = [value for name, _, value in (p.strip().partition('=') for p in params) if name == _parts_parameter]
+        return PartsEncoderDecoder(encoder_decoder_for(encoding[0] if encoding else None))
+    if media_type == MsgpackEncoderDecoder.content_type:
+        return MsgpackEncoderDecoder()
+    return JsonEncoderDecoder()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+from urllib.parse import quote, unquote
+
+from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder
+
+_text_parameter = 'q'
+"""The query parameter of a text request, it is percent-encoded"""
+_binary_parameter = 'b'
+"""The query parameter of a binary request, it is base64url encoded without padding"""
+_content_type_parameter = 'ct'
+
+max_query_length = 2048
+"""The longest query of an idempotent call sent with GET; the longer requests are sent with POST, uncached,
+because the webservers and the proxies reject the long urls (e.g., with 414 or 431)"""
+
+
+def encode_query(payload: str | bytes, content_type: str) -> str:
+    """The query string of a GET request. The same payload always gives the same query, so it can be used
+    as the key of the browser and of the intermediate caches"""
+    if isinstance(payload, str):
+        query = f'{_text_parameter}={quote(payload, safe="")}'
+    else:
+        query = f'{_binary_parameter}={base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")}'
+    if content_type != JsonEncoderDecoder.content_type:
+        query += f'&{_content_type_parameter}={quote(content_type, safe="")}'
+    return query
+
+
+def fits_query(payload: str | bytes) -> bool:
+    """True when the query of the payload is not longer than max_query_length, the content type aside"""
+    if isinstance(payload, bytes):
+        length = (len(payload) * 4 + 2) // 3
+    else:
+        length = len(quote(payload, safe=''))
+    return length + len(_text_parameter) + 1 <= max_query_length
+
+
+def decode_query(query: str) -> tuple[str | bytes, str]:
+    """It returns the payload and the content type of its EncoderDecoder"""
+    params = dict(p.partition('=')[::2] for p in query.split('&') if p)
+    content_type = unquote(params.get(_content_type_parameter, JsonEncoderDecoder.content_type))
+    if _text_parameter in params:
+        return unquote(params[_text_parameter]), content_type
+    if _binary_parameter in params:
+        data = params[_binary_parameter]
+        return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4)), content_type
+    raise ValueError(f'The query does not contain a request: `{query}`')
+
+
+def etag(content: str | bytes) -> str:
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    return f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, tag: str) -> bool:
+    """True when the If-None-Match header lists the tag, i.e., the caller already has the response"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == tag:
+            return True
+    return False
+
+
+def cache_control(max_age: int) -> str:
+    """With max_age 0 the caches keep the response but revalidate it at every use, with If-None-Match"""
+    return f'max-age={max_age}' if max_age > 0 else 'no-cache'
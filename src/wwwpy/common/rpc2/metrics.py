@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from wwwpy.common.rpc2.prometheus import counter, histogram, function_labels
+
+default_buckets = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+"""The upper bounds, in seconds, of the latency histograms"""
+
+phases = ('queue', 'decode', 'execute', 'encode')
+"""queue is the wait for the admission, see AdmissionControl"""
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple[float, ...] = default_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        """Not cumulative; the last one is for the values above the last bucket"""
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class FunctionMetrics:
+    __slots__ = ('calls', 'errors', 'request_bytes', 'response_bytes', 'duration', 'phases')
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.calls = 0
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        """The sizes are the lengths of the buffers, i.e., characters for the text EncoderDecoder"""
+        self.duration = Histogram(buckets)
+        self.phases = {phase: Histogram(buckets) for phase in phases}
+
+
+class RpcMetrics:
+    """It collects the metrics of the rpc calls per (module, function): calls, errors, latency histograms
+    (total and per phase) and the request and response sizes. to_prometheus exports them.
+
+    Recording a call costs a few perf_counter calls and counter updates, so it can stay on in production.
+    Only the functions resolved by the DispatchCache are recorded, so the labels cannot be chosen by the callers.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = default_buckets):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._functions: dict[tuple[str, str], FunctionMetrics] = {}
+
+    def sample(self, request_size: int) -> Sample:
+        return Sample(self, request_size)
+
+    def get(self, module_name: str, func_name: str) -> FunctionMetrics | None:
+        return self._functions.get((module_name, func_name), None)
+
+    def reset(self):
+        with self._lock:
+            self._functions.clear()
+
+    def _record(self, sample: Sample, response_size: int, error: bool, duration: float):
+        key = (sample.module_name, sample.func_name)
+        with self._lock:
+            fm = self._functions.get(key, None)
+            if fm is None:
+                fm = self._functions[key] = FunctionMetrics(self.buckets)
+            fm.calls += 1
+            if error:
+                fm.errors += 1
+            fm.request_bytes += sample.request_size
+            fm.response_bytes += response_size
+            fm.duration.observe(duration)
+            for phase, elapsed in sample.phases.items():
+                fm.phases[phase].observe(elapsed)
+
+    def to_prometheus(self) -> str:
+        """The text exposition format, see https://prometheus.io/docs/instrumenting/exposition_formats/"""
+        with self._lock:
+            items = sorted(self._functions.items())
+            lines = []
+            counter(lines, 'wwwpy_rpc_calls_total', 'Number of rpc calls',
+                    [(function_labels(k), fm.calls) for k, fm in items])
+            counter(lines, 'wwwpy_rpc_errors_total', 'Number of rpc calls that raised an exception',
+                    [(function_labels(k), fm.errors) for k, fm in items])
+            counter(lines, 'wwwpy_rpc_request_bytes_total', 'Size of the rpc requests',
+                    [(function_labels(k), fm.request_bytes) for k, fm in items])
+            counter(lines, 'wwwpy_rpc_response_bytes_total', 'Size of the rpc responses',
+                    [(function_labels(k), fm.response_bytes) for k, fm in items])
+            histogram(lines, 'wwwpy_rpc_duration_seconds', 'Duration of the rpc calls',
+                      [(function_labels(k), fm.duration) for k, fm in items])
+            histogram(lines, 'wwwpy_rpc_phase_seconds', 'Duration of the queue, decode, execute and encode phases',
+                      [(function_labels(k, phase), h) for k, fm in items for phase, h in fm.phases.items() if h.count])
+        return '\n'.join(lines) + '\n'
+
+
+class Sample:
+    """The measurement of one call; mark records the time elapsed since the previous mark under the given phase"""
+    __slots__ = ('_metrics', '_start', '_last', 'request_size', 'module_name', 'func_name', 'phases')
+
+    def __init__(self, metrics: RpcMetrics, request_size: int):
+        self._metrics = metrics
+        self._start = self._last = perf_counter()
+        self.request_size = request_size
+        self.module_name = ''
+        self.func_name = ''
+        self.phases: dict[str, float] = {}
+
+    def function(self, module_name: str, func_name: str):
+        self.module_name = module_name
+        self.func_name = func_name
+
+    def mark(self, phase: str):
+        now = perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def done(self, response_size: int, error: bool):
+        """Only the samples of a resolved function are recorded"""
+        if self.func_name:
+            self._metrics._record(self, response_size, error, perf_counter() - self._start)
+
+
+class _NoSample(Sample):
+    __slots__ = ()
+
+    def __init__(self): ...
+
+    def function(self, module_name: str, func_name: str): ...
+
+    def mark(self, phase: str): ...
+
+    def done(self, response_size: int, error: bool): ...
+
+
+no_sample = _NoSample()
+"""Used when there is no RpcMetrics, it records nothing"""
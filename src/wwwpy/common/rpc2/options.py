@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import dataclasses
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+F = TypeVar('F', bound=Callable)
+
+
+@dataclass(frozen=True)
+class RpcOptions:
+    """Options of a server rpc function; they are set with the decorators of this module.
+    The decorators are server side only, generate_stub does not copy them into the remote stubs; idempotent
+    is the exception."""
+
+    inline: bool = False
+    """A sync function runs inline on the event loop instead of the thread pool. Use it only for fast functions"""
+
+    max_concurrency: int | None = None
+    """Maximum number of concurrent executions of the function, see AdmissionControl"""
+
+    max_queue: int = 0
+    """Calls that can wait for a slot of max_concurrency; the others are rejected as overloaded"""
+
+    cache: bool = False
+    """The encoded results are kept in the ResultCache, keyed by the request bytes. Use it only for pure lookups"""
+
+    cache_ttl: float | None = None
+    """Seconds after which a cached result expires; None means it leaves the cache only by eviction or invalidation"""
+
+    single_flight: bool = False
+    """Identical concurrent calls (same function and same request bytes) share one execution, see SingleFlight"""
+
+    idempotent: bool = False
+    """The remote stubs call the function with an http GET, so the browser and the intermediate caches can reuse
+    the response; the server answers with ETag and Cache-Control and with 304 when If-None-Match matches.
+    Unlike the other options, generate_stub copies it into the remote stubs"""
+
+    max_age: int = 0
+    """Seconds an idempotent response can be reused without asking the server; 0 means it is revalidated each time"""
+
+
+_attribute = '__wwwpy_rpc_options__'
+_default = RpcOptions()
+
+
+def get_options(func: Callable) -> RpcOptions:
+    return getattr(func, _attribute, _default)
+
+
+def _update(func: F, **changes) -> F:
+    setattr(func, _attribute, dataclasses.replace(get_options(func), **changes))
+    return func
+
+
+def inline(func: F) -> F:
+    return _update(func, inline=True)
+
+
+def max_concurrency(limit: int, max_queue: int = 0) -> Callable[[F], F]:
+    if limit < 1:
+        raise ValueError(f'limit must be at least 1, got {limit}')
+    if max_queue < 0:
+        raise ValueError(f'max_queue must not be negative, got {max_queue}')
+    return lambda func: _update(func, max_concurrency=limit, max_queue=max_queue)
+
+
+def cache(ttl: float | None = None) -> Callable[[F], F]:
+    if ttl is not None and ttl <= 0:
+        raise ValueError(f'ttl must be positive, got {ttl}')
+    return lambda func: _update(func, cache=True, cache_ttl=ttl)
+
+
+def single_flight(func: F) -> F:
+    return _update(func, single_flight=True)
+
+
+def idempotent(max_age: int = 0) -> Callable[[F], F]:
+    if max_age < 0:
+        raise ValueError(f'max_age must not be negative, got {max_age}')
+    return lambda func: _update(func, idempotent=True, max_age=max_age)
@@ -0,0 +1,51 @@
+"""The Prometheus text exposition format of the metrics of the server, e.g., RpcMetrics, AdmissionControl
+and WebsocketPool.
+
+Each function appends the lines of one metric to the given list; values is a list of (labels, value),
+where labels is the formatted labels, see function_labels and escape; empty labels give a metric without them."""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from wwwpy.common.rpc2.metrics import Histogram
+
+content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value: str) -> str:
+    """The escaping of a label value"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def function_labels(key: tuple[str, str], phase: str | None = None) -> str:
+    """The labels of an rpc function, key is (module, function)"""
+    labels = f'module="{escape(key[0])}",function="{escape(key[1])}"'
+    return labels if phase is None else f'{labels},phase="{phase}"'
+
+
+def counter(lines: list[str], name: str, help_text: str, values: list[tuple[str, int]]):
+    _simple(lines, name, 'counter', help_text, values)
+
+
+def gauge(lines: list[str], name: str, help_text: str, values: list[tuple[str, int]]):
+    _simple(lines, name, 'gauge', help_text, values)
+
+
+def histogram(lines: list[str], name: str, help_text: str, values: list[tuple[str, Histogram]]):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, h in values:
+        cumulative = 0
+        for bound, count in zip(h.buckets, h.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+        lines.append(f'{name}_sum{{{labels}}} {h.sum}')
+        lines.append(f'{name}_count{{{labels}}} {h.count}')
+
+
+def _simple(lines: list[str], name: str, kind: str, help_text: str, values: list[tuple[str, int]]):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    lines.extend(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}' for labels, value in values)
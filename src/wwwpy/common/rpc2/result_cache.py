@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import FunctionType
+from typing import Callable, NamedTuple
+
+from wwwpy.common import reloader
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+
+class _Entry(NamedTuple):
+    response: str | bytes
+    expires_at: float | None
+    size: int
+
+
+_Key = tuple[str, str, str, str | bytes]
+"""(module name, function name, content type, request bytes)"""
+
+
+class ResultCache:
+    """It keeps the encoded responses of the functions decorated with options.cache.
+    The key is the request as received (module, function and serialized arguments), so any typed argument works
+    and a hit is answered without decoding the arguments nor encoding the result.
+
+    The least recently used entries are evicted to stay within max_entries and max_bytes; the size of an entry
+    is the length of its request and response buffers (characters for the text EncoderDecoder).
+    The entries are dropped when the reloader generation changes, that is when the hot reload unloads modules.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[_Key, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._generation = reloader.generation()
+        _caches.add(self)
+
+    def get(self, key: _Key) -> str | bytes | None:
+        with self._lock:
+            self._check_generation()
+            entry = self._entries.get(key, None)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= self._clock():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.response
+
+    def put(self, key: _Key, response: str | bytes, ttl: float | None = None):
+        size = len(key[3]) + len(response)
+        if size > self.max_bytes:
+            return
+        expires_at = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            self._check_generation()
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(response, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate(self, module_name: str, func_name: str | None = None) -> int:
+        """It drops the entries of a function, or of all the functions of a module; it returns how many"""
+        return self._invalidate_where(lambda key: key[0] == module_name and (func_name is None or key[1] == func_name))
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """It drops the entries whose qualified function name (e.g., `server.rpc.get_catalog`) starts with prefix"""
+        return self._invalidate_where(lambda key: f'{key[0]}.{key[1]}'.startswith(prefix))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self._bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _invalidate_where(self, predicate: Callable[[_Key], bool]) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _remove(self, key: _Key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _check_generation(self):
+        generation = reloader.generation()
+        if generation != self._generation:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = generation
+
+
+_caches: weakref.WeakSet[ResultCache] = weakref.WeakSet()
+
+
+def invalidate(func: FunctionType) -> int:
+    """It drops the cached results of the function from all the caches, e.g., after the data it reads has changed"""
+    return sum(c.invalidate(func.__module__, func.__name__) for c in list(_caches))
+
+
+def invalidate_prefix(prefix: str) -> int:
+    """The same as ResultCache.invalidate_prefix, for all the caches"""
+    return sum(c.invalidate_prefix(prefix) for c in list(_caches))
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class SingleFlightStats:
+    executions: int
+    coalesced: int
+    in_flight: int
+
+
+class SingleFlight:
+    """Identical concurrent calls share one execution: the calls that arrive while the first one is running
+    await its result instead of running again. Once the execution completes the key is forgotten,
+    so it is not a cache: the next call runs again.
+
+    The execution runs in its own task, so the cancellation of a caller (e.g., the first one) does not affect
+    the callers that are still waiting; when the last caller is cancelled the execution is cancelled too.
+    It must be used from one event loop.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self._executions = 0
+        self._coalesced = 0
+
+    async def run(self, key: Hashable, execute: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key, None)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(execute())
+            self._in_flight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda t: self._done(key, t))
+            self._executions += 1
+        else:
+            self._coalesced += 1
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters[task] == 1:
+                task.cancel()  # nobody else is waiting for it
+                if self._in_flight.get(key, None) is task:
+                    del self._in_flight[key]  # a new call must not join the cancelled execution
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def stats(self) -> SingleFlightStats:
+        return SingleFlightStats(self._executions, self._coalesced, len(self._in_flight))
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key, None) is task:
+            del self._in_flight[key]
+        self._waiters.pop(task, None)
+        if not task.cancelled():
+            task.exception()  # retrieved, when all the callers went away it must not be logged as never retrieved
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import collections.abc
+import typing
+from typing import AsyncIterator
+
+stream_parameter = 'wwwpy-stream'
+"""The content type parameter that marks a response as a sequence of chunks, see encode_chunk"""
+
+_stream_origins = {collections.abc.AsyncIterator, collections.abc.AsyncGenerator, collections.abc.AsyncIterable}
+stream_type_names = {origin.__name__ for origin in _stream_origins}
+"""The names used by the stub generator to recognize the streaming functions from their source"""
+
+item_status = 'item'
+end_status = 'end'
+"""A streamed response is a sequence of messages: zero or more ('item', value), then ('end') or ('ex', traceback)"""
+
+
+def stream_content_type(content_type: str) -> str:
+    return f'{content_type}; {stream_parameter}=1'
+
+
+def is_stream(content_type: str | None) -> bool:
+    if not content_type:
+        return False
+    params = content_type.split(';')[1:]
+    return any(p.strip().split('=')[0] == stream_parameter for p in params)
+
+
+def is_stream_type(annotation) -> bool:
+    """True for the return annotations of the streaming functions, e.g., AsyncIterator[int]"""
+    return typing.get_origin(annotation) in _stream_origins
+
+
+def stream_item_type(annotation) -> type:
+    args = typing.get_args(annotation)
+    if not args:
+        raise Exception(f'The item type is missing in the streaming return annotation {annotation}')
+    return args[0]
+
+
+def encode_chunk(message: str | bytes) -> bytes:
+    """A chunk is the length of the message (4 bytes, big endian) followed by the message; a str message is utf-8"""
+    data = message.encode('utf-8') if isinstance(message, str) else message
+    return len(data).to_bytes(4, 'big') + data
+
+
+def encode_chunks(messages: AsyncIterator[str | bytes]) -> AsyncIterator[bytes]:
+    return _Chunks(messages)
+
+
+class _Chunks:
+    """Not an async generator: aclose must close the messages also when the iteration never started,
+    e.g., the client went away before the response was sent"""
+
+    def __init__(self, messages: AsyncIterator[str | bytes]):
+        self._messages = messages
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        try:
+            return encode_chunk(await self._messages.__anext__())
+        except StopAsyncIteration:
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        await self._messages.aclose()
+
+
+class ChunkDecoder:
+    """It is fed with the bytes as they arrive, also split at any position, and returns the complete messages"""
+
+    def __init__(self, text: bool):
+        self._text = text
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list[str | bytes]:
+        self._buffer += data
+        messages = []
+        offset = 0
+        while len(self._buffer) - offset >= 4:
+            size = int.from_bytes(self._buffer[offset:offset + 4], 'big')
+            end = offset + 4 + size
+            if len(self._buffer) < end:
+                break
+            data = bytes(self._buffer[offset + 4:end])
+            messages.append(data.decode('utf-8') if self._text else data)
+            offset = end
+        del self._buffer[:offset]
+        return messages
+
+    @property
+    def pending(self) -> int:
+        """The number of bytes of an incomplete chunk"""
+        return len(self._buffer)
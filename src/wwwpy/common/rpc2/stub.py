@@ -4,6 +4,7 @@ import ast
 import types
 from typing import Optional
 
+from wwwpy.common.rpc2.stream import stream_type_names
 from wwwpy.common.rpc2.transport import Transport
 
 
@@ -40,6 +41,9 @@ class Stub:
 _annotations_type = set[ast.Name]
 
 _stub_name = '_stub'
+_options_name = '_rpc_options'
+_idempotent_decorator = 'idempotent'
+_set_types_name = '_set_types'
 
 def generate_stub(source: str, stub_type: type[Stub], stub_args: str = '') -> str:
     """Generates a stub source code from the given source code.
@@ -51,6 +55,12 @@ The goals are:
 - preserve the type hints and default parameters of the functions/methods
 - preserve the import and importFrom statements so the type hints are available
 - removes the implementation of the functions and replaces it with a forwarding call to the stub
+- the streaming functions (annotated with AsyncIterator and the like) become plain functions that return
+  the async iterator, so they are consumed with `async for`
+- the decorators are removed, except `idempotent` (see options.idempotent) that is kept, without arguments,
+  so the Stub knows it can call the function with an http GET
+- the types of the arguments and of the result of each function are passed to typed_function.set_types,
+  as plain expressions, so the Stub does not need to reflect on the functions when the module is imported
 
 Inclusion/Exclusion
 - MUST NOT generate entities (function/method/class) that starts with '_'
@@ -66,11 +76,16 @@ Inclusion/Exclusion
     ]
     used_annotations: _annotations_type = set()
     function_names = []
+    types_calls = []
     class_names = []
+    idempotent = False
     for b in tree.body:
         if isinstance(b, (ast.FunctionDef, ast.AsyncFunctionDef)) and not b.name.startswith('_'):
-            _add_function_or_method(lines, b, used_annotations)
+            idempotent |= _add_function_or_method(lines, b, used_annotations)
             function_names.append(b.name)
+            types_call = _types_call(b)
+            if types_call is not None:
+                types_calls.append(types_call)
         elif isinstance(b, (ast.ImportFrom, ast.Import)):
             lines.append(b)
         elif isinstance(b, ast.ClassDef) and not b.name.startswith('_'):
@@ -84,7 +99,7 @@ Inclusion/Exclusion
             for m in class_body:
                 if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef)) and not m.name.startswith('_'):
                     method_lines = []
-                    _add_function_or_method(method_lines, m, used_annotations, class_name=b.name)
+                    idempotent |= _add_function_or_method(method_lines, m, used_annotations, class_name=b.name)
                     for ml in method_lines:
                         if ml:
                             ml = indent + ml
@@ -100,6 +115,12 @@ Inclusion/Exclusion
         elif isinstance(line, ast.ImportFrom):
             lines[idx] = ast.unparse(line) if _is_import_from_used(line, used_annotations) else ''
 
+    if idempotent:
+        lines.insert(1, f'from wwwpy.common.rpc2 import options as {_options_name}')
+    if types_calls:
+        lines.insert(1, f'from wwwpy.common.rpc2.typed_function import set_types as {_set_types_name}')
+        lines.extend(types_calls)
+
     # setup_functions call
     lines.append(f'{_stub_name}.setup_functions({", ".join(function_names)})')
     # setup_classes call
@@ -109,8 +130,14 @@ Inclusion/Exclusion
     return body
 
 
-def _add_function_or_method(lines, b, used_annotations, class_name=''):
+def _add_function_or_method(lines, b, used_annotations, class_name='') -> bool:
+    """It returns True if the function is idempotent"""
     b.body = []  # keep only the signature
+    idempotent = _is_idempotent(b)
+    # decorators are server side (e.g., rpc options); their imports are not in the stub
+    b.decorator_list = [ast.parse(f'{_options_name}.{_idempotent_decorator}()', mode='eval').body] if idempotent else []
+    if isinstance(b, ast.AsyncFunctionDef) and _is_stream(b):
+        b = ast.copy_location(ast.FunctionDef(**{f: getattr(b, f) for f in b._fields}), b)
     func_def = ast.unparse(b)
     lines.append(func_def)
     args_list = []
@@ -130,6 +157,61 @@ def _add_function_or_method(lines, b, used_annotations, class_name=''):
         name = f'{class_name}.{name}'
     lines.append(f'    return {async_spec}{_stub_name}.namespace.{name}({args})')
     lines.append('')  # empty line after each function
+    return idempotent
+
+
+def _types_call(b: ast.FunctionDef | ast.AsyncFunctionDef) -> Optional[str]:
+    """The set_types call of the function, or None when its types cannot be written as plain expressions
+    (e.g., a missing annotation or a forward reference nested in a generic): get_typed_function resolves them.
+    The same goes for a None default: on Python < 3.11 get_type_hints makes its annotation Optional"""
+    args = b.args
+    if args.posonlyargs or args.vararg or args.kwonlyargs or args.kwarg:
+        return None
+    if any(ar.annotation is None for ar in args.args):
+        return None
+    if any(isinstance(d, ast.Constant) and d.value is None for d in args.defaults):
+        return None
+    expressions = [_annotation_expression(ar.annotation) for ar in args.args] + [_annotation_expression(b.returns)]
+    if None in expressions:
+        return None
+    *args_types, return_type = expressions
+    args_tuple = ', '.join(args_types) + (',' if len(args_types) == 1 else '')
+    return f'{_set_types_name}({b.name}, ({args_tuple}), {return_type})'
+
+
+def _annotation_expression(annotation: ast.expr | None) -> Optional[str]:
+    """The expression that evaluates to the same type returned by typing.get_type_hints"""
+    if annotation is None:
+        return 'type(None)'
+    if isinstance(annotation, ast.Constant):
+        if annotation.value is None:
+            return 'type(None)'
+        if isinstance(annotation.value, str):
+            try:
+                annotation = ast.parse(annotation.value, mode='eval').body
+            except SyntaxError:
+                return None
+            return _annotation_expression(annotation)
+    if any(isinstance(node, ast.Constant) and isinstance(node.value, str) for node in ast.walk(annotation)):
+        return None
+    return ast.unparse(annotation)
+
+
+def _is_stream(b: ast.AsyncFunctionDef) -> bool:
+    returns = b.returns
+    if not isinstance(returns, ast.Subscript):
+        return False
+    full_name = _get_full_name(returns.value)
+    return full_name is not None and full_name.split('.')[-1] in stream_type_names
+
+
+def _is_idempotent(b: ast.FunctionDef | ast.AsyncFunctionDef) -> bool:
+    for decorator in b.decorator_list:
+        node = decorator.func if isinstance(decorator, ast.Call) else decorator
+        full_name = _get_full_name(node)
+        if full_name is not None and full_name.split('.')[-1] == _idempotent_decorator:
+            return True
+    return False
 
 
 def _is_import_used(node: ast.Import, used_annotations: _annotations_type) -> bool:
@@ -151,6 +233,11 @@ def _is_import_from_used(node: ast.ImportFrom, used_annotations: _annotations_ty
 
 
 def _annotation_uses_candidate(node: ast.AST, candidate: str) -> bool:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):  # a forward reference
+        try:
+            node = ast.parse(node.value, mode='eval').body
+        except SyntaxError:
+            return False
     full_name = _get_full_name(node)
     if full_name is not None:
         if full_name == candidate or full_name.startswith(candidate + '.'):
@@ -196,6 +283,8 @@ class Class2:
         return await _stub.namespace.Class1.sub(self, c)
     
             
+_set_types(add, (int, int), int)
+_set_types(sub, (int, int), SomeThing)
 _stub.setup_functions(add, sub)
 _stub.setup_classes(Class1, Class2)
 """
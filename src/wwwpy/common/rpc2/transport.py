@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import AsyncIterator
+
 
 class Transport:
 
@@ -10,3 +12,23 @@ class Transport:
     def recv_sync(self) -> str | bytes: raise NotImplementedError
 
     async def recv_async(self) -> str | bytes: raise NotImplementedError
+
+    async def send_stream_async(self, messages: AsyncIterator[str | bytes]):
+        """Server side: it sends the messages of a streamed response as they are produced"""
+        raise NotImplementedError
+
+    def recv_stream_async(self, payload: str | bytes) -> AsyncIterator[str | bytes]:
+        """Caller side: it sends the request and yields the messages of the streamed response as they arrive.
+        Closing the iterator before the end (e.g., aclose) cancels the call"""
+        raise NotImplementedError
+
+    def call_idempotent_sync(self, payload: str | bytes) -> str | bytes:
+        """Caller side: it sends the request of an idempotent function and returns the response.
+        The http transports send it as a GET, so it can be cached"""
+        self.send_sync(payload)
+        return self.recv_sync()
+
+    async def call_idempotent_async(self, payload: str | bytes) -> str | bytes:
+        """The same as call_idempotent_sync"""
+        await self.send_async(payload)
+        return await self.recv_async()
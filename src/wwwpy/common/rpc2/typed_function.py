@@ -5,6 +5,8 @@ import types
 import typing
 from dataclasses import dataclass
 
+from wwwpy.common.rpc2.stream import is_stream_type, stream_item_type
+
 
 @dataclass
 class TypedFunction:
@@ -18,8 +20,32 @@ class TypedFunction:
         if self.return_type is None:
             raise Exception(f'Return type missing for function {self.func_name}')
 
+    @property
+    def is_stream(self) -> bool:
+        """The functions that return an AsyncIterator (e.g., async generators) stream their items"""
+        return is_stream_type(self.return_type)
+
+    @property
+    def item_type(self) -> type:
+        return stream_item_type(self.return_type)
+
+
+_types_attribute = '_rpc_types'
+
+
+def set_types(function: types.FunctionType, args_types: tuple, return_type: type) -> None:
+    """The types of the arguments and of the result, already resolved (e.g., generate_stub emits this call
+    for each function): get_typed_function uses them instead of reflecting on the function, which is slow in pyodide"""
+    setattr(function, _types_attribute, (args_types, return_type))
+
 
 def get_typed_function(function: types.FunctionType) -> TypedFunction:
+    resolved = getattr(function, _types_attribute, None)
+    if resolved is not None:
+        args_types, return_type = resolved
+        return TypedFunction(function.__module__, function.__name__, list(args_types), return_type,
+                             inspect.iscoroutinefunction(function))
+
     type_hints = typing.get_type_hints(function)  # to be used if the below code do not resolve types
 
     signature = inspect.signature(function)
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from typing import Callable, AsyncIterator
+
+from wwwpy.common.rpc2 import deadline
+from wwwpy.common.rpc2.transport import Transport
+from wwwpy.exceptions import RemoteError
+
+logger = logging.getLogger(__name__)
+
+request_prefix = 'rpc2-request:'
+response_prefix = 'rpc2-response:'
+stream_prefix = 'rpc2-stream:'
+"""A streamed response is sent as stream frames; its last message is sent as a response frame"""
+cancel_prefix = 'rpc2-cancel:'
+"""Sent by the caller to stop a call, e.g., a streamed response or a call whose deadline expired;
+the payload is empty"""
+
+
+def encode_frame(prefix: str, call_id: int, payload: str, timeout: float | None = None) -> str:
+    """A frame is the prefix, the correlation id, the optional timeout and the payload; the payload is a request
+    or response produced by the EncoderDecoder. The timeout is the remaining seconds of the call deadline"""
+    header = f'{prefix}{call_id}' if timeout is None else f'{prefix}{call_id};{deadline.format_timeout(timeout)}'
+    return f'{header}\n{payload}'
+
+
+def decode_frame(prefix: str, message: str | bytes | None) -> tuple[int, str] | None:
+    """It returns None when the message is not a frame with the given prefix"""
+    frame = decode_request_frame(message, prefix)
+    return None if frame is None else frame[:2]
+
+
+def decode_request_frame(message: str | bytes | None,
+                         prefix: str = request_prefix) -> tuple[int, str, float | None] | None:
+    """The same as decode_frame, with the timeout"""
+    if not isinstance(message, str) or not message.startswith(prefix):
+        return None
+    header, _, payload = message.partition('\n')
+    call_id, _, timeout = header[len(prefix):].partition(';')
+    return int(call_id), payload, deadline.parse_timeout(timeout)
+
+
+class WebsocketCalls:
+    """It sends the requests over a websocket and resolves the futures when the responses arrive,
+    also out of order, by correlation id.
+    The calls can be made from any thread and loop (e.g., a sync rpc function, with unasync): each call
+    is resolved on the loop it was made on"""
+
+    def __init__(self, send: Callable[[str], None]):
+        self._send = send
+        self._ids = itertools.count(1)
+        """next() of a count is atomic, the ids are unique across the threads"""
+        self._pending: dict[int, tuple[asyncio.AbstractEventLoop, asyncio.Future | asyncio.Queue]] = {}
+        self.is_open = False
+
+    def _new_id(self) -> int:
+        return next(self._ids)
+
+    def call(self, payload: str) -> asyncio.Future:
+        """It sends the remaining seconds of the current deadline; cancelling the future sends the cancel frame"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        call_id = self._new_id()
+        self._pending[call_id] = (loop, future)
+        future.add_done_callback(lambda f: self._call_done(call_id, f))
+        self._send(encode_frame(request_prefix, call_id, payload, deadline.remaining()))
+        return future
+
+    def _call_done(self, call_id: int, future: asyncio.Future):
+        self._pending.pop(call_id, None)
+        if future.cancelled() and self.is_open:
+            self._send(encode_frame(cancel_prefix, call_id, ''))
+
+    async def call_stream(self, payload: str) -> AsyncIterator[str]:
+        """It yields the messages of a streamed response; closing it before the end sends the cancel frame"""
+        queue: asyncio.Queue[tuple[str | Exception, bool]] = asyncio.Queue()
+        call_id = self._new_id()
+        self._pending[call_id] = (asyncio.get_running_loop(), queue)
+        last = False
+        try:
+            self._send(encode_frame(request_prefix, call_id, payload))
+            while not last:
+                message, last = await queue.get()
+                if isinstance(message, Exception):
+                    raise message
+                yield message
+        finally:
+            self._pending.pop(call_id, None)
+            if not last and self.is_open:
+                self._send(encode_frame(cancel_prefix, call_id, ''))
+
+    def on_message(self, message: str | bytes) -> bool:
+        """It returns True if the message was a response, i.e., it was consumed"""
+        frame = decode_frame(response_prefix, message)
+        last = frame is not None
+        if frame is None:
+            frame = decode_frame(stream_prefix, message)
+        if frame is None:
+            return False
+        call_id, payload = frame
+        pending = self._pending.pop(call_id, None) if last else self._pending.get(call_id, None)
+        if pending is None:
+            logger.warning(f'Response for an unknown call id={call_id}')
+        else:
+            _resolve(*pending, payload, last)
+        return True
+
+    def on_open(self):
+        self.is_open = True
+
+    def on_close(self):
+        self.is_open = False
+        pending = self._pending
+        self._pending = {}
+        for loop, call in pending.values():
+            _resolve(loop, call, RemoteError('The websocket was closed before the response arrived'), True)
+
+
+def _resolve(loop: asyncio.AbstractEventLoop, call: asyncio.Future | asyncio.Queue, message: str | Exception,
+             last: bool):
+    """Futures and queues are not thread safe, they are resolved on their loop"""
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        _resolve_now(call, message, last)
+    elif not loop.is_closed():  # e.g., the caller gave up and its unasync loop is gone
+        loop.call_soon_threadsafe(_resolve_now, call, message, last)
+
+
+def _resolve_now(call: asyncio.Future | asyncio.Queue, message: str | Exception, last: bool):
+    if isinstance(call, asyncio.Queue):
+        call.put_nowait((message, last))
+    elif call.done():
+        pass
+    elif isinstance(message, Exception):
+        call.set_exception(message)
+    else:
+        call.set_result(message)
+
+
+class WebsocketTransport(Transport):
+    """It sends the async calls over the websocket; when the socket is not open, for the sync calls,
+    for the idempotent calls and for the binary payloads, it uses the fallback transport (e.g., http).
+    The response is kept per asyncio task, so concurrent calls through the same instance do not mix up."""
+
+    def __init__(self, calls: WebsocketCalls | None, fallback: Transport):
+        self._calls = calls
+        self._fallback = fallback
+        self._responses: dict[asyncio.Task, str] = {}
+
+    async def send_async(self, payload: str | bytes):
+        if self._calls is None or not self._calls.is_open or not isinstance(payload, str):
+            await self._fallback.send_async(payload)
+            return
+        task = asyncio.current_task()
+        if task in self._responses:
+            raise Exception('Cannot send twice with this implementation')
+        self._responses[task] = await self._calls.call(payload)
+
+    async def recv_async(self) -> str | bytes:
+        response = self._responses.pop(asyncio.current_task(), None)
+        if response is None:
+            return await self._fallback.recv_async()
+        return response
+
+    def recv_stream_async(self, payload: str | bytes) -> AsyncIterator[str | bytes]:
+        if self._calls is None or not self._calls.is_open or not isinstance(payload, str):
+            return self._fallback.recv_stream_async(payload)
+        return self._calls.call_stream(payload)
+
+    async def call_idempotent_async(self, payload: str | bytes) -> str | bytes:
+        return await self._fallback.call_idempotent_async(payload)
+
+    def call_idempotent_sync(self, payload: str | bytes) -> str | bytes:
+        return self._fallback.call_idempotent_sync(payload)
+
+    def send_sync(self, payload: str | bytes):
+        self._fallback.send_sync(payload)
+
+    def recv_sync(self) -> str | bytes:
+        return self._fallback.recv_sync()
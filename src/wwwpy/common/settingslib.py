@@ -26,3 +26,31 @@ class Settings:
         if not self._config.has_section('log_level'):
             return {}
         return dict(self._config.items('log_level'))
+
+    @property
+    def rpc_max_workers(self) -> int | None:
+        return self._config.getint('rpc', 'max_workers', fallback=None)
+
+    @property
+    def rpc_batch_remote_calls(self) -> bool:
+        return self._config.getboolean('rpc', 'batch_remote_calls', fallback=False)
+
+    @property
+    def rpc_websocket_remote_calls(self) -> bool:
+        return self._config.getboolean('rpc', 'websocket_remote_calls', fallback=False)
+
+    @property
+    def rpc_msgpack_remote_calls(self) -> bool:
+        return self._config.getboolean('rpc', 'msgpack_remote_calls', fallback=False)
+
+    @property
+    def rpc_metrics(self) -> bool:
+        return self._config.getboolean('rpc', 'metrics', fallback=False)
+
+    @property
+    def rpc_max_concurrent_calls(self) -> int | None:
+        return self._config.getint('rpc', 'max_concurrent_calls', fallback=None)
+
+    @property
+    def rpc_max_queued_calls(self) -> int:
+        return self._config.getint('rpc', 'max_queued_calls', fallback=0)
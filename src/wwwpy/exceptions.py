@@ -10,3 +10,17 @@ class RemoteException(WwwpyException):
 class RemoteError(WwwpyException):
     """When network/wwwpy infrastructure fails"""
     pass
+
+
+class RemoteTimeoutError(RemoteError):
+    """When the call does not complete before its deadline, see wwwpy.common.rpc2.deadline"""
+    pass
+
+
+class RemoteOverloadedError(RemoteError):
+    """When the server rejects the call because it is overloaded, see wwwpy.common.rpc2.admission;
+    retry_after is the seconds the server suggests to wait before retrying"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
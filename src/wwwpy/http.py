@@ -1,17 +1,28 @@
-from typing import NamedTuple, Callable, Union
+from types import MappingProxyType
+from typing import NamedTuple, Callable, Union, AsyncIterator, Mapping
 # todo rename this in httplib (otherwise it crash jetbrains debug mode)
 from wwwpy.common.asynclib import OptionalCoroutine
 
+_no_headers: Mapping[str, str] = MappingProxyType({})
+
 
 class HttpRequest(NamedTuple):
     method: str
     content: Union[str, bytes]
     content_type: str
+    query: str = ''
+    """The query string, without the leading '?'"""
+    headers: Mapping[str, str] = _no_headers
+    """The header names are lowercase"""
 
 
 class HttpResponse(NamedTuple):
-    content: Union[str, bytes]
+    content: Union[str, bytes, AsyncIterator[bytes]]
+    """An async iterator is sent in chunks as they are produced; it is closed when the client goes away"""
     content_type: str
+    headers: Mapping[str, str] = _no_headers
+    """Additional headers, e.g., ETag and Cache-Control"""
+    status: int = 200
 
     @staticmethod
     def application_zip(content: bytes) -> 'HttpResponse':
@@ -2,35 +2,50 @@ from __future__ import annotations
 
 from typing import Callable
 
+from wwwpy.common.rpc.remote_call import RemoteDispatcher
 from wwwpy.common.rpc.serializer import RpcRequest
+from wwwpy.common.rpc2.websocket_transport import WebsocketCalls
 import asyncio
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+_websocket_calls: WebsocketCalls | None = None
+
+
+def websocket_calls() -> WebsocketCalls | None:
+    """The remote to server calls of the websocket; it is None until setup_websocket is called"""
+    return _websocket_calls
+
 
 async def setup_websocket():
     from js import window, console
-    import importlib
     def log(msg):
         console.log(msg)
 
     def message(msg):
+        if _websocket_calls.on_message(msg) or dispatcher.on_message(msg):
+            return
         log(f'message:{msg}')
         r = RpcRequest.from_json(msg)
         # _debug_requested_module(r.module)
-        m = importlib.import_module(r.module)
-        class_name, func_name = r.func.split('.')
-        attr = getattr(m, class_name)
-        inst = attr()
-        func = getattr(inst, func_name)
-        func(*r.args)
+        dispatcher.dispatch(r.module, r.func, r.args)
 
     l = window.location
     proto = 'ws' if l.protocol == 'http:' else 'wss'
     url = f'{proto}://{l.host}/wwwpy/ws'
-    _WebSocketReconnect(url, message)
+    global _websocket_calls
+    websocket = _WebSocketReconnect(url, message)
+    _websocket_calls = WebsocketCalls(websocket.send)
+    dispatcher = RemoteDispatcher(websocket.send)
+    websocket.on_open = _websocket_calls.on_open
+
+    def on_close():
+        _websocket_calls.on_close()
+        dispatcher.on_close()
+
+    websocket.on_close = on_close
 
 
 class _WebSocketReconnect:
@@ -38,22 +53,51 @@ class _WebSocketReconnect:
         self._url = url
         self._on_message = on_message
         self._counter = 0
+        self._es = None
+        self.on_open: Callable[[], None] = lambda: None
+        self.on_close: Callable[[], None] = lambda: None
         self._connect()
 
+    def send(self, data: str | bytes):
+        """bytes are sent as a binary frame"""
+        if isinstance(data, bytes):
+            from pyodide.ffi import to_js
+            data = to_js(data)
+        self._es.send(data)
+
     def _connect(self):
         from js import WebSocket, console
         self._counter += 1
         console.log(f'connecting to {self._url} counter={self._counter}')
         es = WebSocket.new(self._url)
-        es.onopen = lambda e: console.log('open')
-        es.onmessage = lambda e: self._on_message(e.data)
+        es.binaryType = 'arraybuffer'
+        self._es = es
+
+        def onopen(e):
+            console.log('open')
+            self.on_open()
+
+        es.onopen = onopen
+        es.onmessage = lambda e: self._on_message(_message_data(e.data))
         es.onerror = lambda e: es.close()
 
         async def reconnect():
             await asyncio.sleep(1)
             self._connect()
 
-        es.onclose = lambda e: asyncio.create_task(reconnect())  # for now, we just retry forever and ever
+        def onclose(e):
+            self.on_close()
+            asyncio.create_task(reconnect())  # for now, we just retry forever and ever
+
+        es.onclose = onclose
+
+
+def _message_data(data) -> str | bytes:
+    """The binary frames arrive as an ArrayBuffer, see binaryType"""
+    if isinstance(data, str):
+        return data
+    from js import Uint8Array
+    return Uint8Array.new(data).to_bytes()
 
 
 def _debug_requested_module(module_name: str):
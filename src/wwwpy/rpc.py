@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import importlib
 import logging
 import tempfile
@@ -7,20 +9,39 @@ import traceback
 from inspect import getmembers, isfunction, signature, iscoroutinefunction, Signature
 from pathlib import Path
 from types import ModuleType, FunctionType
-from typing import NamedTuple, List, Tuple, Optional, Callable
+from typing import NamedTuple, List, Tuple, Optional, Callable, AsyncIterator
 
 from wwwpy.common import modlib
-from wwwpy.common.asynclib import OptionalCoroutine
-from wwwpy.common.http_transport import ServerHttpTransport, RemoteHttpTransport
+from wwwpy.common.asynclib import OptionalCoroutine, create_task_safe
+from wwwpy.common.http_transport import ServerHttpTransport, RemoteHttpTransport, RemoteBatchHttpTransport, \
+    RemoteWebsocketTransport
 from wwwpy.common.rpc.hibrid_dispatcher import HybridDispatcher
 from wwwpy.common.rpc.serializer import RpcRequest, RpcResponse
 from wwwpy.common.rpc.v2.caller_proxy import caller_proxy_generate
-from wwwpy.common.rpc2.default_skeleton import DefaultSkeleton
+from wwwpy.common.rpc2.admission import AdmissionControl, OverloadedError, encode_overloaded, \
+    overloaded_http_status, retry_after_header, format_retry_after, default_max_concurrent
+from wwwpy.common.rpc2.batch import is_batch, decode_batch, encode_batch
+from wwwpy.common.rpc2.default_skeleton import encode_exception
 from wwwpy.common.rpc2.default_stub import DefaultStub
-from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder
+from wwwpy.common.rpc2.dispatch_cache import DispatchCache
+from wwwpy.common.rpc2.deadline import parse_timeout, timeout_header
+from wwwpy.common.rpc2.idempotent import decode_query, etag, etag_matches, cache_control
+from wwwpy.common.rpc2 import prometheus
+from wwwpy.common.rpc2.metrics import RpcMetrics
+from wwwpy.common.rpc2.result_cache import ResultCache
+from wwwpy.common.rpc2.single_flight import SingleFlight
+from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder, EncoderDecoder, MsgpackEncoderDecoder, \
+    encoder_decoder_for
+from wwwpy.common.rpc2.stream import encode_chunks, stream_content_type
 from wwwpy.common.rpc2.stub import generate_stub
+from wwwpy.common.rpc2.transport import Transport
+from wwwpy.common.rpc2.websocket_transport import decode_frame, encode_frame, response_prefix, stream_prefix, \
+    cancel_prefix, decode_request_frame
 from wwwpy.http import HttpRoute, HttpResponse, HttpRequest
 from wwwpy.resources import ResourceIterable, from_directory
+from wwwpy.server.rpc_executor import SyncExecutor
+from wwwpy.server.rpc_skeleton import RpcSkeleton, RpcPolicy
+from wwwpy.websocket import WebsocketEndpoint, PoolEvent, WebsocketPool, _current_endpoint
 from wwwpy.unasync import unasync
 
 logger = logging.getLogger(__name__)
@@ -70,32 +91,220 @@ def function_list(module: ModuleType) -> List[Function]:
 
 
 class RpcRoute:
-    def __init__(self, route_path: str):
+    def __init__(self, route_path: str, max_workers: int | None = None, batch_remote_calls: bool = False,
+                 websocket_remote_calls: bool = False, msgpack_remote_calls: bool = False,
+                 max_concurrent_calls: int | None = None, max_queued_calls: int = 0):
+        """max_workers is the size of the thread pool that runs the sync functions.
+        max_concurrent_calls caps the concurrent executions of all the functions, sync, async and streaming, and
+        max_queued_calls is the number of calls that can wait for a free slot; the other calls are rejected
+        with 503 and Retry-After, see admission. None means admission.default_max_concurrent.
+        batch_remote_calls makes the remote stubs pack the async calls of the same event loop iteration in one request.
+        websocket_remote_calls makes the remote stubs send the async calls over the websocket,
+        see on_websocket_message; it takes precedence over batch_remote_calls.
+        msgpack_remote_calls makes the remote stubs use MsgpackEncoderDecoder over http instead of JsonEncoderDecoder;
+        the websocket calls keep using json. It pays off with bytes (no base64), the requests are smaller,
+        but msgpacklib is pure python: on structured payloads (e.g., lists of dataclasses) it encodes and decodes
+        at about half the speed of json, see benchmarks/encoder_decoder_bench.py.
+        The functions decorated with options.idempotent are called by the remote stubs with GET, over http,
+        so the responses can be cached by the browser.
+        The server answers with the EncoderDecoder selected by the request content type, see encoder_decoder_for
+        """
         self._allowed_modules: set[str] = set()
+        self._encdec = JsonEncoderDecoder()
+        self.batch_remote_calls = batch_remote_calls
+        self.websocket_remote_calls = websocket_remote_calls
+        self.msgpack_remote_calls = msgpack_remote_calls
         self.route = HttpRoute(route_path, self._route_callback)
         self.tmp_bundle_folder = Path(tempfile.mkdtemp())
-
-    def _route_callback(self, request: HttpRequest,
-                        resp_callback: Callable[[HttpResponse], OptionalCoroutine]) -> OptionalCoroutine:
-
-        request_content = request.content.decode('utf-8')
+        self.dispatch_cache = DispatchCache()
+        self.result_cache = ResultCache()
+        """The results of the functions decorated with options.cache; it can be replaced to change its bounds"""
+        self.single_flight = SingleFlight()
+        """The in flight executions of the functions decorated with options.single_flight"""
+        self.metrics = RpcMetrics()
+        """The per function metrics of the calls, see metrics_route"""
+        self.executor = SyncExecutor(max_workers)
+        self.admission = AdmissionControl(
+            default_max_concurrent if max_concurrent_calls is None else max_concurrent_calls, max_queued_calls)
+        """The caps of the concurrent executions; the per function caps are set with admission.set_limit"""
+        self._websocket_tasks: dict[tuple[WebsocketEndpoint, int], asyncio.Task] = {}
+        self._stub_hashes: dict[str, str] = {}
+        """The hash of the source each remote stub was generated from, by module name"""
+
+    async def _route_callback(self, request: HttpRequest,
+                              resp_callback: Callable[[HttpResponse], OptionalCoroutine]) -> None:
+        """It runs on the webserver event loop, so coroutine functions are awaited directly on it.
+        When the webserver cancels it (e.g., the client disconnected) the running function is cancelled"""
+        if request.method == 'GET':
+            response = await self._get_response(request)
+        else:
+            response = await self._post_response(request)
+        res = resp_callback(response)
+        if res:
+            await res
+
+    async def _post_response(self, request: HttpRequest) -> HttpResponse:
+        encdec = encoder_decoder_for(request.content_type)
+        request_content = request.content
+        if isinstance(encdec, JsonEncoderDecoder):
+            request_content = request_content.decode('utf-8')
+        if is_batch(request.content_type):
+            requests = decode_batch(encdec, request_content)
+            responses = await asyncio.gather(*[self._invoke_batched(r, encdec) for r in requests])
+            return HttpResponse(encode_batch(encdec, list(responses)), encdec.content_type)
+
+        timeout = parse_timeout(request.headers.get(timeout_header, None))
+        try:
+            response_content = await self._invoke(request_content, encdec, timeout)
+        except OverloadedError as e:
+            return _overloaded_response(e)
+        if isinstance(response_content, (str, bytes)):
+            return HttpResponse(response_content, encdec.content_type)
+        return HttpResponse(encode_chunks(response_content), stream_content_type(encdec.content_type))
+
+    async def _invoke(self, request_content: str | bytes, encdec: EncoderDecoder,
+                      timeout: float | None = None) -> str | bytes | AsyncIterator:
+        """The response of a streaming function is the async iterator of its messages.
+        timeout is the one sent by the caller, see the deadline module"""
         transport = ServerHttpTransport(request_content)
-        encdec = JsonEncoderDecoder()
-        skeleton = DefaultSkeleton(transport, encdec, self._allowed_modules)
+        skeleton = RpcSkeleton(transport, encdec, self._allowed_modules, self.dispatch_cache,
+                               self._policy(timeout=timeout))
 
-        skeleton.invoke_tobe_fixed()
+        await skeleton.invoke_async()
 
         if transport.response is None:
             raise Exception('No response was provided')
+        return transport.response
 
-        response = HttpResponse(transport.response, 'text/plain')
-        return resp_callback(response)
+    def _policy(self, idempotent_only: bool = False, timeout: float | None = None) -> RpcPolicy:
+        """The policies of one call; they are read at each call because they can be replaced"""
+        return RpcPolicy(self.executor.run, self.result_cache, self.single_flight, self.metrics, self.admission,
+                         idempotent_only, timeout)
+
+    async def _get_response(self, request: HttpRequest) -> HttpResponse:
+        """The GET requests are for the functions decorated with options.idempotent, the request is in the query.
+        The response has the ETag, and it is empty with status 304 when the caller already has it"""
+        try:
+            request_content, content_type = decode_query(request.query)
+        except ValueError as e:
+            return HttpResponse(str(e), 'text/plain', {'Cache-Control': 'no-store'}, 400)
+        encdec = encoder_decoder_for(content_type)
+        transport = ServerHttpTransport(request_content)
+        timeout = parse_timeout(request.headers.get(timeout_header, None))
+        skeleton = RpcSkeleton(transport, encdec, self._allowed_modules, self.dispatch_cache,
+                               self._policy(idempotent_only=True, timeout=timeout))
+        try:
+            options = await skeleton.invoke_async()
+            response_content = transport.response
+            if not isinstance(response_content, (str, bytes)):
+                await response_content.aclose()
+                raise Exception('A streaming function cannot be called with GET')
+        except OverloadedError as e:
+            return _overloaded_response(e)
+        except Exception:
+            response_content = encode_exception(encdec, traceback.format_exc())
+            options = None
+
+        if options is None or encdec.decoder(response_content).decode(str) != 'ok':
+            return HttpResponse(response_content, encdec.content_type, {'Cache-Control': 'no-store'})
+        tag = etag(response_content)
+        headers = {'ETag': tag, 'Cache-Control': cache_control(options.max_age)}
+        if etag_matches(request.headers.get('if-none-match', None), tag):
+            return HttpResponse(b'', encdec.content_type, headers, 304)
+        return HttpResponse(response_content, encdec.content_type, headers)
+
+    async def _invoke_isolated(self, request_content: str | bytes, encdec: EncoderDecoder,
+                               timeout: float | None = None) -> str | bytes | AsyncIterator:
+        """The failure of a call in a batch (e.g., a not allowed module) must not fail the other calls.
+        A rejected call is answered with the overloaded status, there is no http status for it"""
+        try:
+            return await self._invoke(request_content, encdec, timeout)
+        except OverloadedError as e:
+            return encode_overloaded(encdec, e)
+        except Exception:
+            return encode_exception(encdec, traceback.format_exc())
+
+    async def _invoke_batched(self, request_content: str | bytes, encdec: EncoderDecoder) -> str | bytes:
+        response = await self._invoke_isolated(request_content, encdec)
+        if isinstance(response, (str, bytes)):
+            return response
+        await response.aclose()
+        return encode_exception(encdec, 'A streaming function cannot be called in a batch')
+
+    def on_websocket_message(self, endpoint: WebsocketEndpoint, message: str | bytes) -> None:
+        """To be added to WebsocketPool.on_message. The calls are run concurrently and each response is sent back
+        as soon as it is ready, with the correlation id of its request.
+        A call is cancelled by its cancel frame or by the disconnection, see on_websocket_change"""
+        cancel = decode_frame(cancel_prefix, message)
+        if cancel is not None:
+            task = self._websocket_tasks.pop((endpoint, cancel[0]), None)
+            if task is not None:
+                task.cancel()
+            return
+        frame = decode_request_frame(message)
+        if frame is None:
+            return
+        call_id, request_content, timeout = frame
+        key = (endpoint, call_id)
+
+        async def invoke():
+            _current_endpoint.set(endpoint)  # the task has its own context
+            try:
+                response_content = await self._invoke_isolated(request_content, self._encdec, timeout)
+                if isinstance(response_content, str):
+                    await _send(endpoint, encode_frame(response_prefix, call_id, response_content))
+                else:
+                    await self._send_stream(endpoint, call_id, response_content)
+            finally:
+                self._websocket_tasks.pop(key, None)
+
+        self._websocket_tasks[key] = create_task_safe(invoke())
+
+    async def _send_stream(self, endpoint: WebsocketEndpoint, call_id: int, messages: AsyncIterator[str]):
+        """The messages are sent as stream frames, the last one as a response frame, so the caller knows
+        the stream is over"""
+        try:
+            previous = None
+            async for message in messages:
+                if previous is not None:
+                    await _send(endpoint, encode_frame(stream_prefix, call_id, previous))
+                previous = message
+            if previous is not None:
+                await _send(endpoint, encode_frame(response_prefix, call_id, previous))
+        finally:
+            await messages.aclose()
+
+    def on_websocket_change(self, change: PoolEvent) -> None:
+        """To be added to WebsocketPool.on_after_change: the calls of a disconnected client are cancelled"""
+        if not change.remove:
+            return
+        for key, task in list(self._websocket_tasks.items()):
+            if key[0] is change.endpoint:
+                task.cancel()
+
+    def metrics_route(self, route_path: str, websocket_pool: WebsocketPool | None = None) -> HttpRoute:
+        """A route that exposes the metrics and the admission stats in the Prometheus text format;
+        with websocket_pool, also its broadcast stats"""
+
+        def callback(request: HttpRequest, resp_callback: Callable[[HttpResponse], OptionalCoroutine]):
+            content = self.metrics.to_prometheus() + self.admission.to_prometheus()
+            if websocket_pool is not None:
+                content += websocket_pool.to_prometheus()
+            return resp_callback(HttpResponse(content, prometheus.content_type))
+
+        return HttpRoute(route_path, callback)
 
     def allow(self, module_name: str):
         if not isinstance(module_name, str):
             raise TypeError('module_name must be a string')
         self._allowed_modules.add(module_name)
 
+    def set_max_concurrency(self, module_name: str, limit: int | None, func_name: str = '', max_queue: int = 0):
+        """Limit the concurrent executions of the functions of a module, or of a single function;
+        max_queue calls can wait for a free slot, the others are rejected. None removes the limit.
+        It is a shortcut of admission.set_limit"""
+        self.admission.set_limit(module_name, func_name, limit, max_queue)
+
     def find_module(self, module_name: str) -> Optional[Module]:
         if module_name not in self._allowed_modules:
             return None
@@ -143,8 +352,23 @@ class RpcRoute:
     def remote_stub_resources(self) -> ResourceIterable:
         return from_directory(self.tmp_bundle_folder)
 
+    def _remote_transport(self) -> type[Transport]:
+        if self.websocket_remote_calls:
+            return RemoteWebsocketTransport
+        if self.batch_remote_calls:
+            return RemoteBatchHttpTransport
+        return RemoteHttpTransport
+
     def generate_remote_stubs(self) -> tuple[List[Path], List[Path]]:
+        """It returns the stubs written and the stubs removed. A stub is generated again only when the source
+        of its module changed, and it is written only when it differs from the one on disk (e.g., it is not
+        when only the body of a function changed), so the unchanged stubs do not fire a hot reload"""
         logger.debug(f'generate_remote_stubs in {self.tmp_bundle_folder}')
+        transport = self._remote_transport()
+        encdec = MsgpackEncoderDecoder if self.msgpack_remote_calls else JsonEncoderDecoder
+        sub_imports = '\n'.join(_make_import(o) for o in [transport, encdec]) + '\n'
+        stub_args = (f'{transport.__name__}("{self.route.path}", "{encdec.content_type}"), ' +
+                     f'{encdec.__name__}(), __name__')
         add = []
         rem = []
         for module_name in self._allowed_modules:
@@ -152,15 +376,19 @@ class RpcRoute:
             filename = module_name.replace('.', '/') + '.py'
             file = self.tmp_bundle_folder / filename
             if module is None:
+                self._stub_hashes.pop(module_name, None)
                 if file.exists():
                     file.unlink(missing_ok=True)
                     rem.append(file)
                 continue
             module_source = module.path.read_text()
-            sub_imports = '\n'.join(_make_import(o) for o in [RemoteHttpTransport, JsonEncoderDecoder]) + '\n'
-            stub_args = (f'{RemoteHttpTransport.__name__}("{self.route.path}"), ' +
-                         f'{JsonEncoderDecoder.__name__}(), __name__')
+            source_hash = _source_hash(sub_imports, stub_args, module_source)
+            if self._stub_hashes.get(module_name, None) == source_hash and file.exists():
+                continue
             stub_source = sub_imports + generate_stub(module_source, DefaultStub, stub_args)
+            self._stub_hashes[module_name] = source_hash
+            if file.exists() and file.read_text() == stub_source:
+                continue
             file.parent.mkdir(parents=True, exist_ok=True)
             file.write_text(stub_source)
             logger.debug(f'Module `{module_name}` len(stub_source)={len(stub_source)}')
@@ -176,5 +404,20 @@ def generate_stub_source(module: SourceModule, rpc_url: str) -> str:
     return gen
 
 
+def _overloaded_response(error: OverloadedError) -> HttpResponse:
+    headers = {retry_after_header: format_retry_after(error.retry_after), 'Cache-Control': 'no-store'}
+    return HttpResponse(str(error), 'text/plain', headers, overloaded_http_status)
+
+
+async def _send(endpoint: WebsocketEndpoint, message: str):
+    res = endpoint.send(message)
+    if res:
+        await res
+
+
+def _source_hash(*parts: str) -> str:
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
 def _make_import(obj: any) -> str:
     return f'from {obj.__module__} import {obj.__name__}'
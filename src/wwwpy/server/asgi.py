@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import asyncio
+
 from wwwpy.common.asynclib import OptionalCoroutine
 from wwwpy.common.rpc.serializer import RpcRequest
 from wwwpy.http import HttpRoute, HttpRequest, HttpResponse
 from wwwpy.webserver import Route
-from wwwpy.websocket import WebsocketRoute, WebsocketEndpoint, ListenerProtocol
+from wwwpy.websocket import WebsocketRoute, WebsocketEndpoint, ListenerProtocol, SendBuffer
 
 
 # Route = Union[HttpRoute, WebsocketRoute]
@@ -14,6 +16,11 @@ def routes_to_asgi_application(*routes: Route):
 
 
 class AsgiApplication:
+    """The websocket compression (permessage-deflate, see WebsocketCompression for WsTornado) is negotiated
+    by the ASGI server, the application cannot choose it. E.g., uvicorn enables it by default with its `websockets`
+    implementation, `--ws websockets --ws-per-message-deflate true`, with the zlib defaults and without a size
+    threshold; its `wsproto` implementation does not compress."""
+
     def __init__(self, *routes: Route):
         def _g(type_):
             return _groupby_to_dict(filter(lambda r: isinstance(r, type_), routes), lambda i: i.path)
@@ -41,43 +48,61 @@ class AsgiApplication:
         if route is None:
             return
         method = scope['method']
-        headers = dict(scope['headers'])
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
         content_type = headers.get('content-type', None)
+        query = scope.get('query_string', b'').decode('latin-1')
         body = await _all_body(receive)
         # todo (?) intercept content type to correctly transform body bytes to str if needed
-        http_request = HttpRequest(method, body, content_type)
+        http_request = HttpRequest(method, body, content_type, query, headers)
 
         def resp_callback(resp: HttpResponse) -> OptionalCoroutine:
             async def future():
-                await send({'type': 'http.response.start', 'status': 200,
-                            'headers': [[b'content-type', resp.content_type.encode()], ], })
-                await send({'type': 'http.response.body', 'body': resp.content.encode(), })
+                response_headers = [[b'content-type', resp.content_type.encode()]]
+                response_headers += [[name.lower().encode('latin-1'), value.encode('latin-1')]
+                                     for name, value in resp.headers.items()]
+                await send({'type': 'http.response.start', 'status': resp.status, 'headers': response_headers, })
+                if not isinstance(resp.content, (str, bytes)):
+                    await _send_chunks(resp.content, send)
+                    return
+                body = resp.content.encode() if isinstance(resp.content, str) else resp.content
+                await send({'type': 'http.response.body', 'body': body, })
 
             return future()
 
         res = route.callback(http_request, resp_callback)
         if res:
-            await res
+            await _until_disconnect(res, receive)
 
     async def _scope_websocket(self, scope, receive, send):
         route = self.websocket_route.get(scope['path'], None)
         if route is None:
             return
 
-        # send_text = lambda t: send({'type': 'websocket.send', 'text': t})
-        async def send_text(t):
-            await send({'type': 'websocket.send', 'text': t})
+        async def send_message(m: str | bytes | None):
+            if m is None:  # the endpoint closes the connection, e.g., a slow client of WebsocketPool.broadcast
+                await send({'type': 'websocket.close'})
+            elif isinstance(m, bytes):
+                await send({'type': 'websocket.send', 'bytes': m})
+            else:
+                await send({'type': 'websocket.send', 'text': m})
 
         await send({'type': 'websocket.accept'})
 
-        endpoint = _AsgiWebsocketEndpoint(lambda m: send_text(m))
+        buffer = SendBuffer(asyncio.get_running_loop(), send_message)
+        endpoint = _AsgiWebsocketEndpoint(buffer.send)
         route.on_connect(endpoint)
 
         while True:
             message = await receive()
             if message['type'] == 'websocket.receive':
-                await endpoint.on_message(message.get('text'))
+                text = message.get('text', None)
+                res = endpoint.on_message(message.get('bytes', None) if text is None else text)
+                if res:
+                    await res
             elif message['type'] == 'websocket.disconnect':
+                res = endpoint.on_message(None)
+                if res:
+                    await res
                 break
 
 
@@ -93,6 +118,36 @@ def _groupby_to_dict(iterable, key) -> dict:
     return result
 
 
+async def _until_disconnect(callback, receive):
+    """It runs the route callback until it completes or the client disconnects, whichever comes first;
+    on disconnection the callback is cancelled, e.g., with the rpc function it is running"""
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    task = asyncio.ensure_future(callback)
+    watcher = asyncio.ensure_future(wait_disconnect())
+    try:
+        await asyncio.wait([task, watcher], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        task.cancel()
+        watcher.cancel()
+        await asyncio.gather(task, watcher, return_exceptions=True)
+    if not task.cancelled() and task.exception() is not None:
+        raise task.exception()
+
+
+async def _send_chunks(chunks, send):
+    """The chunks are sent until they end; on disconnection the sending is cancelled, see _until_disconnect"""
+    try:
+        async for chunk in chunks:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        await chunks.aclose()
+
+
 async def _all_body(receive):
     body = b""
     more_body = True
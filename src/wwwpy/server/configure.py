@@ -63,8 +63,10 @@ def setup(config: Config, settings: Settings = None) -> Project:
 
     websocket_pool = WebsocketPool('/wwwpy/ws')
 
-    services = _configure_server_rpc_services('/wwwpy/rpc', list(config.server_rpc_packages))
+    services = _configure_server_rpc_services('/wwwpy/rpc', list(config.server_rpc_packages), settings)
     services.generate_remote_stubs()
+    websocket_pool.on_message.append(services.on_websocket_message)
+    websocket_pool.on_after_change.append(services.on_websocket_change)
 
     resources = [library_resources(), services.remote_stub_resources(), ] + \
                 [from_directory(directory / f, relative_to=directory) for f in config.remote_folders]
@@ -77,6 +79,8 @@ def setup(config: Config, settings: Settings = None) -> Project:
             python=f'from wwwpy.remote.browser_main import entry_point; await entry_point(dev_mode={config.dev_mode})'
         )
     ]
+    if settings.rpc_metrics:
+        routes.append(services.metrics_route('/wwwpy/metrics', websocket_pool))
 
     if config.dev_mode:
         import wwwpy.server.designer.dev_mode as dev_modelib
@@ -101,8 +105,12 @@ def setup(config: Config, settings: Settings = None) -> Project:
     return Project(config, settings, websocket_pool, tuple(routes))
 
 
-def _configure_server_rpc_services(route_path: str, modules: list[str]) -> RpcRoute:
-    services = RpcRoute(route_path)
+def _configure_server_rpc_services(route_path: str, modules: list[str], settings: Settings = None) -> RpcRoute:
+    if settings is None:
+        settings = Settings()
+    services = RpcRoute(route_path, settings.rpc_max_workers, settings.rpc_batch_remote_calls,
+                        settings.rpc_websocket_remote_calls, settings.rpc_msgpack_remote_calls,
+                        settings.rpc_max_concurrent_calls, settings.rpc_max_queued_calls)
     for module_name in modules:
         services.allow(module_name)
     return services
@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from pathlib import Path
 from typing import List, Callable, Set
@@ -36,6 +37,12 @@ def _warning_on_multiple_clients(websocket_pool: WebsocketPool):
 
 def start_hotreload(directory: Path, websocket_pool: WebsocketPool, rpc_route: RpcRoute,
                     server_folders: Set[str], remote_folders: Set[str]):
+    process_events = _hotreload_events(directory, websocket_pool, rpc_route, server_folders, remote_folders)
+    _watch_filesystem_change(directory, process_events)
+
+
+def _hotreload_events(directory: Path, websocket_pool: WebsocketPool, rpc_route: RpcRoute,
+                      server_folders: Set[str], remote_folders: Set[str]) -> Callable[[List[sync.Event]], None]:
     remote_set = {directory / d for d in remote_folders}
     server_set = {directory / d for d in server_folders}
     rpc_set = {directory / (d.replace('.', '/') + '.py') for d in rpc_route._allowed_modules}
@@ -51,6 +58,7 @@ def start_hotreload(directory: Path, websocket_pool: WebsocketPool, rpc_route: R
             if len(rpc_events) > 0:
                 # if the signature of the rpc changes, it will write on the fs and will trigger the observer
                 add_stub, rem_stub = rpc_route.generate_remote_stubs()
+                # the browsers reload also when no stub changed: the server behaviour did
                 evs = [sync.Event('created', True, str(rpc_route.tmp_bundle_folder / 'server')), ] + \
                       [sync.Event('modified', False, str(f)) for f in add_stub] + \
                       [sync.Event('deleted', False, str(f)) for f in rem_stub]
@@ -63,17 +71,15 @@ def start_hotreload(directory: Path, websocket_pool: WebsocketPool, rpc_route: R
             process_remote_events(directory, websocket_pool, remote_events, do_reload=True)
 
         if len(remote_events) == 0 and len(server_events) == 0 and is_empty_project(directory):
-            for remote_rpc in websocket_pool.all_clients_rpc(DesignerRpc):
-                remote_rpc.hotreload_do()
+            websocket_pool.broadcast_rpc(DesignerRpc).hotreload_do()
 
-    _watch_filesystem_change(directory, process_events)
+    return process_events
 
 
 def process_remote_events(directory: Path, websocket_pool: WebsocketPool, events: List[sync.Event], do_reload: bool):
     try:
         payload = sync_impl.sync_source(directory, events)
-        for remote_rpc in websocket_pool.all_clients_rpc(DesignerRpc):
-            remote_rpc.hotreload_notify_changes(do_reload, payload)
+        websocket_pool.broadcast_rpc(DesignerRpc).hotreload_notify_changes(do_reload, payload)
     except:
         # we could send a sync_init
         import traceback
@@ -94,13 +100,24 @@ def do_unload_for(directory, server_folders: Set[str]):
 
 
 def _watch_filesystem_change(directory: Path, callback: Callable[[List[sync.Event]], None]):
+    """The callback runs on its own thread, one batch of events at a time and in order, so the debouncer thread
+    keeps collecting the events while the previous ones are processed (e.g., while the remote stubs are generated)"""
+    worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hotreload')
+
+    def process(events: List[sync.Event]):
+        try:
+            callback(events)
+        except:
+            import traceback
+            logger.error(f'_watch_filesystem_change {traceback.format_exc()}')
+
     def on_sync_events(events: List[sync.Event]):
         try:
             # oh, boy. When a .py file is saved it fires the first hot reload. Then, when that file is loaded
             # the python updates the __pycache__ files, firing another (unwanted) reload: the first was enough!
             filtered_events = _filter_events(events, directory)
             if len(filtered_events) > 0:
-                callback(filtered_events)
+                worker.submit(process, filtered_events)
         except:
             import traceback
             logger.error(f'_watch_filesystem_change {traceback.format_exc()}')
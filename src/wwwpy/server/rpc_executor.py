@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import FunctionType
+
+from wwwpy.common.rpc2.options import get_options
+from wwwpy.common.rpc2.typed_function import TypedFunction
+
+
+@dataclass(frozen=True)
+class ExecutorStats:
+    max_workers: int
+    active_workers: int
+    """Functions currently running in the pool"""
+    queue_depth: int
+    """Functions submitted to the pool and waiting for a free worker"""
+    abandoned: int = 0
+    """Functions still running whose caller went away (e.g., deadline or disconnection); a thread cannot be
+    interrupted, so they keep a worker busy until they return"""
+
+
+class SyncExecutor:
+    """It runs the sync rpc functions in a bounded ThreadPoolExecutor, so a blocking function does not
+    block the webserver event loop.
+
+    The concurrency per module or per function is capped before the pool, by the admission control of RpcRoute.
+    Functions decorated with inline are run directly on the event loop.
+    """
+
+    def __init__(self, max_workers: int | None = None):
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)  # the same default of ThreadPoolExecutor
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix='wwwpy-rpc')
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._abandoned = 0
+
+    def stats(self) -> ExecutorStats:
+        with self._lock:
+            return ExecutorStats(self.max_workers, self._active, self._queued, self._abandoned)
+
+    async def run(self, target_function: TypedFunction, func: FunctionType, args: list[any]) -> any:
+        options = get_options(func)
+        if options.inline:
+            return func(*args)
+        return await self._submit(func, args)
+
+    async def _submit(self, func: FunctionType, args: list[any]) -> any:
+        def work():
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+        with self._lock:
+            self._queued += 1
+        future = self._pool.submit(contextvars.copy_context().run, work)  # e.g., websocket.current_endpoint
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if future.cancel():  # it never started
+                with self._lock:
+                    self._queued -= 1
+            else:
+                with self._lock:
+                    self._abandoned += 1
+                future.add_done_callback(self._abandoned_done)
+            raise
+
+    def _abandoned_done(self, _):
+        with self._lock:
+            self._abandoned -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,173 @@
+"""The skeleton of RpcRoute: DefaultSkeleton with the server policies applied around the execution of the functions.
+
+The policies of a call are in one RpcPolicy; the ones that are None do not apply."""
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from types import FunctionType
+from typing import Callable, Awaitable, AsyncIterator
+
+from wwwpy.common.rpc2 import deadline
+from wwwpy.common.rpc2.admission import AdmissionControl, default_max_concurrent
+from wwwpy.common.rpc2.default_skeleton import DefaultSkeleton, encode_timeout
+from wwwpy.common.rpc2.dispatch_cache import DispatchCache
+from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder
+from wwwpy.common.rpc2.metrics import RpcMetrics, no_sample
+from wwwpy.common.rpc2.options import get_options, RpcOptions
+from wwwpy.common.rpc2.result_cache import ResultCache
+from wwwpy.common.rpc2.single_flight import SingleFlight
+from wwwpy.common.rpc2.transport import Transport
+from wwwpy.common.rpc2.typed_function import TypedFunction
+
+SyncRunner = Callable[[TypedFunction, FunctionType, list[any]], Awaitable[any]]
+"""It runs a sync function on behalf of invoke_async, e.g., in a thread pool"""
+
+_default_admission = AdmissionControl(default_max_concurrent)
+"""For the policies without admission, so no call runs without a bound"""
+
+
+@dataclass
+class RpcPolicy:
+    sync_runner: SyncRunner | None = None
+    """When None, the sync functions run inline"""
+    result_cache: ResultCache | None = None
+    """When None, the functions decorated with options.cache are not cached"""
+    single_flight: SingleFlight | None = None
+    """When None, the functions decorated with options.single_flight are not coalesced"""
+    metrics: RpcMetrics | None = None
+    """When None, nothing is recorded"""
+    admission: AdmissionControl | None = None
+    """invoke_async raises OverloadedError when the call is rejected; when None, the calls are capped
+    by a shared AdmissionControl of default_max_concurrent. The cached results and the coalesced calls
+    do not take a slot, the streaming functions hold theirs until the stream ends or it is closed"""
+    idempotent_only: bool = False
+    """Only the functions decorated with options.idempotent can be invoked, e.g., for an http GET"""
+    timeout: float | None = None
+    """The seconds the caller is going to wait, see the deadline module; when they expire the function
+    is cancelled (a running sync function is abandoned to its thread) and the response tells the caller
+    it timed out. It does not apply to the streaming functions"""
+
+
+class RpcSkeleton(DefaultSkeleton):
+    def __init__(self, transport: Transport, encdec: EncoderDecoder, allowed_modules: set[str],
+                 dispatch_cache: DispatchCache | None = None, policy: RpcPolicy | None = None):
+        super().__init__(transport, encdec, allowed_modules, dispatch_cache)
+        self._policy = policy if policy is not None else RpcPolicy()
+        self._admission = self._policy.admission if self._policy.admission is not None else _default_admission
+        timeout = self._policy.timeout
+        self._deadline = None if timeout is None else time.monotonic() + timeout
+
+    async def invoke_async(self) -> RpcOptions:
+        """It returns the options of the invoked function"""
+        policy = self._policy
+        recv_buffer = await self._transport.recv_async()
+        sample = policy.metrics.sample(len(recv_buffer)) if policy.metrics is not None else no_sample
+        decoder, module_name, func, target_function = self._decode_function(recv_buffer)
+        sample.function(module_name, target_function.func_name)
+        options = get_options(func)
+        if policy.idempotent_only and not options.idempotent:
+            raise Exception(f'Not idempotent function: {module_name}.{target_function.func_name}')
+
+        if target_function.is_stream:
+            args = self._decode_args(decoder, target_function)
+            sample.mark('decode')
+
+            def done(size: int, error: bool):
+                sample.mark('execute')
+                sample.done(size, error)
+
+            slot = await self._admit(module_name, target_function.func_name, options)
+            messages = _AdmittedMessages(self._stream_messages(target_function, func, args, done), slot)
+            await self._transport.send_stream_async(messages)
+            return options
+
+        key = (module_name, target_function.func_name, self._encdec.content_type, recv_buffer)
+        cache = policy.result_cache if options.cache else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                sample.done(len(cached), False)
+                await self._transport.send_async(cached)
+                return options
+
+        async def execute() -> tuple[str | bytes, bool]:
+            args = self._decode_args(decoder, target_function)
+            sample.mark('decode')
+            r = await self._result_async(target_function, func, args)
+            sample.mark('execute')
+            buffer = self._encode_result(target_function, r)
+            sample.mark('encode')
+            error = r.exception_str is not None
+            if cache is not None and not error:
+                cache.put(key, buffer, options.cache_ttl)
+            return buffer, error
+
+        async def call() -> tuple[str | bytes, bool]:
+            async with await self._admit(module_name, target_function.func_name, options):
+                sample.mark('queue')
+                return await execute()
+
+        if options.single_flight and policy.single_flight is not None:
+            execution = policy.single_flight.run(key, call)
+        else:
+            execution = call()
+        try:
+            send_buffer, error = await self._within_deadline(execution)
+        except asyncio.TimeoutError:
+            send_buffer, error = encode_timeout(self._encdec, f'{module_name}.{target_function.func_name}'), True
+        sample.done(len(send_buffer), error)
+        await self._transport.send_async(send_buffer)
+        return options
+
+    async def _admit(self, module_name: str, func_name: str, options: RpcOptions) -> AsyncExitStack:
+        """It waits for an admission slot, held until the returned stack is closed"""
+        if options.max_concurrency is not None:
+            self._admission.declare_limit(module_name, func_name, options.max_concurrency, options.max_queue)
+        slot = AsyncExitStack()
+        await slot.enter_async_context(self._admission.admit(module_name, func_name))
+        return slot
+
+    async def _within_deadline(self, execution: Awaitable[any]) -> any:
+        """It raises asyncio.TimeoutError when the deadline expires; the deadline is also visible
+        to the async functions, with deadline.remaining()"""
+        if self._deadline is None:
+            return await execution
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            execution.close()  # the caller already gave up, e.g., the request waited in a queue
+            raise asyncio.TimeoutError()
+        with deadline.timeout(remaining):
+            return await asyncio.wait_for(execution, remaining)
+
+    async def _execute_async(self, target_function: TypedFunction, func: FunctionType, args: list[any]) -> any:
+        if not target_function.is_coroutine and self._policy.sync_runner is not None:
+            return await self._policy.sync_runner(target_function, func, args)
+        return await super()._execute_async(target_function, func, args)
+
+
+class _AdmittedMessages:
+    """The messages of a streaming function; its admission slot is released when they end or they are closed,
+    also when the iteration never started"""
+
+    def __init__(self, messages: AsyncIterator[str | bytes], slot: AsyncExitStack):
+        self._messages = messages
+        self._slot = slot
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str | bytes:
+        try:
+            return await self._messages.__anext__()
+        except StopAsyncIteration:
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        try:
+            await self._messages.aclose()
+        finally:
+            await self._slot.aclose()
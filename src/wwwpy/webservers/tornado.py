@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+from contextlib import contextmanager
 from threading import Thread
 from typing import Awaitable, Union
 from typing import Optional
@@ -8,19 +10,22 @@ import tornado
 import tornado.web
 from tornado import websocket
 from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
 
 from wwwpy.http import HttpRoute, HttpRequest
 from ..webserver import Webserver, Route
-from ..websocket import WebsocketRoute, WebsocketEndpointIO
+from ..websocket import WebsocketRoute, WebsocketEndpointIO, SendBuffer, WebsocketCompression
 
 
 class WsTornado(Webserver):
     ioloop: IOLoop = None
 
-    def __init__(self):
+    def __init__(self, compression: WebsocketCompression | None = None):
+        """compression is the permessage-deflate of the websockets; it is opt-in, None disables it"""
         super().__init__()
         self.app = tornado.web.Application()
         self.thread: Optional[Thread] = None
+        self.compression = compression
 
     def _setup_route(self, route: Route):
         if isinstance(route, WebsocketRoute):
@@ -44,6 +49,8 @@ class TornadoHandler(tornado.web.RequestHandler):
     def __init__(self, *args, **kwargs):
         self.route: Route = None
         self._serve = None
+        self._callback_task: asyncio.Future | None = None
+        self._connection_closed = False
         super().__init__(*args, **kwargs)
 
     def initialize(self, route: HttpRoute) -> None:
@@ -69,16 +76,47 @@ class TornadoHandler(tornado.web.RequestHandler):
 
     async def _serve_std(self, verb: str):
         body = self.request.body
-        request = HttpRequest(verb, body, self.request.headers.get('Content-Type', ''))
+        headers = {name.lower(): value for name, value in self.request.headers.get_all()}
+        request = HttpRequest(verb, body, self.request.headers.get('Content-Type', ''), self.request.query, headers)
 
         def response_fun(response):
             self.set_default_headers()
+            self.set_status(response.status)
             self.set_header("Content-Type", response.content_type)
-            return self.write(response.content)
+            for name, value in response.headers.items():
+                self.set_header(name, value)
+            if isinstance(response.content, (str, bytes)):
+                if response.content:  # e.g., a 304 must not have a body
+                    self.write(response.content)
+                return None
+            return self._write_chunks(response.content)
 
         res = self.route.callback(request, response_fun)
         if res:
-            await res
+            self._callback_task = asyncio.ensure_future(res)
+            try:
+                await self._callback_task
+            except asyncio.CancelledError:
+                if not self._connection_closed:
+                    raise
+
+    def on_connection_close(self) -> None:
+        """The client went away: the route callback is cancelled, e.g., with the rpc function it is running"""
+        self._connection_closed = True
+        if self._callback_task is not None and not self._callback_task.done():
+            self._callback_task.cancel()
+        super().on_connection_close()
+
+    async def _write_chunks(self, chunks):
+        """Each chunk is flushed before asking the next one, so a slow client slows down the producer"""
+        try:
+            async for chunk in chunks:
+                self.write(chunk)
+                await self.flush()
+        except StreamClosedError:
+            pass  # the client went away
+        finally:
+            await chunks.aclose()
 
     def data_received(self, chunk: bytes) -> Optional[Awaitable[None]]:
         raise_exception(self)
@@ -88,6 +126,7 @@ class _WebsocketHandler(websocket.WebSocketHandler):
     route: WebsocketRoute = None
     server: WsTornado = None
     endpoint: WebsocketEndpointIO = None
+    _buffer: SendBuffer = None
 
     def initialize(self, route: WebsocketRoute, server: WsTornado) -> None:
         self.route = route
@@ -96,23 +135,74 @@ class _WebsocketHandler(websocket.WebSocketHandler):
     # def check_origin(self, origin):
     #     return True
 
+    def get_compression_options(self) -> Optional[dict]:
+        compression = self.server.compression
+        if compression is None:
+            return None
+        return {'compression_level': compression.level, 'mem_level': compression.mem_level}
+
     def open(self):
-        self.endpoint = WebsocketEndpointIO(self._on_send)
+        self._buffer = SendBuffer(self.server.ioloop.asyncio_loop, self._write)
+        self.endpoint = WebsocketEndpointIO(self._buffer.send)
         self.route.on_connect(self.endpoint)
 
     def on_message(self, message: Union[str, bytes]) -> Optional[Awaitable[None]]:
         self.endpoint.on_message(message)
 
-    def _on_send(self, data: str | bytes | None):
+    def _write(self, data: str | bytes | None) -> Optional[asyncio.Future]:
+        """Called by the SendBuffer on the loop; the future is resolved when the message is flushed"""
         if data is None:
             self.close()
-        else:
-            self.server.ioloop.asyncio_loop.call_soon_threadsafe(self.write_message, data)
+            return None
+        try:
+            with self._uncompressed(data):
+                written = self.write_message(data, binary=isinstance(data, bytes))
+        except websocket.WebSocketClosedError:
+            return None
+        flushed = asyncio.get_running_loop().create_future()
+
+        def done(f: asyncio.Future):
+            if not f.cancelled():
+                f.exception()  # retrieved: a client that went away is not an error of the sender
+            if not flushed.done():
+                flushed.set_result(None)
+
+        written.add_done_callback(done)
+        return flushed
+
+    @contextmanager
+    def _uncompressed(self, data: str | bytes):
+        """The messages below WebsocketCompression.min_size bytes are sent without the deflate, as RFC 7692 allows"""
+        compression = self.server.compression
+        if compression is None or len(data) >= compression.min_size:  # a str has at least as many bytes as chars
+            yield
+            return
+        size = len(data.encode()) if isinstance(data, str) else len(data)
+        if size >= compression.min_size:
+            yield
+            return
+        with _without_compressor(self.ws_connection):
+            yield
 
     def on_close(self):
         self.endpoint.on_message(None)
 
 
+@contextmanager
+def _without_compressor(connection: websocket.WebSocketProtocol | None):
+    """Tornado has no option to send a message without the deflate, so its private compressor is set aside
+    while the message is written; when the connection does not have it, the message is compressed as usual"""
+    compressor = getattr(connection, '_compressor', None)
+    if compressor is None:
+        yield
+        return
+    connection._compressor = None
+    try:
+        yield
+    finally:
+        connection._compressor = compressor
+
+
 def raise_exception(self: TornadoHandler):
     print("=" * 60)
     print(f'exc! {self.route}')
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
 import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import NamedTuple, Protocol, List, Iterator
+from typing import NamedTuple, Protocol, List, Iterator, Awaitable
 
-from wwwpy.common.asynclib import OptionalCoroutine
+from wwwpy.common.asynclib import OptionalCoroutine, create_task_safe
 from wwwpy.common.rpc.serializer import RpcRequest
+from wwwpy.common.rpc2.prometheus import counter, gauge, escape
+from wwwpy.common.rpc2.websocket_transport import WebsocketCalls
 
 logger = logging.getLogger(__name__)
 
@@ -38,41 +46,456 @@ class PoolChangeCallback(Protocol):
     def __call__(self, change: PoolEvent) -> None: ...
 
 
+class PoolMessageCallback(Protocol):
+    def __call__(self, endpoint: WebsocketEndpoint, message: str | bytes) -> None: ...
+
+
+_current_endpoint: ContextVar[WebsocketEndpoint | None] = ContextVar('wwwpy_websocket_endpoint', default=None)
+
+
+def current_endpoint() -> WebsocketEndpoint | None:
+    """The websocket of the rpc call being executed, None when the call did not come from a websocket.
+    E.g., an rpc function subscribes its caller with pool.subscribe(current_endpoint(), 'orders/42')"""
+    return _current_endpoint.get()
+
+
+class SlowConsumerPolicy(Enum):
+    """What broadcast does with a client whose send queue is full"""
+    drop = 'drop'
+    """The message is dropped for that client, it misses it"""
+    disconnect = 'disconnect'
+    """The client is disconnected, e.g., the page reconnects and starts over"""
+
+
+@dataclass(frozen=True)
+class BroadcastStats:
+    clients: int
+    queue_depth: int
+    """The messages waiting to be sent, of all the clients"""
+    max_queue_depth: int
+    """The messages waiting to be sent to the client that is most behind"""
+    dropped: int
+    """The messages dropped since the start"""
+    disconnected: int
+    """The clients disconnected because they fell behind, since the start"""
+
+
+@dataclass(frozen=True)
+class WebsocketCompression:
+    """The permessage-deflate options (RFC 7692) of the websocket server; it is opt-in,
+    e.g., WsTornado(WebsocketCompression()). It is used only with the clients that offer the extension,
+    as the browsers do. See benchmarks/websocket_compression_bench.py for the trade-offs:
+    on the hot reload messages level 6 sends about a quarter of the bytes, level 9 costs three times the CPU
+    for a few bytes less"""
+    level: int = 6
+    """The zlib compression level, from 1 (fastest) to 9 (smallest)"""
+    mem_level: int = 8
+    """The zlib memory level of the compression state of each connection, from 1 to 9"""
+    min_size: int = 256
+    """The shorter messages are sent uncompressed, e.g., most rpc frames: they gain little and cost the most CPU
+    per byte; the text messages are measured in utf-8 bytes"""
+
+
 class WebsocketPool:
 
-    def __init__(self, route: str):
-        self.clients: list[WebsocketEndpoint] = []
+    def __init__(self, route: str, max_queue: int = 100, slow_consumer: SlowConsumerPolicy = SlowConsumerPolicy.drop):
+        """max_queue is the number of broadcast messages that can wait to be sent to a client;
+        slow_consumer tells what to do with the client when its queue is full"""
         self.http_route = WebsocketRoute(route, self._on_connect)
         self.on_before_change: List[PoolChangeCallback] = []
         self.on_after_change: List[PoolChangeCallback] = []
+        self.on_message: List[PoolMessageCallback] = []
+        """Called for every incoming message, e.g., the remote to server rpc calls"""
+        self.max_queue = max_queue
+        self.slow_consumer = slow_consumer
+        self._clients: dict[WebsocketEndpoint, _Client] = {}
+        self._by_id: dict[int, _Client] = {}
+        self._by_key: dict[str, dict[WebsocketEndpoint, None]] = {}
+        self._topics: dict[str, dict[WebsocketEndpoint, None]] = {}
+        """The subscribers of each topic, in order of subscription; a topic without subscribers is removed"""
+        self._registry_lock = threading.RLock()
+        """It guards the clients, the keys and the topics: the rpc functions subscribe their callers
+        from the threads of the SyncExecutor while the loop fans out and removes the clients"""
+        self._next_id = itertools.count(1)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        """The loop of the webserver, the send queues are drained on it"""
+        self._lock = threading.Lock()
+        self._pending: list[tuple[str | bytes, Callable[[], list[WebsocketEndpoint]]]] = []
+        """The messages broadcast from other threads, fanned out together with one wakeup of the loop"""
+        self._dropped = 0
+        self._disconnected = 0
+
+    @property
+    def clients(self) -> list[WebsocketEndpoint]:
+        """The connected clients, in order of connection"""
+        with self._registry_lock:
+            return list(self._clients)
 
     def _notify_change(self, change: PoolEvent, listeners: List[PoolChangeCallback]) -> None:
         for callback in listeners:
             callback(change)
 
     def _on_connect(self, endpoint: WebsocketEndpoint) -> None:
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
 
         add = PoolEvent(Change.add, endpoint, self)
         self._notify_change(add, self.on_before_change)
 
-        def handle_remove(msg: str | bytes | None):
+        def handle_message(msg: str | bytes | None):
             if msg is None:
                 remove = PoolEvent(Change.remove, endpoint, self)
                 self._notify_change(remove, self.on_before_change)
-                self.clients.remove(endpoint)
+                self._remove_client(endpoint)
                 self._notify_change(remove, self.on_after_change)
-
-        endpoint.add_listener(handle_remove)
-        self.clients.append(endpoint)
+            elif endpoint._calls is None or not endpoint._calls.on_message(msg):
+                for callback in self.on_message:
+                    callback(endpoint, msg)
+
+        endpoint.add_listener(handle_message)
+        client = _Client(endpoint, next(self._next_id), _SendQueue(endpoint))
+        with self._registry_lock:
+            self._clients[endpoint] = client
+            self._by_id[client.id] = client
         self._notify_change(add, self.on_after_change)
 
+    def client_id(self, endpoint: WebsocketEndpoint) -> int | None:
+        """The id of the connection, unique in the pool; None when it is not connected"""
+        client = self._clients.get(endpoint, None)
+        return None if client is None else client.id
+
+    def endpoint(self, client_id: int) -> WebsocketEndpoint | None:
+        client = self._by_id.get(client_id, None)
+        return None if client is None else client.endpoint
+
+    def add_key(self, endpoint: WebsocketEndpoint, key: str) -> None:
+        """A key identifies the client for the application, e.g., its session or its user;
+        more connections can have the same key (e.g., the tabs of the same user), see keyed"""
+        with self._registry_lock:
+            client = self._clients.get(endpoint, None)
+            if client is not None:
+                client.keys.add(key)
+                self._by_key.setdefault(key, {})[endpoint] = None
+
+    def remove_key(self, endpoint: WebsocketEndpoint, key: str) -> None:
+        with self._registry_lock:
+            client = self._clients.get(endpoint, None)
+            if client is not None and key in client.keys:
+                client.keys.discard(key)
+                _discard(self._by_key, key, endpoint)
+
+    def subscribe(self, endpoint: WebsocketEndpoint, topic: str) -> None:
+        with self._registry_lock:
+            client = self._clients.get(endpoint, None)
+            if client is not None:
+                client.topics.add(topic)
+                self._topics.setdefault(topic, {})[endpoint] = None
+
+    def unsubscribe(self, endpoint: WebsocketEndpoint, topic: str) -> None:
+        with self._registry_lock:
+            client = self._clients.get(endpoint, None)
+            if client is not None and topic in client.topics:
+                client.topics.discard(topic)
+                _discard(self._topics, topic, endpoint)
+
+    def topic(self, name: str) -> ClientGroup:
+        """The subscribers of the topic, e.g., pool.topic('orders/42').rpc(OrderRpc).changed(order)"""
+        return ClientGroup(self, lambda: self._members(self._topics, name))
+
+    def keyed(self, key: str) -> ClientGroup:
+        """The clients with the key, see add_key"""
+        return ClientGroup(self, lambda: self._members(self._by_key, key))
+
+    def topic_counts(self) -> dict[str, int]:
+        """The number of subscribers of each topic"""
+        with self._registry_lock:
+            return {topic: len(subscribers) for topic, subscribers in self._topics.items()}
+
+    def _members(self, index: dict[str, dict[WebsocketEndpoint, None]], name: str) -> list[WebsocketEndpoint]:
+        with self._registry_lock:
+            return list(index.get(name, ()))
+
     def all_clients_rpc(self, rpc_class: Callable[..., T]) -> Iterator[T]:
+        """Each client gets its own proxy, so each call is encoded once per client; see broadcast_rpc"""
         for client in self.clients:
             try:
                 yield client.rpc(rpc_class)
             except Exception as e:
                 logger.error(f'Error during rpc call: {e}')
 
+    def broadcast_rpc(self, rpc_class: Callable[..., T]) -> T:
+        """One proxy for all the clients: each call is encoded once and broadcast"""
+        return rpc_class(_BroadcastEndpoint(self.broadcast))
+
+    def broadcast(self, message: str | bytes) -> None:
+        """The same message is enqueued to the send queue of each client, see max_queue and slow_consumer.
+        It can be called from any thread, the queues are handled on the loop of the webserver"""
+        self._schedule(message, lambda: self.clients)
+
+    def broadcast_stats(self) -> BroadcastStats:
+        with self._registry_lock:
+            clients = list(self._clients.values())
+        depths = [len(client.queue.frames) for client in clients if client.queue is not None]
+        return BroadcastStats(len(clients), sum(depths), max(depths, default=0), self._dropped,
+                              self._disconnected)
+
+    def to_prometheus(self) -> str:
+        """The broadcast stats and the subscribers of each topic, in the same format of RpcMetrics.to_prometheus"""
+        stats = self.broadcast_stats()
+        lines = []
+        gauge(lines, 'wwwpy_websocket_clients', 'Number of connected websocket clients', [('', stats.clients)])
+        gauge(lines, 'wwwpy_websocket_queue_depth', 'Number of broadcast messages waiting to be sent',
+              [('', stats.queue_depth)])
+        gauge(lines, 'wwwpy_websocket_max_queue_depth',
+              'Number of broadcast messages waiting to be sent to the client most behind',
+              [('', stats.max_queue_depth)])
+        counter(lines, 'wwwpy_websocket_dropped_total', 'Number of broadcast messages dropped for slow clients',
+                [('', stats.dropped)])
+        counter(lines, 'wwwpy_websocket_disconnected_total', 'Number of slow clients disconnected',
+                [('', stats.disconnected)])
+        gauge(lines, 'wwwpy_websocket_topic_subscribers', 'Number of clients subscribed to the topic',
+              [(f'topic="{escape(topic)}"', count) for topic, count in sorted(self.topic_counts().items())])
+        return '\n'.join(lines) + '\n'
+
+    def _schedule(self, message: str | bytes, recipients: Callable[[], list[WebsocketEndpoint]]):
+        """The recipients are resolved on the loop, when the message is enqueued"""
+        loop = self._loop
+        if loop is None or loop.is_closed() or _running_loop() is loop:
+            self._fan_out(message, recipients)
+            return
+        with self._lock:
+            self._pending.append((message, recipients))
+            wakeup = len(self._pending) == 1
+        if wakeup:
+            loop.call_soon_threadsafe(self._fan_out_pending)
+
+    def _fan_out_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for message, recipients in pending:
+            self._fan_out(message, recipients)
+
+    def _fan_out(self, message: str | bytes, recipients: Callable[[], list[WebsocketEndpoint]]):
+        endpoints = recipients()
+        with self._registry_lock:
+            clients = [self._clients.get(endpoint, None) for endpoint in endpoints]
+        for endpoint, client in zip(endpoints, clients):
+            queue = None if client is None else client.queue
+            if queue is None:
+                continue
+            if len(queue.frames) < self.max_queue:
+                queue.put(message)
+            elif self.slow_consumer == SlowConsumerPolicy.disconnect:
+                logger.warning(f'Disconnecting the websocket client {client.id}, {len(queue.frames)} messages behind')
+                self._disconnected += 1
+                client.queue = None
+                queue.cancel()
+                _close(endpoint)
+            else:
+                self._dropped += 1
+
+    def _remove_client(self, endpoint: WebsocketEndpoint):
+        with self._registry_lock:
+            client = self._clients.pop(endpoint, None)
+            if client is None:
+                return
+            self._by_id.pop(client.id, None)
+            for key in client.keys:
+                _discard(self._by_key, key, endpoint)
+            for topic in client.topics:
+                _discard(self._topics, topic, endpoint)
+        if client.queue is not None:
+            client.queue.cancel()
+        if endpoint._calls is not None:
+            endpoint._calls.on_close()
+
+
+class ClientGroup:
+    """Some clients of a WebsocketPool, e.g., the subscribers of a topic; they are resolved when a message is sent,
+    so the group follows the subscriptions"""
+
+    def __init__(self, pool: WebsocketPool, endpoints: Callable[[], list[WebsocketEndpoint]]):
+        self._pool = pool
+        self._endpoints = endpoints
+
+    @property
+    def clients(self) -> list[WebsocketEndpoint]:
+        return self._endpoints()
+
+    def __len__(self):
+        return len(self._endpoints())
+
+    def broadcast(self, message: str | bytes) -> None:
+        """The same as WebsocketPool.broadcast, to the clients of the group"""
+        self._pool._schedule(message, self._endpoints)
+
+    def rpc(self, rpc_class: Callable[..., T]) -> T:
+        """The same as WebsocketPool.broadcast_rpc, to the clients of the group"""
+        return rpc_class(_BroadcastEndpoint(self.broadcast))
+
+
+@dataclass(eq=False)
+class _Client:
+    endpoint: WebsocketEndpoint
+    id: int
+    queue: _SendQueue | None
+    """None after the client was disconnected because it fell behind"""
+    keys: set[str] = field(default_factory=set)
+    topics: set[str] = field(default_factory=set)
+
+
+def _discard(index: dict[str, dict[WebsocketEndpoint, None]], name: str, endpoint: WebsocketEndpoint):
+    endpoints = index.get(name, None)
+    if endpoints is not None:
+        endpoints.pop(endpoint, None)
+        if not endpoints:
+            del index[name]
+
+
+class _SendQueue:
+    """The messages to send to one client, in order. The next one is sent when the previous one is flushed,
+    i.e., when the awaitable returned by send completes; an endpoint that returns nothing is never behind"""
+
+    def __init__(self, endpoint: WebsocketEndpoint):
+        self.endpoint = endpoint
+        self.frames: deque[str | bytes] = deque()
+        """The message being sent counts until it is flushed"""
+        self._task: asyncio.Task | None = None
+
+    def put(self, frame: str | bytes):
+        self.frames.append(frame)
+        if self._task is not None:
+            return
+        loop = _running_loop()
+        if loop is None:
+            self._send_all()
+        else:
+            self._task = loop.create_task(self._drain())
+
+    def cancel(self):
+        self.frames.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+    def _send_all(self):
+        """Without a loop nothing can be awaited, the endpoint must handle the send by itself"""
+        while self.frames:
+            self.endpoint.send(self.frames.popleft())
+
+    async def _drain(self):
+        try:
+            while self.frames:
+                res = self.endpoint.send(self.frames[0])
+                if res:
+                    await res
+                if self.frames:
+                    self.frames.popleft()
+        except Exception:
+            logger.exception('Error sending a websocket message, the queued messages are dropped')
+            self.frames.clear()
+        finally:
+            self._task = None
+
+
+class SendBuffer:
+    """The outgoing messages of one connection, sent from any thread. They are collected and written together
+    once per loop iteration, so a burst of messages wakes up the loop once instead of once per message.
+    write is called on the loop for each message, in order; None closes the connection. When it returns
+    a coroutine, it is awaited before writing the next message (e.g., the ASGI send)."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop,
+                 write: Callable[[str | bytes | None], Awaitable[None] | None]):
+        self._loop = loop
+        self._write = write
+        self._lock = threading.Lock()
+        self._messages: list[str | bytes | None] = []
+        self._flushed: asyncio.Future | None = None
+        """Shared by the messages sent on the loop thread since the last flush"""
+        self._scheduled = False
+        self.wakeups = 0
+        """The number of flushes, each one writes all the messages collected until then"""
+
+    def send(self, message: str | bytes | None) -> asyncio.Future | None:
+        """On the loop thread it returns a future, resolved when the message is written
+        (e.g., WebsocketPool.broadcast waits for it before sending the next message to this client)"""
+        on_loop = _running_loop() is self._loop
+        with self._lock:
+            self._messages.append(message)
+            if on_loop and self._flushed is None:
+                self._flushed = self._loop.create_future()
+            flushed = self._flushed if on_loop else None
+            wakeup = not self._scheduled
+            self._scheduled = True
+        if wakeup:
+            if on_loop:
+                self._start()
+            else:
+                self._loop.call_soon_threadsafe(self._start)
+        return flushed
+
+    def _start(self):
+        create_task_safe(self._flush())
+
+    async def _flush(self):
+        while True:
+            with self._lock:
+                messages, self._messages = self._messages, []
+                flushed, self._flushed = self._flushed, None
+                if not messages:
+                    self._scheduled = False
+                    return
+            self.wakeups += 1
+            try:
+                last = None
+                for message in messages:
+                    res = self._write(message)
+                    if asyncio.iscoroutine(res):
+                        await res
+                    elif res is not None:
+                        last = res
+                if last is not None:
+                    await last
+            except Exception:
+                logger.exception('Error writing a websocket message, the buffered messages are dropped')
+            finally:
+                if flushed is not None and not flushed.done():
+                    flushed.set_result(None)
+
+
+class _BroadcastEndpoint:
+    """The send endpoint of the proxies returned by broadcast_rpc and ClientGroup.rpc"""
+
+    def __init__(self, broadcast: Callable[[str | bytes], None]):
+        self._broadcast = broadcast
+
+    def send(self, message: str | bytes) -> None:
+        self._broadcast(message)
+
+    def dispatch(self, module: str, func_name: str, *args) -> None:
+        self._broadcast(RpcRequest.to_json(module, func_name, *args))
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+_calls_lock = threading.Lock()
+
+
+def _close(endpoint: WebsocketEndpoint):
+    _send_soon(endpoint, None)
+
+
+def _send_soon(endpoint: WebsocketEndpoint, message: str | bytes | None):
+    res = endpoint.send(message)
+    if asyncio.iscoroutine(res):
+        asyncio.ensure_future(res)
+
 
 class ListenerProtocol(Protocol):
     def __call__(self, message: str | bytes | None) -> OptionalCoroutine: ...
@@ -95,6 +518,19 @@ T = TypeVar('T')
 
 class WebsocketEndpoint(SendEndpoint):
     listeners: list[ListenerProtocol]
+    _calls: WebsocketCalls | None = None
+
+    @property
+    def calls(self) -> WebsocketCalls:
+        """The server to remote calls that wait for a result, see wwwpy.common.rpc.remote_call;
+        WebsocketPool routes the responses here and fails the pending calls when the client disconnects"""
+        if self._calls is None:
+            with _calls_lock:  # the calls can come from the threads of the sync functions
+                if self._calls is None:
+                    calls = WebsocketCalls(lambda message: _send_soon(self, message))
+                    calls.on_open()
+                    self._calls = calls
+        return self._calls
 
     def add_listener(self, listener: ListenerProtocol) -> None: ...
 
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import array
+import struct
+
+import pytest
+
+from wwwpy.common import arraylib
+from wwwpy.common.arraylib import ArrayHeader
+
+
+def test_array_to_buffer():
+    header, buffer = arraylib.to_buffer(array.array('d', [1.5, 2.5]))
+
+    assert header == ArrayHeader('<f8', (2,))
+    assert bytes(buffer) == struct.pack('<2d', 1.5, 2.5)
+
+
+@pytest.mark.parametrize('typecode', 'bBhHiIlLqQfd')
+def test_array_round_trip(typecode):
+    expected = array.array(typecode, [1, 2, 3])
+
+    header, buffer = arraylib.to_buffer(expected)
+
+    assert arraylib.from_buffer(header, bytes(buffer), array.array) == expected
+
+
+def test_array_from_big_endian():
+    header = ArrayHeader('>i2', (2,))
+
+    assert arraylib.from_buffer(header, b'\x00\x01\x00\x02', array.array) == array.array('h', [1, 2])
+
+
+def test_unsupported():
+    with pytest.raises(TypeError):
+        arraylib.to_buffer(array.array('u', 'abc'))
+    with pytest.raises(TypeError):
+        arraylib.from_buffer(ArrayHeader('<f8', (2, 2)), bytes(32), array.array)
+
+
+def test_is_array_type():
+    assert arraylib.is_array_type(array.array)
+    assert not arraylib.is_array_type(list[float])
+    assert not arraylib.is_array_type(bytes)
+
+
+def test_ndarray_round_trip__should_be_a_view():
+    numpy = pytest.importorskip('numpy')
+    expected = numpy.arange(6, dtype=numpy.float32).reshape(2, 3)
+
+    header, buffer = arraylib.to_buffer(expected)
+    data = bytes(buffer)
+    actual = arraylib.from_buffer(header, data, numpy.ndarray)
+
+    assert header == ArrayHeader('<f4', (2, 3))
+    assert (actual == expected).all()
+    assert actual.base is not None and not actual.flags.writeable  # a view of the bytes
+
+
+def test_ndarray_to_array():
+    numpy = pytest.importorskip('numpy')
+
+    header, buffer = arraylib.to_buffer(numpy.array([1, 2], dtype='>i4'))
+
+    assert header.dtype == '<i4'
+    assert arraylib.from_buffer(header, buffer, array.array) == array.array('i', [1, 2])
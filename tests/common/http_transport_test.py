@@ -0,0 +1,8 @@
+from wwwpy.common.http_transport import _x_user_defined_bytes
+
+
+def test_x_user_defined_bytes__should_restore_all_the_bytes():
+    data = bytes(range(256))
+    text = ''.join(chr(b) if b < 0x80 else chr(0xF700 + b) for b in data)  # as the browser decodes it
+
+    assert _x_user_defined_bytes(text) == data
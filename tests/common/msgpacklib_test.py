@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import pytest
+
+from wwwpy.common import msgpacklib
+from wwwpy.common.msgpacklib import MsgpackError, Unpacker
+
+
+@pytest.mark.parametrize('obj', [
+    None, True, False,
+    0, 1, 127, 128, 255, 256, 65535, 65536, 2 ** 32 - 1, 2 ** 32, 2 ** 64 - 1,
+    -1, -32, -33, -128, -129, -32768, -32769, -2 ** 31, -2 ** 31 - 1, -2 ** 63,
+    0.0, 1.5, -1e300,
+    '', 'a' * 31, 'a' * 32, 'a' * 255, 'a' * 256, 'a' * 65536, 'àèìòù',
+    b'', b'\x00\xff', bytes(255), bytes(256), bytes(65536),
+    [], [1, 'a', None], list(range(15)), list(range(16)), list(range(65536)),
+    {}, {'a': 1, 'b': [1, 2]}, {str(i): i for i in range(16)},
+])
+def test_round_trip(obj):
+    assert msgpacklib.unpackb(msgpacklib.packb(obj)) == obj
+
+
+def test_known_encodings():
+    assert msgpacklib.packb(None) == b'\xc0'
+    assert msgpacklib.packb(-1) == b'\xff'
+    assert msgpacklib.packb('a') == b'\xa1a'
+    assert msgpacklib.packb([1, 2]) == b'\x92\x01\x02'
+    assert msgpacklib.packb({'a': 1}) == b'\x81\xa1a\x01'
+
+
+def test_tuple__should_be_unpacked_as_list():
+    assert msgpacklib.unpackb(msgpacklib.packb((1, 2))) == [1, 2]
+
+
+def test_float32():
+    assert msgpacklib.unpackb(b'\xca\x3f\xc0\x00\x00') == 1.5
+
+
+def test_unpacker__should_read_a_stream():
+    data = msgpacklib.packb('a') + msgpacklib.packb(1)
+    target = Unpacker(data)
+
+    assert target.unpack() == 'a'
+    assert not target.at_end()
+    assert target.unpack() == 1
+    assert target.at_end()
+
+
+def test_unsupported_type():
+    with pytest.raises(MsgpackError):
+        msgpacklib.packb(object())
+
+
+def test_too_large_int():
+    with pytest.raises(MsgpackError):
+        msgpacklib.packb(2 ** 64)
+
+
+def test_truncated():
+    with pytest.raises(MsgpackError):
+        msgpacklib.unpackb(msgpacklib.packb('hello')[:-1])
+
+
+def test_extra_data():
+    with pytest.raises(MsgpackError):
+        msgpacklib.unpackb(b'\x01\x02')
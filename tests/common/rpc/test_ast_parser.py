@@ -108,3 +108,22 @@ class Class1:
     exec(target, executed)
     assert 'Class1' in executed
     assert 'some' not in executed['Class1'].__dict__
+
+
+def test_ast_module_source_to_proxy_async_method():
+    # language=Python
+    target = func_registry.source_to_proxy('mod3', """
+import js
+from datetime import date
+class Class1:
+    def __init__(self):
+        self.element = js.document.body
+    async def today(self, offset: int) -> date:
+        return date.today()
+    """)
+
+    assert 'from datetime import date\n' in target
+    assert 'import js' not in target
+    assert 'js.document' not in target
+    assert 'async def today(self, offset: int) -> date:\n' in target
+    assert '_remote_call(self.send_endpoint, "mod3", "Class1.today", self.today, offset)' in target
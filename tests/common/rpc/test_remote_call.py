@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+
+import pytest
+
+from tests.common import dyn_sys_path, DynSysPath
+from wwwpy.common import reloader
+from wwwpy.common.rpc import func_registry
+from wwwpy.common.rpc.remote_call import RemoteDispatcher
+from wwwpy.common.rpc2 import deadline
+from wwwpy.exceptions import RemoteException, RemoteError, RemoteTimeoutError
+from wwwpy.websocket import WebsocketPool, WebsocketEndpointIO
+
+# language=python
+_model_source = """
+from dataclasses import dataclass
+
+@dataclass
+class Order:
+    id: int
+    title: str
+"""
+
+# language=python
+_remote_source = """
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+import js
+from common_app.model import Order
+
+cancelled = []
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+class Component1:
+    def __init__(self):
+        self.notified = []
+
+    def notify(self, value):
+        self.notified.append(value)
+
+    async def rename(self, order: Order, title: str) -> Order:
+        return Order(order.id, title)
+
+    async def count(self) -> int:
+        return len(self.notified)
+
+    async def where(self, x: int) -> Point:
+        return Point(x, x * 2)
+
+    async def ask(self, element: js.HTMLElement) -> str:
+        return element.id
+
+    async def fail(self) -> None:
+        raise ValueError('remote failure')
+
+    async def never(self) -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+"""
+
+
+class Loopback:
+    """A server endpoint in a pool, connected to a RemoteDispatcher; the frames are delivered on the loop"""
+
+    def __init__(self, dyn_sys_path: DynSysPath):
+        dyn_sys_path.write_module2('common_app/model.py', _model_source)
+        dyn_sys_path.write_module2('remote_app/rpc.py', _remote_source.replace('import js\n', ''))
+        self.proxy_module = {}
+        exec(func_registry.source_to_proxy('remote_app.rpc', _remote_source), self.proxy_module)
+        self.pool = WebsocketPool('/ws')
+        self.endpoint = WebsocketEndpointIO(self._to_remote)
+        self.pool.http_route.on_connect(self.endpoint)
+        self.dispatcher = RemoteDispatcher(self._to_server)
+
+    def _to_remote(self, message):
+        asyncio.get_running_loop().call_soon(self.dispatcher.on_message, message)
+
+    def _to_server(self, message):
+        asyncio.get_running_loop().call_soon(self.endpoint.on_message, message)
+
+    def proxy(self):
+        return self.endpoint.rpc(self.proxy_module['Component1'])
+
+    def remote_module(self):
+        return importlib.import_module('remote_app.rpc')
+
+
+@pytest.fixture
+def loopback(dyn_sys_path: DynSysPath):
+    return Loopback(dyn_sys_path)
+
+
+async def test_call__should_return_the_typed_result(loopback):
+    Order = loopback.proxy_module['Order']
+
+    result = await loopback.proxy().rename(Order(1, 'old'), 'new')
+
+    assert result == Order(1, 'new')
+
+
+async def test_call__should_return_a_dataclass_of_the_remote_module(loopback):
+    result = await loopback.proxy().where(3)
+
+    assert result == loopback.proxy_module['Point'](3, 6)
+
+
+async def test_calls__should_have_their_own_instance(loopback):
+    loopback.dispatcher.dispatch('remote_app.rpc', 'Component1.notify', [42])
+
+    assert await loopback.proxy().count() == 0
+
+
+def test_types_the_server_cannot_import__should_be_fire_and_forget(loopback):
+    messages = []
+    loopback.endpoint.dispatch = lambda *args: messages.append(args)
+
+    loopback.proxy().ask('element')
+
+    assert messages == [('remote_app.rpc', 'Component1.ask', 'element')]
+
+
+async def test_exception__should_raise_remote_exception(loopback):
+    with pytest.raises(RemoteException, match='remote failure'):
+        await loopback.proxy().fail()
+
+
+async def test_deadline__should_raise_and_cancel_the_remote_call(loopback):
+    with pytest.raises(RemoteTimeoutError):
+        with deadline.timeout(0.05):
+            await loopback.proxy().never()
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+    assert loopback.remote_module().cancelled == [True]
+
+
+async def test_disconnection__should_fail_the_pending_calls(loopback):
+    call = asyncio.ensure_future(loopback.proxy().never())
+    await asyncio.sleep(0)
+
+    loopback.endpoint.on_message(None)
+
+    with pytest.raises(RemoteError):
+        await call
+
+
+async def test_broadcast__should_not_await_a_result(loopback):
+    proxy = loopback.pool.broadcast_rpc(loopback.proxy_module['Component1'])
+
+    with pytest.raises(RemoteError):
+        await proxy.count()
+
+
+def test_dispatch_table__should_be_rebuilt_on_hot_reload(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('common_app/model.py', _model_source)
+    dyn_sys_path.write_module2('remote_app/rpc.py', _remote_source.replace('import js\n', ''))
+    target = RemoteDispatcher(lambda message: None)
+
+    first = target.resolve('remote_app.rpc', 'Component1.count')
+    assert target.resolve('remote_app.rpc', 'Component1.count') is first
+    assert target.resolve('remote_app.rpc', 'Component1.fail').cls is first.cls
+    assert len(target) == 2
+
+    reloader.unload_path(str(dyn_sys_path.path))
+    reloaded = target.resolve('remote_app.rpc', 'Component1.count')
+
+    assert reloaded is not first
+    assert reloaded.cls is not first.cls
+    assert len(target) == 1
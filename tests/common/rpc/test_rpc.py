@@ -95,6 +95,76 @@ def test_module_add_and_remove__should_remove_old_stubs(dyn_sys_path: DynSysPath
     actual_names = list(map(lambda x: x.arcname, actual))
     assert actual_names == []
 
+
+def test_batch_remote_calls__should_generate_stubs_with_the_batch_transport(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('some/module.py', 'async def some_function(a: int) -> int: return a')
+    target = RpcRoute('/rpc1', batch_remote_calls=True)
+    target.allow('some.module')
+
+    add, _ = target.generate_remote_stubs()
+
+    assert 'RemoteBatchHttpTransport("/rpc1", "text/plain")' in add[0].read_text()
+
+
+def test_msgpack_remote_calls__should_generate_stubs_with_the_msgpack_encoder_decoder(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('some/module.py', 'async def some_function(a: int) -> int: return a')
+    target = RpcRoute('/rpc1', msgpack_remote_calls=True)
+    target.allow('some.module')
+
+    add, _ = target.generate_remote_stubs()
+
+    source = add[0].read_text()
+    assert 'RemoteHttpTransport("/rpc1", "application/msgpack")' in source
+    assert 'MsgpackEncoderDecoder()' in source
+
+
+def test_unchanged_module__should_not_rewrite_the_stub(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('some/module.py', 'def some_function(a: int) -> int: return a')
+    target = RpcRoute('/rpc1')
+    target.allow('some.module')
+    add, _ = target.generate_remote_stubs()
+    stub_mtime = add[0].stat().st_mtime_ns
+
+    assert target.generate_remote_stubs() == ([], [])
+    assert add[0].stat().st_mtime_ns == stub_mtime
+
+
+def test_body_change__should_not_rewrite_the_stub(dyn_sys_path: DynSysPath):
+    module = dyn_sys_path.write_module2('some/module.py', 'def some_function(a: int) -> int: return a')
+    target = RpcRoute('/rpc1')
+    target.allow('some.module')
+    target.generate_remote_stubs()
+
+    module.write_text('def some_function(a: int) -> int: return a + 1')
+
+    assert target.generate_remote_stubs() == ([], [])
+
+
+def test_signature_change__should_rewrite_only_that_stub(dyn_sys_path: DynSysPath):
+    module = dyn_sys_path.write_module2('some/module.py', 'def some_function(a: int) -> int: return a')
+    dyn_sys_path.write_module2('some/other.py', 'def other_function(a: int) -> int: return a')
+    target = RpcRoute('/rpc1')
+    target.allow('some.module')
+    target.allow('some.other')
+    target.generate_remote_stubs()
+
+    module.write_text('def some_function(a: int, b: int) -> int: return a + b')
+    add, _ = target.generate_remote_stubs()
+
+    assert add == [target.tmp_bundle_folder / 'some/module.py']
+    assert 'b: int' in add[0].read_text()
+
+
+def test_deleted_stub__should_be_written_again(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('some/module.py', 'def some_function(a: int) -> int: return a')
+    target = RpcRoute('/rpc1')
+    target.allow('some.module')
+    add, _ = target.generate_remote_stubs()
+
+    add[0].unlink()
+
+    assert target.generate_remote_stubs()[0] == add
+
 # def test_module_should_create_stub_automatically(dyn_sys_path:DynSysPath):
 #     dyn_sys_path.write_module2('some/module.py', 'def some_function(a: int, b: int) -> int: return a + b')
 #     target = RpcRoute('/rpc1')
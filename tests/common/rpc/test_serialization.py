@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import array
+import json
 import sys
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -149,6 +151,34 @@ def test_bytes():
     assert deserialized == expected
 
 
+def test_array():
+    expected = array.array('d', [1.5, 2.5])
+
+    serialized = serialization.to_json(expected, array.array)
+
+    assert '"dtype": "<f8"' in serialized
+    assert serialization.from_json(serialized, array.array) == expected
+
+
+def test_array_native_bytes__should_not_be_base64():
+    with serialization.native_bytes():
+        serialized = serialization.serialize(array.array('B', b'ab'), array.array)
+
+    assert bytes(serialized['data']) == b'ab'
+    assert serialization.deserialize(serialized, array.array) == array.array('B', b'ab')
+
+
+def test_array_in_dataclass():
+    @dataclass
+    class Series:
+        name: str
+        values: Optional[array.array]
+
+    expected = Series('s1', array.array('i', [1, 2, 3]))
+
+    assert serialization.from_json(serialization.to_json(expected, Series), Series) == expected
+
+
 def test_bytes_optional():
     expected = b'\x80\x81\x82'
 
@@ -281,6 +311,18 @@ class TestUnion:
         deserialized = serialization.from_json(serialized, datetime | str)
         assert deserialized == birth
 
+    def test_tag__should_be_short(self):
+        serialized = serialization.to_json(1, Union[int, str])
+        assert serialized.startswith('[') and type(json.loads(serialized)[0]) is int
+
+    def test_legacy_tag__should_be_accepted(self):
+        deserialized = serialization.from_json('["<class \'int\'>", 1]', Union[int, str])
+        assert deserialized == 1
+
+    def test_unknown_tag__should_raise(self):
+        with pytest.raises(Exception):
+            serialization.from_json('[12345678, 1]', Union[int, str])
+
 
 def test_none_type():
     serialized = serialization.to_json(None, type(None))
@@ -312,3 +354,11 @@ class TestResult:
         serialized = serialization.to_json(result, Result[Person, str])
         deserialized = serialization.from_json(serialized, Result[Person, str])
         assert deserialized == result
+
+    def test_result_tags__should_be_short(self):
+        assert serialization.to_json(Result.success(42), Result[int, str]) == '[0, 42]'
+        assert serialization.to_json(Result.failure('e'), Result[int, str]) == '[1, "e"]'
+
+    def test_result_legacy_tag__should_be_accepted(self):
+        legacy = f'["{Result.success(42).__class__}", 42]'
+        assert serialization.from_json(legacy, Result[int, str]) == Result.success(42)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import enum
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, List, Dict, Tuple, Union
+
+import pytest
+
+from tests.common import DynSysPath, dyn_sys_path
+from wwwpy.common import reloader
+from wwwpy.common.result import Result, Success, Failure
+from wwwpy.common.rpc import serialization
+from wwwpy.common.rpc.serialization import SerializationError, DeserializationError
+
+
+class Color(enum.Enum):
+    RED = 'red'
+    GREEN = 'green'
+
+
+@dataclass
+class Address:
+    city: str
+    zip_code: int
+
+
+@dataclass
+class Person:
+    name: str
+    age: int
+    address: Address
+    tags: List[str] = field(default_factory=list)
+    nickname: Optional[str] = None
+
+
+@dataclass
+class Node:
+    value: int
+    children: list[Node]
+
+
+_cases = [
+    (1, int), (True, bool), (True, int), (1.5, float), ('a', str), (None, type(None)),
+    (b'\x00\xff', bytes), (datetime(2024, 1, 2, 3, 4, 5), datetime), (Color.GREEN, Color),
+    ([1, 2, 3], List[int]), ((1, 'a'), Tuple[int, str]), ({'a': 1}, Dict[str, int]), ({1: 'a'}, dict[int, str]),
+    (None, Optional[int]), (3, Optional[int]), (3, Union[int, str]), ('3', int | str), (None, int | str | None),
+    (Success(1), Result[int, str]), (Failure('no'), Result[int, str]),
+    (Person('John', 30, Address('NY', 10001), ['a'], 'Johnny'), Person),
+    ([Person('John', 30, Address('NY', 10001))], list[Person]),
+    (Node(1, [Node(2, []), Node(3, [Node(4, [])])]), Node),
+]
+
+
+def _generic_serialize(obj, cls):
+    return serialization.serialize(obj, cls, [f'{cls}'])
+
+
+def _generic_deserialize(data, cls):
+    return serialization.deserialize(data, cls, [f'{cls}'])
+
+
+@pytest.mark.parametrize('obj, cls', _cases)
+def test_plan__should_be_wire_compatible_with_the_generic_implementation(obj, cls):
+    serialized = serialization.serialize(obj, cls)
+
+    assert serialized == _generic_serialize(obj, cls)
+    assert serialization.deserialize(serialized, cls) == _generic_deserialize(serialized, cls) == obj
+
+
+def test_plan_error__should_report_the_path():
+    person = Person('John', 30, Address('NY', 'not an int'))  # noqa
+
+    with pytest.raises(SerializationError) as exc_info:
+        serialization.serialize(person, Person)
+
+    assert exc_info.value.path[1:] == ['address', 'zip_code']
+
+
+def test_plan_deserialize_error__should_report_the_path():
+    with pytest.raises(DeserializationError) as exc_info:
+        serialization.deserialize([{'city': 'NY', 'zip_code': [1]}], list[Address])
+
+    assert exc_info.value.path[1:] == ['0', 'zip_code']
+
+
+def test_plan__list_should_not_be_converted_to_str():
+    with pytest.raises(DeserializationError):
+        serialization.deserialize(['a'], str)
+
+
+def test_plan__bytes_should_be_native_in_the_context():
+    with serialization.native_bytes():
+        assert serialization.serialize([b'\x01'], list[bytes]) == [b'\x01']
+    assert serialization.serialize([b'\x01'], list[bytes]) == ['AQ==']
+
+
+def test_hot_reload__should_drop_the_plans(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('mod1.py', 'from dataclasses import dataclass\n'
+                                          '@dataclass\nclass Item:\n    name: str\n')
+    import mod1  # noqa
+    serialization.serialize(mod1.Item('a'), mod1.Item)
+
+    # WHEN
+    reloader.unload_path(str(dyn_sys_path.path))
+    serialization.serialize(1, int)
+
+    # THEN
+    assert mod1.Item not in serialization._plans._serializers
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from tests.common.rpc2.transport_fake import TransportFake
+from wwwpy.common.rpc2 import admission, deadline
+from wwwpy.common.rpc2.admission import AdmissionControl, AdmissionStats, OverloadedError
+from wwwpy.common.rpc2.default_stub import DefaultStub
+from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder
+from wwwpy.common.rpc2.typed_function import get_typed_function
+from wwwpy.exceptions import RemoteOverloadedError
+
+
+class Calls:
+    """Calls that hold their admission slot until release is set"""
+
+    def __init__(self, target: AdmissionControl, func_name: str = 'f'):
+        self.target = target
+        self.func_name = func_name
+        self.release = asyncio.Event()
+
+    async def call(self) -> str:
+        async with self.target.admit('mod', self.func_name):
+            await self.release.wait()
+        return 'done'
+
+    def start(self) -> asyncio.Task:
+        return asyncio.create_task(self.call())
+
+
+async def test_within_the_cap__should_run():
+    target = AdmissionControl(max_concurrent=2)
+    calls = Calls(target)
+    tasks = [calls.start(), calls.start()]
+    await asyncio.sleep(0)
+
+    assert target.stats() == AdmissionStats(running=2, queue_depth=0, rejected=0)
+    calls.release.set()
+    assert await asyncio.gather(*tasks) == ['done', 'done']
+    assert target.stats() == AdmissionStats(running=0, queue_depth=0, rejected=0)
+
+
+async def test_above_the_cap_without_queue__should_reject():
+    target = AdmissionControl(max_concurrent=1, retry_after=3)
+    calls = Calls(target)
+    running = calls.start()
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError) as e:
+        await calls.call()
+
+    assert e.value.retry_after == 3
+    assert target.stats() == AdmissionStats(running=1, queue_depth=0, rejected=1)
+    calls.release.set()
+    await running
+
+
+async def test_above_the_cap__should_wait_in_the_queue():
+    target = AdmissionControl(max_concurrent=1, max_queue=1)
+    calls = Calls(target)
+    tasks = [calls.start(), calls.start()]
+    await asyncio.sleep(0)
+
+    assert target.stats() == AdmissionStats(running=1, queue_depth=1, rejected=0)
+    with pytest.raises(OverloadedError):
+        await calls.call()
+
+    calls.release.set()
+    assert await asyncio.gather(*tasks) == ['done', 'done']
+    assert target.stats() == AdmissionStats(running=0, queue_depth=0, rejected=1)
+
+
+async def test_cancelled_while_queued__should_leave_the_queue():
+    target = AdmissionControl(max_concurrent=1, max_queue=1)
+    calls = Calls(target)
+    running = calls.start()
+    queued = calls.start()
+    await asyncio.sleep(0)
+
+    queued.cancel()
+    await asyncio.gather(queued, return_exceptions=True)
+
+    assert target.stats() == AdmissionStats(running=1, queue_depth=0, rejected=0)
+    calls.release.set()
+    await running
+    assert target.stats().running == 0
+
+
+async def test_function_limit__should_not_affect_the_other_functions():
+    target = AdmissionControl()
+    target.set_limit('mod', 'slow', 1)
+    slow = Calls(target, 'slow')
+    running = slow.start()
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError):
+        await slow.call()
+    other = Calls(target, 'other')
+    other.release.set()
+    assert await other.call() == 'done'
+
+    assert target.function_stats('mod', 'slow') == AdmissionStats(running=1, queue_depth=0, rejected=1)
+    slow.release.set()
+    await running
+
+
+async def test_module_limit__should_cap_its_functions_together():
+    target = AdmissionControl()
+    target.set_limit('mod', '', 1)
+    first = Calls(target, 'first')
+    running = first.start()
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError):
+        await Calls(target, 'second').call()
+
+    assert target.function_stats('mod', '') == AdmissionStats(running=1, queue_depth=0, rejected=1)
+    first.release.set()
+    await running
+
+
+async def test_declared_limit__should_cap_the_function():
+    target = AdmissionControl()
+    target.declare_limit('mod', 'f', 1)
+    calls = Calls(target)
+    running = calls.start()
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError):
+        await calls.call()
+
+    calls.release.set()
+    await running
+
+
+async def test_declared_limit__should_not_replace_the_limit_set_explicitly():
+    target = AdmissionControl()
+    target.set_limit('mod', 'f', 2)
+    target.declare_limit('mod', 'f', 1)
+    calls = Calls(target)
+    tasks = [calls.start(), calls.start()]
+    await asyncio.sleep(0)
+
+    assert target.function_stats('mod', 'f') == AdmissionStats(running=2, queue_depth=0, rejected=0)
+    calls.release.set()
+    await asyncio.gather(*tasks)
+
+
+async def test_function_rejected__should_not_hold_the_global_slot():
+    target = AdmissionControl(max_concurrent=2)
+    target.set_limit('mod', 'f', 1)
+    calls = Calls(target)
+    running = calls.start()
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError):
+        await calls.call()
+
+    assert target.stats().running == 1
+    calls.release.set()
+    await running
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        AdmissionControl(max_concurrent=0)
+    with pytest.raises(ValueError):
+        AdmissionControl().set_limit('mod', 'f', 1, max_queue=-1)
+
+
+async def test_to_prometheus():
+    target = AdmissionControl(max_concurrent=1)
+    target.set_limit('mod', 'f', 1)
+    with pytest.raises(OverloadedError):
+        async with target.admit('mod', 'f'):
+            async with target.admit('mod', 'f'):
+                pass
+
+    text = target.to_prometheus()
+
+    assert '# TYPE wwwpy_rpc_admission_queue_depth gauge\n' in text
+    assert 'wwwpy_rpc_admission_rejected_total 0\n' in text
+    assert 'wwwpy_rpc_admission_rejected_total{module="mod",function="f"} 1\n' in text
+
+
+def test_retry_after_header():
+    assert admission.format_retry_after(0.2) == '1'
+    assert admission.format_retry_after(2.5) == '3'
+    assert admission.parse_retry_after('2') == 2
+    assert admission.parse_retry_after(None) == admission.default_retry_after
+    assert admission.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == admission.default_retry_after
+
+
+def test_retry_delay__should_grow_with_jitter():
+    delays = [admission.retry_delay(attempt, 1) for attempt in range(3)]
+
+    for attempt, delay in enumerate(delays):
+        assert 2 ** attempt / 2 <= delay <= 2 ** attempt
+
+
+# stub side
+
+async def add(a: int, b: int) -> int: ...
+
+
+def _overloaded(retry_after: float = 0.001) -> str:
+    return admission.encode_overloaded(JsonEncoderDecoder(), OverloadedError('busy', retry_after))
+
+
+def _ok(value: int) -> str:
+    encoder = JsonEncoderDecoder().encoder()
+    encoder.encode('ok', str)
+    encoder.encode(value, int)
+    return encoder.buffer
+
+
+async def test_stub_overloaded__should_retry():
+    transport = TransportFake()
+    transport.recv_buffer = [_overloaded(), _ok(3)]
+    target = DefaultStub(transport, JsonEncoderDecoder(), 'mod')
+
+    assert await target.invoke_async(get_typed_function(add), [1, 2]) == 3
+    assert len(transport.send_buffer) == 2
+
+
+async def test_stub_overloaded__should_give_up_after_the_retries():
+    transport = TransportFake()
+    transport.recv_buffer = [_overloaded() for _ in range(3)]
+    target = DefaultStub(transport, JsonEncoderDecoder(), 'mod', overload_retries=2)
+
+    with pytest.raises(RemoteOverloadedError) as e:
+        await target.invoke_async(get_typed_function(add), [1, 2])
+
+    assert e.value.retry_after == 0.001
+    assert len(transport.send_buffer) == 3
+
+
+async def test_stub_overloaded__should_not_retry_beyond_the_deadline():
+    transport = TransportFake()
+    transport.recv_buffer = [_overloaded(retry_after=10), _ok(3)]
+    target = DefaultStub(transport, JsonEncoderDecoder(), 'mod')
+
+    with deadline.timeout(5):
+        with pytest.raises(RemoteOverloadedError):
+            await target.invoke_async(get_typed_function(add), [1, 2])
+
+    assert len(transport.send_buffer) == 1
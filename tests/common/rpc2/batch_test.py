@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from tests.common.rpc2.transport_fake import TransportFake
+from wwwpy.common.rpc2.batch import Batcher, BatchTransport, encode_batch, decode_batch, is_batch, \
+    batch_content_type
+from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder, PartsEncoderDecoder
+
+
+class PostFake:
+    def __init__(self):
+        self.encdec = JsonEncoderDecoder()
+        self.posts: list[tuple[str, bool]] = []
+        self.exception: Exception | None = None
+
+    async def __call__(self, payload: str, batch: bool) -> str:
+        self.posts.append((payload, batch))
+        if self.exception:
+            raise self.exception
+        if not batch:
+            return payload.upper()
+        requests = decode_batch(self.encdec, payload)
+        return encode_batch(self.encdec, [r.upper() for r in requests])
+
+
+@pytest.fixture
+def post():
+    return PostFake()
+
+
+def test_envelope_round_trip():
+    encdec = JsonEncoderDecoder()
+    payloads = ['a\nb', '"quoted"', '']
+
+    assert decode_batch(encdec, encode_batch(encdec, payloads)) == payloads
+
+
+def test_is_batch():
+    assert is_batch(batch_content_type('text/plain'))
+    assert not is_batch('text/plain')
+    assert not is_batch('')
+    assert not is_batch(None)
+
+
+async def test_same_iteration__should_be_sent_in_one_post(post: PostFake):
+    target = Batcher(post, post.encdec)
+
+    results = await asyncio.gather(target.submit('a'), target.submit('b'), target.submit('c'))
+
+    assert results == ['A', 'B', 'C']
+    assert len(post.posts) == 1
+    assert post.posts[0][1]
+
+
+async def test_single_payload__should_be_sent_without_envelope(post: PostFake):
+    target = Batcher(post, post.encdec)
+
+    assert await target.submit('a') == 'A'
+    assert post.posts == [('a', False)]
+
+
+async def test_different_iterations__should_be_sent_in_different_posts(post: PostFake):
+    target = Batcher(post, post.encdec)
+
+    assert await target.submit('a') == 'A'
+    assert await target.submit('b') == 'B'
+    assert len(post.posts) == 2
+
+
+async def test_post_failure__should_fail_all_the_calls(post: PostFake):
+    post.exception = Exception('network down')
+    target = Batcher(post, post.encdec)
+
+    results = await asyncio.gather(target.submit('a'), target.submit('b'), return_exceptions=True)
+
+    assert [str(r) for r in results] == ['network down', 'network down']
+
+
+async def test_transport__concurrent_calls_should_receive_their_own_response(post: PostFake):
+    target = BatchTransport(Batcher(post, post.encdec), TransportFake())
+
+    async def call(payload: str):
+        await target.send_async(payload)
+        return await target.recv_async()
+
+    assert await asyncio.gather(call('a'), call('b'), call('c')) == ['A', 'B', 'C']
+    assert len(post.posts) == 1
+
+
+def test_transport__sync_should_use_the_sync_transport(post: PostFake):
+    sync_transport = TransportFake()
+    sync_transport.recv_buffer.append('response')
+    target = BatchTransport(Batcher(post, post.encdec), sync_transport)
+
+    target.send_sync('request')
+
+    assert sync_transport.send_buffer == ['request']
+    assert target.recv_sync() == 'response'
+    assert post.posts == []
+
+
+async def test_transport__parts_payload_should_use_the_sync_transport(post: PostFake):
+    sync_transport = TransportFake()
+    sync_transport.recv_buffer.append(b'response')
+    target = BatchTransport(Batcher(post, post.encdec), sync_transport)
+    encoder = PartsEncoderDecoder(post.encdec).encoder()
+    encoder.encode(b'data', bytes)
+
+    await target.send_async(encoder.buffer)
+
+    assert sync_transport.send_buffer == [encoder.buffer]
+    assert await target.recv_async() == b'response'
+    assert post.posts == []
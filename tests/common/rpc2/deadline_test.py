@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import pytest
+
+from wwwpy.common.rpc2 import deadline
+
+
+def test_remaining__without_timeout_should_be_none():
+    assert deadline.remaining() is None
+
+
+def test_remaining__inside_timeout():
+    with deadline.timeout(10):
+        assert 9 < deadline.remaining() <= 10
+    assert deadline.remaining() is None
+
+
+def test_nested_timeout__should_not_extend_the_outer():
+    with deadline.timeout(1):
+        with deadline.timeout(10):
+            assert deadline.remaining() <= 1
+        with deadline.timeout(0.5):
+            assert deadline.remaining() <= 0.5
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None),
+    ('', None),
+    ('1.5', 1.5),
+    ('0', 0.0),
+    ('-1', None),
+    ('abc', None),
+])
+def test_parse_timeout(value, expected):
+    assert deadline.parse_timeout(value) == expected
+
+
+def test_format_timeout__should_parse_back():
+    assert deadline.parse_timeout(deadline.format_timeout(1.23456)) == 1.235
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from tests.common import DynSysPath, dyn_sys_path
+from wwwpy.common import reloader
+from wwwpy.common.rpc2.dispatch_cache import DispatchCache
+
+
+def test_resolve(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('mod1.py', 'def add(a: int, b: int) -> int: return a + b')
+    target = DispatchCache()
+
+    func, typed_function = target.resolve('mod1', 'add')
+
+    assert func(1, 2) == 3
+    assert typed_function.args_types == [int, int]
+    assert typed_function.return_type is int
+
+
+def test_resolve_twice__should_return_the_cached_entry(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('mod1.py', 'def add(a: int, b: int) -> int: return a + b')
+    target = DispatchCache()
+
+    assert target.resolve('mod1', 'add') is target.resolve('mod1', 'add')
+    assert len(target) == 1
+
+
+def test_unload__should_invalidate(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('mod1.py', 'def add(a: int, b: int) -> int: return a + b')
+    target = DispatchCache()
+    first = target.resolve('mod1', 'add')
+
+    # WHEN
+    dyn_sys_path.write_module2('mod1.py', 'def add(a: int, b: int) -> int: return a * b  # changed')
+    reloader.unload_path(str(dyn_sys_path.path))
+
+    # THEN
+    second = target.resolve('mod1', 'add')
+    assert second is not first
+    assert second.func(2, 3) == 6
+
+
+def test_resolve_while_unloading__should_not_be_cached_as_fresh(dyn_sys_path: DynSysPath, monkeypatch):
+    """The hot reload unloads on its thread while the requests are served; a function resolved before
+    its module is deleted must be dropped when the unload completes"""
+    dyn_sys_path.write_module2('mod1.py', 'def add(a: int, b: int) -> int: return a + b')
+    target = DispatchCache()
+    target.resolve('mod1', 'add')
+    dyn_sys_path.write_module2('mod1.py', 'def add(a: int, b: int) -> int: return a * b  # changed')
+    monkeypatch.setattr(reloader.logger, 'debug', lambda msg: target.resolve('mod1', 'add'))
+
+    # WHEN
+    reloader.unload_path(str(dyn_sys_path.path))
+
+    # THEN
+    assert target.resolve('mod1', 'add').func(2, 3) == 6
@@ -1,6 +1,12 @@
+import array
+from typing import Optional
+
 import pytest
 
-from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder
+from dataclasses import dataclass
+
+from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder, MsgpackEncoderDecoder, encoder_decoder_for, \
+    PartsEncoderDecoder, is_parts, unpack_parts, parts_content_type, payload_content_type
 
 
 def test_encoder_buffer():
@@ -20,3 +26,113 @@ def test_encoder_buffer():
 
     with pytest.raises(Exception):
         dec.decode(str)
+
+
+@dataclass
+class Item:
+    name: str
+    price: float
+    data: bytes
+
+
+def test_msgpack_encoder_buffer():
+    target = MsgpackEncoderDecoder()
+
+    enc = target.encoder()
+
+    enc.encode('ciao', str)
+    enc.encode(123, int)
+    enc.encode([Item('a', 1.5, b'\x00\xff')], list[Item])
+
+    assert isinstance(enc.buffer, bytes)
+
+    dec = target.decoder(enc.buffer)
+
+    assert 'ciao' == dec.decode(str)
+    assert 123 == dec.decode(int)
+    assert [Item('a', 1.5, b'\x00\xff')] == dec.decode(list[Item])
+
+    with pytest.raises(Exception):
+        dec.decode(str)
+
+
+def test_msgpack__bytes_should_not_be_base64_encoded():
+    enc = MsgpackEncoderDecoder().encoder()
+    enc.encode(bytes(1000), bytes)
+
+    assert len(enc.buffer) == 1000 + 3
+
+
+def test_encoder_decoder_for():
+    assert isinstance(encoder_decoder_for('application/msgpack'), MsgpackEncoderDecoder)
+    assert isinstance(encoder_decoder_for('application/msgpack; wwwpy-batch=1'), MsgpackEncoderDecoder)
+    assert isinstance(encoder_decoder_for('text/plain'), JsonEncoderDecoder)
+    assert isinstance(encoder_decoder_for(None), JsonEncoderDecoder)
+
+
+@pytest.mark.parametrize('inner', [JsonEncoderDecoder(), MsgpackEncoderDecoder()])
+def test_parts__binary_objects_should_be_out_of_band(inner):
+    target = PartsEncoderDecoder(inner)
+    enc = target.encoder()
+    enc.encode('name', str)
+    enc.encode(b'\x00' * 1000, bytes)
+    enc.encode(bytearray(b'ab'), memoryview)
+    enc.encode(None, bytes | None)
+
+    buffer = enc.buffer
+    assert is_parts(buffer)
+    header, *parts = unpack_parts(buffer)
+    assert [bytes(p) for p in parts] == [b'\x00' * 1000, b'ab']
+    assert len(header) < 100
+
+    dec = target.decoder(buffer)
+    assert dec.decode(str) == 'name'
+    assert dec.decode(bytes) == b'\x00' * 1000
+    view = dec.decode(memoryview)
+    assert isinstance(view, memoryview) and view.obj is buffer
+    assert bytes(view) == b'ab'
+    assert dec.decode(bytes | None) is None
+
+
+def test_parts__nested_binary_should_be_left_to_the_inner():
+    target = PartsEncoderDecoder(JsonEncoderDecoder())
+    enc = target.encoder()
+    enc.encode([b'a'], list[bytes])
+
+    assert len(unpack_parts(enc.buffer)) == 1
+    assert target.decoder(enc.buffer).decode(list[bytes]) == [b'a']
+
+
+def test_parts__truncated_should_fail():
+    enc = PartsEncoderDecoder(JsonEncoderDecoder()).encoder()
+    enc.encode(b'abc', bytes)
+
+    with pytest.raises(ValueError):
+        unpack_parts(enc.buffer[:-1])
+
+
+def test_parts__content_type():
+    content_type = parts_content_type('application/msgpack')
+    target = encoder_decoder_for(content_type)
+
+    assert isinstance(target, PartsEncoderDecoder)
+    assert isinstance(target.inner, MsgpackEncoderDecoder)
+    assert target.content_type == content_type
+    assert payload_content_type('text', 'text/plain') == 'text/plain'
+    assert payload_content_type(PartsEncoderDecoder(JsonEncoderDecoder()).encoder().buffer,
+                                'text/plain') == parts_content_type('text/plain')
+
+
+@pytest.mark.parametrize('inner', [JsonEncoderDecoder(), MsgpackEncoderDecoder()])
+def test_parts__array_should_be_out_of_band(inner):
+    target = PartsEncoderDecoder(inner)
+    enc = target.encoder()
+    enc.encode(array.array('d', range(100)), array.array)
+    enc.encode(None, Optional[array.array])
+
+    header, part = unpack_parts(enc.buffer)
+    assert len(part) == 800
+
+    dec = target.decoder(enc.buffer)
+    assert dec.decode(array.array) == array.array('d', range(100))
+    assert dec.decode(Optional[array.array]) is None
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import pytest
+
+from wwwpy.common.rpc2.idempotent import encode_query, decode_query, etag, etag_matches, cache_control, \
+    fits_query, max_query_length
+
+
+def test_query__text():
+    payload = '["server.rpc", "find", "a b&c=d/é"]'
+
+    query = encode_query(payload, 'text/plain')
+
+    assert '&' not in query.partition('=')[2]
+    assert decode_query(query) == (payload, 'text/plain')
+
+
+def test_query__binary():
+    payload = bytes(range(256))
+
+    query = encode_query(payload, 'application/msgpack')
+
+    assert decode_query(query) == (payload, 'application/msgpack')
+
+
+def test_query__should_be_canonical():
+    assert encode_query('abc', 'text/plain') == encode_query('abc', 'text/plain')
+
+
+def test_query__without_request_should_fail():
+    with pytest.raises(ValueError):
+        decode_query('x=1')
+
+
+def test_fits_query__should_measure_the_encoded_query():
+    fitting = 'a' * (max_query_length - 2)
+
+    assert fits_query(fitting)
+    assert len(encode_query(fitting, 'text/plain').partition('&')[0]) == max_query_length
+    assert not fits_query(fitting + 'a')
+    assert not fits_query('"' * (max_query_length // 2))  # percent-encoded, 3 characters each
+    assert not fits_query(bytes(max_query_length))
+
+
+def test_etag__same_content_same_tag():
+    assert etag('abc') == etag(b'abc')
+    assert etag('abc') != etag('abd')
+    assert etag('abc').startswith('"')
+
+
+@pytest.mark.parametrize('if_none_match, expected', [
+    (None, False),
+    ('', False),
+    ('"a"', True),
+    ('"b", "a"', True),
+    ('W/"a"', True),
+    ('*', True),
+    ('"b"', False),
+])
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches(if_none_match, '"a"') is expected
+
+
+def test_cache_control():
+    assert cache_control(0) == 'no-cache'
+    assert cache_control(60) == 'max-age=60'
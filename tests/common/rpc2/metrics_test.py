@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from wwwpy.common.rpc2.metrics import RpcMetrics, Histogram, no_sample
+
+
+def test_histogram__counts_per_bucket():
+    target = Histogram((1., 2.))
+
+    for value in [0.5, 1., 1.5, 3.]:
+        target.observe(value)
+
+    assert target.counts == [2, 1, 1]
+    assert (target.count, target.sum) == (4, 6.)
+
+
+def test_sample__should_record_per_function():
+    target = RpcMetrics()
+
+    for error in [False, True]:
+        sample = target.sample(10)
+        sample.function('server.rpc', 'add')
+        sample.mark('decode')
+        sample.mark('execute')
+        sample.mark('encode')
+        sample.done(4, error)
+
+    fm = target.get('server.rpc', 'add')
+    assert (fm.calls, fm.errors, fm.request_bytes, fm.response_bytes) == (2, 1, 20, 8)
+    assert fm.duration.count == 2
+    assert [h.count for h in fm.phases.values()] == [0, 2, 2, 2]
+
+
+def test_sample_without_function__should_not_be_recorded():
+    target = RpcMetrics()
+
+    target.sample(10).done(4, True)
+
+    assert target.to_prometheus().count('wwwpy_rpc_calls_total{') == 0
+
+
+def test_no_sample__should_record_nothing():
+    no_sample.function('server.rpc', 'add')
+    no_sample.mark('decode')
+    no_sample.done(4, False)
+
+
+def test_to_prometheus():
+    target = RpcMetrics((1.,))
+    sample = target.sample(10)
+    sample.function('server.rpc', 'a"b')
+    sample.mark('execute')
+    sample.done(4, False)
+
+    text = target.to_prometheus()
+
+    labels = 'module="server.rpc",function="a\\"b"'
+    assert '# TYPE wwwpy_rpc_calls_total counter' in text
+    assert f'wwwpy_rpc_calls_total{{{labels}}} 1\n' in text
+    assert f'wwwpy_rpc_errors_total{{{labels}}} 0\n' in text
+    assert f'wwwpy_rpc_request_bytes_total{{{labels}}} 10\n' in text
+    assert f'wwwpy_rpc_response_bytes_total{{{labels}}} 4\n' in text
+    assert '# TYPE wwwpy_rpc_duration_seconds histogram' in text
+    assert f'wwwpy_rpc_duration_seconds_bucket{{{labels},le="1.0"}} 1\n' in text
+    assert f'wwwpy_rpc_duration_seconds_bucket{{{labels},le="+Inf"}} 1\n' in text
+    assert f'wwwpy_rpc_duration_seconds_count{{{labels}}} 1\n' in text
+    assert f'wwwpy_rpc_phase_seconds_count{{{labels},phase="execute"}} 1\n' in text
+    assert 'phase="decode"' not in text
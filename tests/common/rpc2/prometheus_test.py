@@ -0,0 +1,26 @@
+from wwwpy.common.rpc2 import prometheus
+
+
+def test_escape():
+    assert prometheus.escape('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+
+def test_function_labels():
+    assert prometheus.function_labels(('server.rpc', 'add'), 'decode') == \
+           'module="server.rpc",function="add",phase="decode"'
+
+
+def test_gauge__without_labels():
+    lines = []
+
+    prometheus.gauge(lines, 'clients', 'Number of clients', [('', 3)])
+
+    assert lines == ['# HELP clients Number of clients', '# TYPE clients gauge', 'clients 3']
+
+
+def test_counter__with_labels():
+    lines = []
+
+    prometheus.counter(lines, 'calls_total', 'Number of calls', [('module="m"', 2)])
+
+    assert lines[1:] == ['# TYPE calls_total counter', 'calls_total{module="m"} 2']
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from tests.common import DynSysPath, dyn_sys_path
+from wwwpy.common import reloader
+from wwwpy.common.rpc2 import result_cache
+from wwwpy.common.rpc2.result_cache import ResultCache, CacheStats
+
+
+class ClockFake:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _key(func_name: str = 'f', request: str = 'r', module_name: str = 'mod') -> tuple:
+    return module_name, func_name, 'text/plain', request
+
+
+def test_get_put():
+    target = ResultCache()
+
+    assert target.get(_key()) is None
+    target.put(_key(), 'response')
+
+    assert target.get(_key()) == 'response'
+    assert target.stats() == CacheStats(hits=1, misses=1, evictions=0, entries=1, bytes=len('r') + len('response'))
+
+
+def test_ttl():
+    clock = ClockFake()
+    target = ResultCache(clock=clock)
+    target.put(_key(), 'response', ttl=10)
+
+    clock.now += 9
+    assert target.get(_key()) == 'response'
+
+    clock.now += 1
+    assert target.get(_key()) is None
+    assert len(target) == 0
+
+
+def test_max_entries__should_evict_the_least_recently_used():
+    target = ResultCache(max_entries=2)
+    target.put(_key(request='1'), 'a')
+    target.put(_key(request='2'), 'b')
+    target.get(_key(request='1'))
+
+    target.put(_key(request='3'), 'c')
+
+    assert target.get(_key(request='2')) is None
+    assert target.get(_key(request='1')) == 'a'
+    assert target.get(_key(request='3')) == 'c'
+    assert target.stats().evictions == 1
+
+
+def test_max_bytes():
+    target = ResultCache(max_bytes=9)
+    target.put(_key(request='1'), 'aaaa')
+    target.put(_key(request='2'), 'bbbb')
+
+    assert target.get(_key(request='1')) is None
+    assert target.stats().bytes == 5
+
+
+def test_too_large__should_not_be_cached():
+    target = ResultCache(max_bytes=10)
+
+    target.put(_key(), 'a' * 10)
+
+    assert len(target) == 0
+
+
+def test_invalidate():
+    target = ResultCache()
+    target.put(_key('f'), 'a')
+    target.put(_key('g'), 'b')
+    target.put(_key('f', module_name='other'), 'c')
+
+    assert target.invalidate('mod', 'f') == 1
+    assert target.get(_key('g')) == 'b'
+    assert target.invalidate('mod') == 1
+    assert target.get(_key('f', module_name='other')) == 'c'
+
+
+def test_invalidate_prefix():
+    target = ResultCache()
+    target.put(_key('catalog_page'), 'a')
+    target.put(_key('catalog_count'), 'b')
+    target.put(_key('config'), 'c')
+
+    assert target.invalidate_prefix('mod.catalog_') == 2
+    assert len(target) == 1
+
+
+def test_invalidate_function__should_use_all_the_caches(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('mod1.py', 'def f() -> int: return 1')
+    import mod1  # noqa
+    caches = [ResultCache(), ResultCache()]
+    for c in caches:
+        c.put(_key('f', module_name='mod1'), 'a')
+
+    assert result_cache.invalidate(mod1.f) == 2
+    assert [len(c) for c in caches] == [0, 0]
+
+
+def test_hot_reload__should_flush(dyn_sys_path: DynSysPath):
+    dyn_sys_path.write_module2('mod1.py', 'def f() -> int: return 1')
+    import mod1  # noqa
+    target = ResultCache()
+    target.put(_key(), 'a')
+
+    reloader.unload_path(str(dyn_sys_path.path))
+
+    assert target.get(_key()) is None
+    assert target.stats().bytes == 0
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+from contextlib import aclosing
 
 import pytest
 
@@ -8,11 +9,12 @@ from tests.common import DynSysPath
 from tests.common import dyn_sys_path
 from tests.common.rpc2.transport_fake import PairedTransport
 from wwwpy.common.detect import is_pyodide
+from wwwpy.common.rpc2 import deadline
 from wwwpy.common.rpc2.default_skeleton import DefaultSkeleton
 from wwwpy.common.rpc2.default_stub import DefaultStub
 from wwwpy.common.rpc2.encoder_decoder import EncoderDecoder, JsonEncoderDecoder
 from wwwpy.common.rpc2.stub import generate_stub
-from wwwpy.exceptions import RemoteException
+from wwwpy.exceptions import RemoteException, RemoteTimeoutError
 
 """
 This is the integration test of the parts listed below.
@@ -35,6 +37,11 @@ class Car:
 # language=Python
 _called = '''
 from shared import Car
+from wwwpy.common.rpc2.options import idempotent
+
+@idempotent(max_age=60)
+async def find_async(name: str) -> Car:
+    return Car(name, 2000)
 
 def make(name:str, year: int) -> Car:
     return Car(name, year)
@@ -50,6 +57,56 @@ class Dog:
         return ('woof ' * times).strip()
 '''
 
+# language=Python
+_streaming = '''
+import asyncio
+from typing import AsyncIterator
+from shared import Car
+
+closed = []
+
+async def count(n: int) -> AsyncIterator[int]:
+    for i in range(n):
+        await asyncio.sleep(0)
+        yield i
+
+async def cars(n: int) -> AsyncIterator[Car]:
+    for i in range(n):
+        yield Car('car', i)
+
+async def fail_after(n: int) -> AsyncIterator[int]:
+    for i in range(n):
+        yield i
+    raise Exception('message 123')
+
+async def endless() -> AsyncIterator[int]:
+    try:
+        i = 0
+        while True:
+            yield i
+            i += 1
+    finally:
+        closed.append(True)
+'''
+
+
+# language=Python
+_slow = '''
+import asyncio
+
+cancelled = []
+
+async def slow() -> None:
+    try:
+        await asyncio.sleep(10)
+    except asyncio.CancelledError:
+        cancelled.append(True)
+        raise
+
+async def fast() -> int:
+    return 42
+'''
+
 
 class TestStubPart:
     def test_import__should_succeed(self, fixture: Fixture):
@@ -133,6 +190,104 @@ async def test_function_exception_async(fixture: Fixture):
     assert 'message 123' in str(e)
 
 
+async def test_idempotent_function__should_be_called_with_call_idempotent(fixture: Fixture):
+    fixture.setup_async()
+
+    import stub  # noqa
+
+    result = await stub.find_async('Toyota')
+
+    import shared  # noqa
+    assert result == shared.Car('Toyota', 2000)
+    assert len(fixture.paired_transport.client.idempotent_buffer) == 1
+
+
+async def test_idempotent_function_with_a_long_request__should_not_use_call_idempotent(fixture: Fixture):
+    fixture.setup_async()
+
+    import stub  # noqa
+
+    name = 'Toyota' * 1000
+    result = await stub.find_async(name)
+
+    import shared  # noqa
+    assert result == shared.Car(name, 2000)
+    assert fixture.paired_transport.client.idempotent_buffer == []
+
+
+async def test_deadline__should_raise_the_timeout_error_and_cancel_the_function(fixture: Fixture):
+    fixture._server_code = _slow
+    fixture.setup_stream()
+
+    import stub  # noqa
+    import server  # noqa
+
+    with pytest.raises(RemoteTimeoutError):
+        with deadline.timeout(0.05):
+            await stub.slow()
+
+    assert server.cancelled == [True]
+
+
+async def test_deadline__fast_call_should_complete(fixture: Fixture):
+    fixture._server_code = _slow
+    fixture.setup_stream()
+
+    import stub  # noqa
+
+    with deadline.timeout(5):
+        assert await stub.fast() == 42
+
+
+async def test_stream(fixture: Fixture):
+    fixture._server_code = _streaming
+    fixture.setup_stream()
+
+    import stub  # noqa
+
+    assert [i async for i in stub.count(3)] == [0, 1, 2]
+
+
+async def test_stream_dataclass(fixture: Fixture):
+    fixture._server_code = _streaming
+    fixture.setup_stream()
+
+    import stub  # noqa
+    import shared  # noqa
+
+    assert [c async for c in stub.cars(2)] == [shared.Car('car', 0), shared.Car('car', 1)]
+
+
+async def test_stream_exception__should_raise_after_the_items(fixture: Fixture):
+    fixture._server_code = _streaming
+    fixture.setup_stream()
+
+    import stub  # noqa
+
+    items = []
+    with pytest.raises(RemoteException) as e:
+        async for i in stub.fail_after(2):
+            items.append(i)
+
+    assert items == [0, 1]
+    assert 'message 123' in str(e)
+
+
+async def test_stream_closed_by_the_caller__should_close_the_server_iterator(fixture: Fixture):
+    fixture._server_code = _streaming
+    fixture.setup_stream()
+
+    import stub  # noqa
+    import server  # noqa
+
+    async with aclosing(stub.endless()) as items:
+        async for i in items:
+            if i == 3:
+                break
+
+    assert server.closed == [True]
+
+
 def _make_import(obj: any) -> str:
     return f'from {obj.__module__} import {obj.__name__}'
 
@@ -198,6 +353,16 @@ class Fixture:
 
         fixture.paired_transport.client.send_async_callback = async_callback
 
+    def setup_stream(self):
+        fixture = self
+        fixture.setup_skeleton()
+        fixture.setup_stub()
+
+        async def async_callback():
+            await fixture.skeleton.invoke_async()
+
+        fixture.paired_transport.client.send_async_callback = async_callback
+
 
 @pytest.fixture
 def fixture(dyn_sys_path: DynSysPath):
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from wwwpy.common.rpc2.single_flight import SingleFlight
+
+
+class ExecuteFake:
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+
+async def test_concurrent_same_key__should_execute_once():
+    target = SingleFlight()
+    execute = ExecuteFake()
+
+    runs = [asyncio.create_task(target.run('k', execute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    execute.release.set()
+
+    assert await asyncio.gather(*runs) == [1, 1, 1]
+    assert execute.calls == 1
+    assert target.stats().executions == 1
+    assert target.stats().coalesced == 2
+    assert len(target) == 0
+
+
+async def test_different_keys__should_execute_each():
+    target = SingleFlight()
+    execute = ExecuteFake()
+    execute.release.set()
+
+    await asyncio.gather(target.run('k1', execute), target.run('k2', execute))
+
+    assert execute.calls == 2
+
+
+async def test_after_completion__should_execute_again():
+    target = SingleFlight()
+    execute = ExecuteFake()
+    execute.release.set()
+
+    await target.run('k', execute)
+    await target.run('k', execute)
+
+    assert execute.calls == 2
+
+
+async def test_exception__should_be_raised_to_all_the_callers():
+    target = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise ValueError('message 123')
+
+    results = await asyncio.gather(target.run('k', fail), target.run('k', fail), return_exceptions=True)
+
+    assert [str(r) for r in results] == ['message 123', 'message 123']
+    assert len(target) == 0
+
+
+async def test_first_caller_cancelled__should_not_affect_the_others():
+    target = SingleFlight()
+    execute = ExecuteFake()
+    first = asyncio.create_task(target.run('k', execute))
+    second = asyncio.create_task(target.run('k', execute))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    execute.release.set()
+
+    assert await second == 1
+
+
+async def test_all_callers_cancelled__should_cancel_the_execution():
+    target = SingleFlight()
+    execute = ExecuteFake()
+    runs = [asyncio.create_task(target.run('k', execute)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    for run in runs:
+        run.cancel()
+    await asyncio.gather(*runs, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert len(target) == 0
+    execute.release.set()
+    assert await target.run('k', execute) == 2
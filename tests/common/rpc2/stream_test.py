@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from typing import AsyncIterator, AsyncGenerator, Iterator
+
+from wwwpy.common.rpc2.stream import encode_chunk, ChunkDecoder, is_stream, stream_content_type, is_stream_type
+from wwwpy.common.rpc2.typed_function import get_typed_function
+
+
+def test_chunks__split_at_any_position():
+    messages = ['first', 'àèìòù', '', 'line1\nline2']
+    data = b''.join(encode_chunk(m) for m in messages)
+
+    for split in range(len(data) + 1):
+        target = ChunkDecoder(text=True)
+        actual = target.feed(data[:split]) + target.feed(data[split:])
+        assert actual == messages
+        assert target.pending == 0
+
+
+def test_chunks__bytes():
+    target = ChunkDecoder(text=False)
+
+    actual = target.feed(encode_chunk(b'\x00\xff') + encode_chunk(b'\x01')[:3])
+
+    assert actual == [b'\x00\xff']
+    assert target.pending == 3
+
+
+def test_content_type():
+    assert is_stream(stream_content_type('text/plain'))
+    assert not is_stream('text/plain')
+    assert not is_stream(None)
+
+
+def test_is_stream_type():
+    assert is_stream_type(AsyncIterator[int])
+    assert is_stream_type(AsyncGenerator[int, None])
+    assert not is_stream_type(Iterator[int])
+    assert not is_stream_type(int)
+
+
+def test_typed_function__async_generator():
+    async def tail(n: int) -> AsyncIterator[str]:
+        yield 'a'
+
+    target = get_typed_function(tail)
+
+    assert target.is_stream
+    assert target.item_type is str
+    assert not target.is_coroutine
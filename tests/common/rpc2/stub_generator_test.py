@@ -6,6 +6,7 @@ import pytest
 
 from tests.common import DynSysPath, dyn_sys_path
 from wwwpy.common.rpc2.stub import generate_stub, Stub
+from wwwpy.common.rpc2.typed_function import get_typed_function, _types_attribute
 
 logger = logging.getLogger(__name__)
 
@@ -259,6 +260,48 @@ def test_function_type_hints(fixture):
     assert 'def add(a: int, b: int=123) -> int:' in gen
 
 
+def test_stream_function__should_be_generated_as_a_plain_function(fixture):
+    # language=python
+    gen = fixture.generate('''
+from typing import AsyncIterator
+async def tail(n: int) -> AsyncIterator[str]:
+    yield 'a'
+''')
+
+    assert 'def tail(n: int) -> AsyncIterator[str]:' in gen
+    assert 'async def tail' not in gen
+    assert 'return _stub.namespace.tail(n)' in gen
+
+
+def test_decorators_should_not_be_generated(fixture):
+    # WHEN
+    gen = fixture.generate('from some_module import inline\n@inline\ndef add(a: int) -> int: pass', 'module1')
+
+    # THEN
+    assert '@inline' not in gen
+    import module1  # noqa
+
+
+def test_idempotent_decorator__should_be_generated_without_arguments(fixture):
+    # language=python
+    source = '''
+from wwwpy.common.rpc2 import options
+from some_module import inline
+@inline
+@options.idempotent(max_age=some_server_value)
+async def find(a: int) -> int: pass
+'''
+    # WHEN
+    gen = fixture.generate(source, 'module1')
+
+    # THEN
+    assert '@_rpc_options.idempotent()\nasync def find' in gen
+    assert '@inline' not in gen
+    import module1  # noqa
+    from wwwpy.common.rpc2.options import get_options
+    assert get_options(module1.find).idempotent
+
+
 _person_module = 'module_person.py', '''
 from dataclasses import dataclass
 @dataclass
@@ -348,6 +391,61 @@ class TestTypeHintsReturn:
         _verify_type_hints(module1.fun1, 'return', None)
 
 
+class TestResolvedTypes:
+    def test_types__should_be_set_without_reflection(self, fixture):
+        # GIVEN
+        fixture.dyn_sys_path.write_module2(*_person_module)
+        fixture.generate('from typing import Optional\nfrom module_person import Person\n'
+                         'async def fun1(p: Person, n: Optional[int]) -> list[Person]: ...', module='module1')
+
+        # WHEN
+        import module1  # noqa
+
+        # THEN
+        from module_person import Person  # noqa
+        assert getattr(module1.fun1, _types_attribute) == ((Person, typing.Optional[int]), list[Person])
+        target = get_typed_function(module1.fun1)
+        assert target.args_types == [Person, typing.Optional[int]]
+        assert target.return_type == list[Person]
+        assert target.is_coroutine
+
+    def test_no_return_type__should_be_none_type(self, fixture):
+        fixture.generate('def fun1(a: int): ...', module='module1')
+
+        import module1  # noqa
+
+        assert get_typed_function(module1.fun1).return_type is type(None)
+
+    def test_forward_reference__should_be_resolved_and_imported(self, fixture):
+        fixture.dyn_sys_path.write_module2(*_person_module)
+        gen = fixture.generate('from module_person import Person\ndef fun1(p: "Person") -> int: ...', module='module1')
+
+        import module1  # noqa
+
+        from module_person import Person  # noqa
+        assert '_set_types(fun1, (Person,), int)' in gen
+        assert get_typed_function(module1.fun1).args_types == [Person]
+
+    def test_nested_forward_reference__should_be_left_to_reflection(self, fixture):
+        fixture.dyn_sys_path.write_module2(*_person_module)
+        gen = fixture.generate('from module_person import Person\ndef fun1(p: list["Person"]) -> int: ...',
+                               module='module1')
+
+        import module1  # noqa
+
+        from module_person import Person  # noqa
+        assert '_set_types' not in gen
+        assert get_typed_function(module1.fun1).args_types == [list[Person]]
+
+    def test_none_default__should_be_left_to_reflection(self, fixture):
+        gen = fixture.generate('def fun1(a: int = None) -> int: ...', module='module1')
+
+        import module1  # noqa
+
+        assert '_set_types' not in gen
+        assert get_typed_function(module1.fun1).args_types == [typing.get_type_hints(module1.fun1)['a']]
+
+
 class TestDispatcherArgs:
     def test_arg_simple_string(self, fixture):
         # GIVEN
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
+from typing import AsyncIterator
 
 import pytest
 
@@ -12,6 +13,8 @@ class TransportFake(Transport):
     def __init__(self):
         self.recv_buffer = []
         self.send_buffer = []
+        self.idempotent_buffer = []
+        """The payloads sent with call_idempotent_sync/async"""
         self.send_sync_callback = lambda: None
 
         async def empty(): pass
@@ -37,6 +40,30 @@ class TransportFake(Transport):
     async def recv_async(self) -> str | bytes:
         return self._consume()
 
+    def call_idempotent_sync(self, payload: str | bytes) -> str | bytes:
+        self.idempotent_buffer.append(payload)
+        return super().call_idempotent_sync(payload)
+
+    async def call_idempotent_async(self, payload: str | bytes) -> str | bytes:
+        self.idempotent_buffer.append(payload)
+        return await super().call_idempotent_async(payload)
+
+    async def send_stream_async(self, messages: AsyncIterator[str | bytes]):
+        self.send_buffer.append(messages)
+
+    async def recv_stream_async(self, payload: str | bytes) -> AsyncIterator[str | bytes]:
+        self.send_buffer.append(payload)
+        await self.send_async_callback()
+        messages = self._consume()
+        if isinstance(messages, (str, bytes)):
+            yield messages
+            return
+        try:
+            async for message in messages:
+                yield message
+        finally:
+            await messages.aclose()
+
 
 @dataclass
 class PairedTransport:
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from tests.common.rpc2.transport_fake import TransportFake
+from wwwpy.common.rpc2 import deadline
+from wwwpy.common.rpc2.websocket_transport import WebsocketCalls, WebsocketTransport, encode_frame, decode_frame, \
+    request_prefix, response_prefix, stream_prefix, cancel_prefix, decode_request_frame
+from wwwpy.exceptions import RemoteError
+
+
+class SocketFake:
+    def __init__(self):
+        self.sent: list[str] = []
+        self.calls = WebsocketCalls(self.sent.append)
+        self.calls.on_open()
+
+    def requests(self) -> list[tuple[int, str]]:
+        return [decode_frame(request_prefix, m) for m in self.sent]
+
+    def respond(self, call_id: int, payload: str):
+        assert self.calls.on_message(encode_frame(response_prefix, call_id, payload))
+
+    def stream(self, call_id: int, payload: str):
+        assert self.calls.on_message(encode_frame(stream_prefix, call_id, payload))
+
+
+@pytest.fixture
+def socket():
+    return SocketFake()
+
+
+def test_frame_round_trip():
+    frame = encode_frame(request_prefix, 42, 'line1\nline2')
+
+    assert decode_frame(request_prefix, frame) == (42, 'line1\nline2')
+    assert decode_frame(response_prefix, frame) is None
+    assert decode_frame(request_prefix, '["module", "func", []]') is None
+    assert decode_frame(request_prefix, None) is None
+
+
+def test_frame_with_timeout():
+    frame = encode_frame(request_prefix, 42, 'payload', 1.5)
+
+    assert decode_request_frame(frame) == (42, 'payload', 1.5)
+    assert decode_frame(request_prefix, frame) == (42, 'payload')
+    assert decode_request_frame(encode_frame(request_prefix, 42, 'payload')) == (42, 'payload', None)
+
+
+def test_not_a_response__should_not_be_consumed(socket: SocketFake):
+    assert not socket.calls.on_message('["module", "func", []]')
+
+
+async def test_responses_out_of_order(socket: SocketFake):
+    first = socket.calls.call('a')
+    second = socket.calls.call('b')
+    (id_a, payload_a), (id_b, payload_b) = socket.requests()
+    assert (payload_a, payload_b) == ('a', 'b')
+
+    socket.respond(id_b, 'B')
+    socket.respond(id_a, 'A')
+
+    assert await first == 'A'
+    assert await second == 'B'
+
+
+async def test_close__should_fail_the_pending_calls(socket: SocketFake):
+    future = socket.calls.call('a')
+
+    socket.calls.on_close()
+
+    with pytest.raises(RemoteError):
+        await future
+    assert not socket.calls.is_open
+
+
+async def test_transport__concurrent_calls(socket: SocketFake):
+    target = WebsocketTransport(socket.calls, TransportFake())
+
+    async def call(payload: str):
+        await target.send_async(payload)
+        return await target.recv_async()
+
+    async def server():
+        await asyncio.sleep(0)
+        for call_id, payload in reversed(socket.requests()):
+            socket.respond(call_id, payload.upper())
+
+    results = await asyncio.gather(call('a'), call('b'), server())
+
+    assert results[:2] == ['A', 'B']
+
+
+async def test_transport__closed_socket_should_use_the_fallback(socket: SocketFake):
+    socket.calls.on_close()
+    fallback = TransportFake()
+    fallback.recv_buffer.append('from fallback')
+    target = WebsocketTransport(socket.calls, fallback)
+
+    await target.send_async('a')
+
+    assert await target.recv_async() == 'from fallback'
+    assert fallback.send_buffer == ['a']
+    assert socket.sent == []
+
+
+async def test_transport__no_socket_should_use_the_fallback():
+    fallback = TransportFake()
+    fallback.recv_buffer.append('from fallback')
+    target = WebsocketTransport(None, fallback)
+
+    await target.send_async('a')
+
+    assert await target.recv_async() == 'from fallback'
+
+
+async def test_call_stream(socket: SocketFake):
+    target = socket.calls.call_stream('a')
+    first = asyncio.ensure_future(target.__anext__())
+    await asyncio.sleep(0)
+    [(call_id, payload)] = socket.requests()
+    assert payload == 'a'
+
+    socket.stream(call_id, 'item1')
+    socket.stream(call_id, 'item2')
+    socket.respond(call_id, 'end')
+
+    assert [await first] + [m async for m in target] == ['item1', 'item2', 'end']
+    assert len(socket.sent) == 1  # no cancel frame
+
+
+async def test_call_stream_closed__should_send_the_cancel_frame(socket: SocketFake):
+    target = socket.calls.call_stream('a')
+    first = asyncio.ensure_future(target.__anext__())
+    await asyncio.sleep(0)
+    [(call_id, _)] = socket.requests()
+    socket.stream(call_id, 'item1')
+    assert await first == 'item1'
+
+    await target.aclose()
+
+    assert decode_frame(cancel_prefix, socket.sent[-1]) == (call_id, '')
+    assert not socket.calls.on_message(encode_frame('unknown:', call_id, 'late'))
+
+
+async def test_close__should_fail_the_streams(socket: SocketFake):
+    target = socket.calls.call_stream('a')
+    first = asyncio.ensure_future(target.__anext__())
+    await asyncio.sleep(0)
+
+    socket.calls.on_close()
+
+    with pytest.raises(RemoteError):
+        await first
+
+
+async def test_call_inside_deadline__should_send_the_timeout(socket: SocketFake):
+    with deadline.timeout(10):
+        socket.calls.call('a')
+
+    [(_, _, timeout)] = [decode_request_frame(m) for m in socket.sent]
+    assert 9 < timeout <= 10
+
+
+async def test_call_cancelled__should_send_the_cancel_frame(socket: SocketFake):
+    future = socket.calls.call('a')
+    [(call_id, _)] = socket.requests()
+
+    future.cancel()
+    await asyncio.sleep(0)  # the done callbacks run on the next iteration
+
+    assert socket.sent[-1] == encode_frame(cancel_prefix, call_id, '')
+    socket.respond(call_id, 'late')  # it is ignored
+
+
+async def test_calls_from_worker_threads__should_be_resolved_on_their_loops(socket: SocketFake):
+    def worker(payload: str) -> str:
+        async def call():
+            return await socket.calls.call(payload)
+
+        return asyncio.run(call())
+
+    loop = asyncio.get_running_loop()
+    results = asyncio.gather(*[loop.run_in_executor(None, worker, payload) for payload in 'abc'])
+    while len(socket.sent) < 3:
+        await asyncio.sleep(0.01)
+    requests = socket.requests()
+    for call_id, payload in requests:
+        socket.respond(call_id, payload.upper())
+
+    assert await asyncio.wait_for(results, 5) == ['A', 'B', 'C']
+    assert len({call_id for call_id, _ in requests}) == 3
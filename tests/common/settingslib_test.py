@@ -48,6 +48,33 @@ def test_log_level(fix: Fix):
     assert {'mod1.mod2': 'DEBUG', 'mod3': 'INFO'} == fix.target.log_level
 
 
+def test_rpc_max_workers_default(fix: Fix):
+    assert fix.target.rpc_max_workers is None
+
+
+def test_rpc_max_workers(fix: Fix):
+    fix.write_load("""[rpc]\nmax_workers=8""")
+    assert fix.target.rpc_max_workers == 8
+
+
+def test_rpc_msgpack_remote_calls(fix: Fix):
+    assert fix.target.rpc_msgpack_remote_calls is False
+    fix.write_load("""[rpc]\nmsgpack_remote_calls=true""")
+    assert fix.target.rpc_msgpack_remote_calls is True
+
+
+def test_rpc_metrics(fix: Fix):
+    assert fix.target.rpc_metrics is False
+    fix.write_load("""[rpc]\nmetrics=true""")
+    assert fix.target.rpc_metrics is True
+
+
+def test_rpc_admission(fix: Fix):
+    assert (fix.target.rpc_max_concurrent_calls, fix.target.rpc_max_queued_calls) == (None, 0)
+    fix.write_load("""[rpc]\nmax_concurrent_calls=16\nmax_queued_calls=64""")
+    assert (fix.target.rpc_max_concurrent_calls, fix.target.rpc_max_queued_calls) == (16, 64)
+
+
 def _new_target(tmp_path, content: str = None):
     target = Settings()
     ini = tmp_path / 'foo.ini'
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+
+from wwwpy.http import HttpRoute, HttpResponse, HttpRequest
+from wwwpy.server.asgi import AsgiApplication
+from wwwpy.unasync import unasync
+from wwwpy.websocket import WebsocketRoute
+
+_scope = {'type': 'http', 'path': '/route', 'method': 'POST', 'headers': [(b'content-type', b'text/plain')]}
+
+
+class AsgiFake:
+    def __init__(self, *routes: HttpRoute, disconnect: bool = False):
+        self.target = AsgiApplication()
+        for route in routes:  # the same as AsgiWebserver does
+            self.target.http_route[route.path] = route
+        self.sent = []
+        self._received = [{'type': 'http.request', 'body': b'request', 'more_body': False}]
+        if disconnect:
+            self._received.append({'type': 'http.disconnect'})
+
+    async def _receive(self):
+        if self._received:
+            return self._received.pop(0)
+        await asyncio.Event().wait()
+
+    async def _send(self, message):
+        self.sent.append(message)
+
+    def call(self, scope: dict = None):
+        @unasync
+        async def call():
+            await self.target(scope or _scope, self._receive, self._send)
+
+        call()
+
+    def bodies(self) -> list[bytes]:
+        return [m['body'] for m in self.sent if m['type'] == 'http.response.body']
+
+
+def test_request_content_type():
+    requests: list[HttpRequest] = []
+
+    def callback(request, resp_callback):
+        requests.append(request)
+        return resp_callback(HttpResponse('ok', 'text/plain'))
+
+    target = AsgiFake(HttpRoute('/route', callback))
+
+    target.call()
+
+    [request] = requests
+    assert (request.method, request.content, request.content_type) == ('POST', b'request', 'text/plain')
+    assert target.bodies() == [b'ok']
+
+
+def test_request_query_and_headers():
+    requests: list[HttpRequest] = []
+
+    def callback(request, resp_callback):
+        requests.append(request)
+        return resp_callback(HttpResponse('ok', 'text/plain'))
+
+    target = AsgiFake(HttpRoute('/route', callback))
+    scope = {**_scope, 'query_string': b'q=1', 'headers': [(b'If-None-Match', b'"a"')]}
+
+    target.call(scope)
+
+    [request] = requests
+    assert request.query == 'q=1'
+    assert request.headers == {'if-none-match': '"a"'}
+
+
+def test_response_status_and_headers():
+    response = HttpResponse(b'', 'text/plain', {'ETag': '"a"'}, 304)
+    target = AsgiFake(HttpRoute('/route', lambda _, resp_callback: resp_callback(response)))
+
+    target.call()
+
+    [start] = [m for m in target.sent if m['type'] == 'http.response.start']
+    assert start['status'] == 304
+    assert start['headers'] == [[b'content-type', b'text/plain'], [b'etag', b'"a"']]
+
+
+def test_stream_response():
+    async def chunks():
+        yield b'a'
+        yield b'b'
+
+    target = AsgiFake(HttpRoute('/route', lambda _, resp_callback: resp_callback(HttpResponse(chunks(), 'x'))))
+
+    target.call()
+
+    assert target.bodies() == [b'a', b'b', b'']
+
+
+def test_stream_response__disconnection_should_close_the_chunks():
+    closed = []
+
+    async def chunks():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield b'a'
+        finally:
+            closed.append(True)
+
+    target = AsgiFake(HttpRoute('/route', lambda _, resp_callback: resp_callback(HttpResponse(chunks(), 'x'))),
+                      disconnect=True)
+
+    target.call()
+
+    assert closed == [True]
+
+
+def test_disconnection__should_cancel_the_callback():
+    cancelled = []
+
+    async def callback(request, resp_callback):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    target = AsgiFake(HttpRoute('/route', callback), disconnect=True)
+
+    target.call()
+
+    assert cancelled == [True]
+    assert target.sent == []
+
+
+def test_websocket__binary_frames():
+    received = []
+
+    def on_connect(endpoint):
+        def on_message(message):
+            received.append(message)
+            if message is not None:
+                endpoint.send(message)
+
+        endpoint.add_listener(on_message)
+
+    target = AsgiApplication()
+    target.websocket_route['/ws'] = WebsocketRoute('/ws', on_connect)  # the same as AsgiWebserver does
+    sent = []
+    incoming = [{'type': 'websocket.connect'},
+                {'type': 'websocket.receive', 'bytes': b'\x00\x01'},
+                {'type': 'websocket.receive', 'text': 'text'}]
+
+    async def receive():
+        await asyncio.sleep(0)
+        if incoming:
+            return incoming.pop(0)
+        return {'type': 'websocket.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    @unasync
+    async def call():
+        await target({'type': 'websocket', 'path': '/ws'}, receive, send)
+
+    call()
+
+    assert received == [b'\x00\x01', 'text', None]
+    assert sent[1:] == [{'type': 'websocket.send', 'bytes': b'\x00\x01'}, {'type': 'websocket.send', 'text': 'text'}]
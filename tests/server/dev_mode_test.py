@@ -5,12 +5,17 @@ from time import sleep
 from playwright.sync_api import expect
 
 from tests import for_all_webservers
+from tests.common import dyn_sys_path, DynSysPath
 from tests.server.page_fixture import PageFixture, fixture
 from tests.timeouts import timeout_multiplier
 from wwwpy.common import quickstart
 from wwwpy.common.files import get_all_paths_with_hashes
 from wwwpy.common.quickstart import is_empty_project
+from wwwpy.common.filesystem import sync
 from wwwpy.common.tree import filesystem_tree_str
+from wwwpy.rpc import RpcRoute
+from wwwpy.server.designer import dev_mode
+from wwwpy.websocket import WebsocketPool
 
 logger = logging.getLogger(__name__)
 
@@ -62,7 +67,11 @@ DevModeComponent.instance.quickstart.window.element.isConnected is False
         fixture.assert_evaluate_retry("""
 from pathlib import Path
 rem = Path('/wwwpy_bundle/remote')
+from wwwpy.common.filesystem import sync
 from wwwpy.common.tree import filesystem_tree_str
+from wwwpy.rpc import RpcRoute
+from wwwpy.server.designer import dev_mode
+from wwwpy.websocket import WebsocketPool
 print(filesystem_tree_str(rem))
         
 import js
@@ -118,3 +127,20 @@ def _assert_retry_millis(condition, millis=5000):
         assert t[0], t[1]
     else:
         assert t
+
+
+def test_server_rpc_body_change__should_reload_the_browsers(dyn_sys_path: DynSysPath, monkeypatch):
+    rpc_module = dyn_sys_path.write_module2('server/rpc.py', 'def add(a: int, b: int) -> int: return a + b')
+    rpc_route = RpcRoute('/rpc1')
+    rpc_route.allow('server.rpc')
+    rpc_route.generate_remote_stubs()
+    notified = []
+    monkeypatch.setattr(dev_mode, 'process_remote_events',
+                        lambda directory, pool, events, do_reload: notified.append(do_reload))
+    process_events = dev_mode._hotreload_events(dyn_sys_path.path, WebsocketPool('/ws'), rpc_route,
+                                                {'server'}, {'remote'})
+
+    rpc_module.write_text('def add(a: int, b: int) -> int: return a + b + 1')  # the stub does not change
+    process_events([sync.Event('modified', False, str(rpc_module))])
+
+    assert notified == [True]
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import http.client
+import time
+
+from tests import for_all_webservers
+from tests.common import dyn_sys_path
+from tests.server.rpc.rpc_route_fixture import RpcRouteFixture, fixture
+from wwwpy.webserver import Webserver
+
+# language=python
+_slow = '''
+import asyncio
+
+started = []
+cancelled = []
+
+async def slow() -> None:
+    started.append(True)
+    try:
+        await asyncio.sleep(10)
+    except asyncio.CancelledError:
+        cancelled.append(True)
+        raise
+'''
+
+
+def _wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@for_all_webservers()
+def test_client_disconnection__should_cancel_the_function(webserver: Webserver, fixture: RpcRouteFixture):
+    fixture.write_module(_slow)
+    webserver.set_routes(fixture.target.route).start_listen().wait_ready()
+    from server import rpc  # noqa
+
+    connection = http.client.HTTPConnection(webserver.host, webserver.port, timeout=5)
+    connection.request('POST', fixture.target.route.path, body=fixture.request_content('slow').encode(),
+                       headers={'Content-Type': 'text/plain'})
+    assert _wait_for(lambda: rpc.started)
+    connection.close()
+
+    assert _wait_for(lambda: rpc.cancelled)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import http.client
+
+from tests import for_all_webservers
+from tests.common import dyn_sys_path
+from tests.server.rpc.rpc_route_fixture import RpcRouteFixture, fixture
+from wwwpy.common.rpc2.idempotent import encode_query
+from wwwpy.webserver import Webserver
+
+# language=python
+_idempotent = '''
+from wwwpy.common.rpc2.options import idempotent
+
+@idempotent(max_age=60)
+def find(key: str) -> str:
+    return key.upper()
+'''
+
+
+def _get(webserver: Webserver, fixture: RpcRouteFixture, content: str,
+         headers: dict[str, str] | None = None) -> http.client.HTTPResponse:
+    connection = http.client.HTTPConnection(webserver.host, webserver.port, timeout=5)
+    url = f'{fixture.target.route.path}?{encode_query(content, fixture.encdec.content_type)}'
+    connection.request('GET', url, headers=headers or {})
+    return connection.getresponse()
+
+
+@for_all_webservers()
+def test_get__should_send_the_cache_headers(webserver: Webserver, fixture: RpcRouteFixture):
+    fixture.write_module(_idempotent)
+    webserver.set_routes(fixture.target.route).start_listen().wait_ready()
+
+    response = _get(webserver, fixture, fixture.request_content('find', ('a', str)))
+
+    assert response.status == 200
+    assert fixture.decode_result(response.read().decode(), str) == 'A'
+    assert response.getheader('ETag').startswith('"')
+    assert response.getheader('Cache-Control') == 'max-age=60'
+
+
+@for_all_webservers()
+def test_get__matching_if_none_match_should_answer_304(webserver: Webserver, fixture: RpcRouteFixture):
+    fixture.write_module(_idempotent)
+    webserver.set_routes(fixture.target.route).start_listen().wait_ready()
+    request = fixture.request_content('find', ('a', str))
+    tag = _get(webserver, fixture, request).getheader('ETag')
+
+    response = _get(webserver, fixture, request, {'If-None-Match': tag})
+
+    assert response.status == 304
+    assert response.read() == b''
+    assert response.getheader('ETag') == tag
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import pytest
+
+from tests.common import DynSysPath, dyn_sys_path
+from wwwpy.common.rpc2.encoder_decoder import JsonEncoderDecoder
+from wwwpy.common.rpc2.idempotent import encode_query
+from wwwpy.http import HttpRequest, HttpResponse
+from wwwpy.exceptions import RemoteException
+from wwwpy.rpc import RpcRoute
+from wwwpy.unasync import unasync
+
+
+class RpcRouteFixture:
+    """It drives RpcRoute.route.callback the same way the webservers do, without a webserver"""
+
+    def __init__(self, dyn_sys_path: DynSysPath):
+        self.dyn_sys_path = dyn_sys_path
+        self.module_name = 'server.rpc'
+        self.target = RpcRoute('/rpc')
+        self.target.allow(self.module_name)
+        self.encdec = JsonEncoderDecoder()
+
+    def write_module(self, source: str):
+        self.dyn_sys_path.write_module2('server/rpc.py', source)
+
+    def request_content(self, func_name: str, *args_with_types: tuple[any, type]) -> str | bytes:
+        encoder = self.encdec.encoder()
+        encoder.encode(self.module_name, str)
+        encoder.encode(func_name, str)
+        for arg, arg_type in args_with_types:
+            encoder.encode(arg, arg_type)
+        return encoder.buffer
+
+    async def post(self, content: str | bytes, content_type: str | None = None,
+                   headers: dict[str, str] | None = None) -> HttpResponse:
+        if content_type is None:
+            content_type = self.encdec.content_type
+        body = content.encode() if isinstance(content, str) else content
+        responses = []
+        request = HttpRequest('POST', body, content_type, '', headers or {})
+        res = self.target.route.callback(request, responses.append)
+        if res:
+            await res
+        assert len(responses) == 1
+        return responses[0]
+
+    async def get(self, content: str | bytes, headers: dict[str, str] | None = None) -> HttpResponse:
+        query = encode_query(content, self.encdec.content_type)
+        responses = []
+        res = self.target.route.callback(HttpRequest('GET', b'', '', query, headers or {}), responses.append)
+        if res:
+            await res
+        assert len(responses) == 1
+        return responses[0]
+
+    def get_sync(self, content: str | bytes, headers: dict[str, str] | None = None) -> HttpResponse:
+        return unasync(self.get)(content, headers)
+
+    async def invoke(self, func_name: str, return_type: type, *args_with_types: tuple[any, type]) -> any:
+        response = await self.post(self.request_content(func_name, *args_with_types))
+        return self.decode_result(response.content, return_type)
+
+    def decode_result(self, content: str | bytes, return_type: type) -> any:
+        decoder = self.encdec.decoder(content)
+        status = decoder.decode(str)
+        if status == 'ex':
+            raise RemoteException(decoder.decode(str))
+        return decoder.decode(return_type)
+
+    def invoke_sync(self, func_name: str, return_type: type, *args_with_types: tuple[any, type]) -> any:
+        return unasync(self.invoke)(func_name, return_type, *args_with_types)
+
+
+@pytest.fixture
+def fixture(dyn_sys_path: DynSysPath):
+    yield RpcRouteFixture(dyn_sys_path)
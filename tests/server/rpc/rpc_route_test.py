@@ -0,0 +1,1002 @@
+from __future__ import annotations
+
+import array
+import asyncio
+
+import pytest
+
+from tests.common import dyn_sys_path
+from tests.common.rpc2.transport_fake import TransportFake
+from tests.server.rpc.rpc_route_fixture import RpcRouteFixture, fixture
+from wwwpy.common.rpc2.batch import encode_batch, decode_batch, batch_content_type, Batcher, BatchTransport
+from wwwpy.common.rpc2 import result_cache, deadline, admission
+from wwwpy.common.rpc2.admission import AdmissionControl
+from wwwpy.common.rpc2.deadline import timeout_header
+from wwwpy.common.rpc2.default_stub import DefaultStub
+from wwwpy.common.rpc2.encoder_decoder import MsgpackEncoderDecoder, payload_content_type, parts_content_type
+from wwwpy.common.rpc2.stream import ChunkDecoder, is_stream
+from wwwpy.common.rpc2.websocket_transport import encode_frame, decode_frame, request_prefix, response_prefix, \
+    stream_prefix, cancel_prefix
+from wwwpy.exceptions import RemoteException
+from wwwpy.http import HttpRequest
+from wwwpy.unasync import unasync
+from wwwpy.websocket import WebsocketPool, WebsocketEndpointIO
+
+
+def test_sync_function(fixture: RpcRouteFixture):
+    fixture.write_module('def add(a: int, b: int) -> int: return a + b')
+
+    assert fixture.invoke_sync('add', int, (1, int), (2, int)) == 3
+
+
+def test_async_function(fixture: RpcRouteFixture):
+    fixture.write_module('async def add(a: int, b: int) -> int: return a + b')
+
+    assert fixture.invoke_sync('add', int, (1, int), (2, int)) == 3
+
+
+def test_async_exception(fixture: RpcRouteFixture):
+    fixture.write_module('async def fail() -> None: raise Exception("message 123")')
+
+    with pytest.raises(RemoteException) as e:
+        fixture.invoke_sync('fail', type(None))
+
+    assert 'message 123' in str(e)
+
+
+def test_async_functions__should_run_concurrently_on_the_loop(fixture: RpcRouteFixture):
+    """Every call waits for all the others to arrive: if the calls were serialized, the first one would time out"""
+    # language=python
+    fixture.write_module('''
+import asyncio
+import threading
+
+arrived = 0
+threads = set()
+all_arrived = asyncio.Event()
+
+async def wait_all(count: int) -> int:
+    global arrived
+    threads.add(threading.get_ident())
+    arrived += 1
+    if arrived == count:
+        all_arrived.set()
+    await asyncio.wait_for(all_arrived.wait(), 5)
+    return arrived
+''')
+    count = 50
+
+    @unasync
+    async def invoke_all():
+        return await asyncio.gather(*[fixture.invoke('wait_all', int, (count, int)) for _ in range(count)])
+
+    assert invoke_all() == [count] * count
+    from server import rpc  # noqa
+    assert len(rpc.threads) == 1
+
+
+def test_sync_function__should_run_in_the_thread_pool(fixture: RpcRouteFixture):
+    fixture.write_module('import threading\ndef thread_name() -> str: return threading.current_thread().name')
+
+    assert fixture.invoke_sync('thread_name', str).startswith('wwwpy-rpc')
+
+
+def test_sync_function_inline__should_run_on_the_loop(fixture: RpcRouteFixture):
+    # language=python
+    fixture.write_module('''
+import threading
+from wwwpy.common.rpc2.options import inline
+
+@inline
+def thread_name() -> str:
+    return threading.current_thread().name
+''')
+
+    assert not fixture.invoke_sync('thread_name', str).startswith('wwwpy-rpc')
+
+
+def test_blocking_sync_function__should_not_block_async_functions(fixture: RpcRouteFixture):
+    # language=python
+    fixture.write_module('''
+import threading
+released = threading.Event()
+
+def blocking() -> bool:
+    return released.wait(5)
+
+async def release() -> None:
+    released.set()
+''')
+
+    @unasync
+    async def invoke_both():
+        return await asyncio.gather(fixture.invoke('blocking', bool), fixture.invoke('release', type(None)))
+
+    assert invoke_both() == [True, None]
+
+
+def test_max_concurrency__should_limit_the_function(fixture: RpcRouteFixture):
+    # language=python
+    fixture.write_module('''
+import threading
+import time
+from wwwpy.common.rpc2.options import max_concurrency
+
+lock = threading.Lock()
+running = 0
+max_running = 0
+
+@max_concurrency(2, max_queue=6)
+def work() -> int:
+    global running, max_running
+    with lock:
+        running += 1
+        max_running = max(max_running, running)
+    time.sleep(0.02)
+    with lock:
+        running -= 1
+    return max_running
+''')
+
+    @unasync
+    async def invoke_all():
+        return await asyncio.gather(*[fixture.invoke('work', int) for _ in range(8)])
+
+    assert max(invoke_all()) == 2
+
+
+def test_set_max_concurrency__should_limit_the_module(fixture: RpcRouteFixture):
+    # language=python
+    fixture.write_module('''
+import threading
+import time
+
+lock = threading.Lock()
+running = 0
+max_running = 0
+
+def _work():
+    global running, max_running
+    with lock:
+        running += 1
+        max_running = max(max_running, running)
+    time.sleep(0.02)
+    with lock:
+        running -= 1
+    return max_running
+
+def work1() -> int: return _work()
+def work2() -> int: return _work()
+''')
+    fixture.target.set_max_concurrency(fixture.module_name, 1, max_queue=5)
+
+    @unasync
+    async def invoke_all():
+        return await asyncio.gather(*[fixture.invoke(f'work{i % 2 + 1}', int) for i in range(6)])
+
+    assert max(invoke_all()) == 1
+
+
+def test_executor_stats(fixture: RpcRouteFixture):
+    # language=python
+    fixture.write_module('''
+import threading
+started = threading.Event()
+released = threading.Event()
+
+def blocking() -> None:
+    started.set()
+    released.wait(5)
+''')
+    from wwwpy.server.rpc_executor import ExecutorStats
+    executor = fixture.target.executor
+
+    @unasync
+    async def invoke():
+        task = asyncio.create_task(fixture.invoke('blocking', type(None)))
+        from server import rpc  # noqa
+        await asyncio.get_running_loop().run_in_executor(None, rpc.started.wait, 5)
+        running = executor.stats()
+        rpc.released.set()
+        await task
+        return running
+
+    assert invoke() == ExecutorStats(executor.max_workers, active_workers=1, queue_depth=0)
+    assert executor.stats() == ExecutorStats(executor.max_workers, 0, 0)
+
+
+def test_batch__calls_should_be_isolated(fixture: RpcRouteFixture):
+    # language=python
+    fixture.write_module('''
+def add(a: int, b: int) -> int: return a + b
+async def fail() -> int: raise Exception('message 123')
+''')
+    requests = [
+        fixture.request_content('add', (1, int), (2, int)),
+        fixture.request_content('fail'),
+        fixture.request_content('add', (3, int), (4, int)).replace('server.rpc', 'not.allowed'),
+        fixture.request_content('add', (5, int), (6, int)),
+    ]
+
+    @unasync
+    async def post_batch():
+        return await fixture.post(encode_batch(fixture.encdec, requests), batch_content_type('text/plain'))
+
+    responses = decode_batch(fixture.encdec, post_batch().content)
+
+    assert len(responses) == 4
+    assert fixture.decode_result(responses[0], int) == 3
+    with pytest.raises(RemoteException, match='message 123'):
+        fixture.decode_result(responses[1], int)
+    with pytest.raises(RemoteException, match='Not allowed module'):
+        fixture.decode_result(responses[2], int)
+    assert fixture.decode_result(responses[3], int) == 11
+
+
+def test_batch_transport__stub_calls_should_travel_in_one_post(fixture: RpcRouteFixture):
+    fixture.write_module('async def add(a: int, b: int) -> int: return a + b')
+    posts = []
+
+    async def post(payload: str, batch: bool) -> str:
+        posts.append(batch)
+        content_type = batch_content_type('text/plain') if batch else 'text/plain'
+        return (await fixture.post(payload, content_type)).content
+
+    @unasync
+    async def invoke_all():
+        from server import rpc  # noqa
+        transport = BatchTransport(Batcher(post, fixture.encdec), TransportFake())
+        stub = DefaultStub(transport, fixture.encdec, fixture.module_name)
+        stub.setup_functions(rpc.add)
+        return await asyncio.gather(*[stub.namespace.add(i, i) for i in range(10)])
+
+    assert invoke_all() == [i + i for i in range(10)]
+    assert posts == [True]
+
+
+def test_msgpack__should_answer_with_the_request_encoder_decoder(fixture: RpcRouteFixture):
+    fixture.write_module('async def concat(a: bytes, b: bytes) -> bytes: return a + b')
+    fixture.encdec = MsgpackEncoderDecoder()
+
+    @unasync
+    async def post():
+        return await fixture.post(fixture.request_content('concat', (b'\x00\xff', bytes), (b'\x01', bytes)))
+
+    response = post()
+
+    assert response.content_type == 'application/msgpack'
+    assert isinstance(response.content, bytes)
+    assert fixture.decode_result(response.content, bytes) == b'\x00\xff\x01'
+
+
+class PostTransport(TransportFake):
+    """It posts the payloads to the route, with the content type the remote transports would use"""
+
+    def __init__(self, fixture: RpcRouteFixture):
+        super().__init__()
+        self.fixture = fixture
+        self.content_types = []
+
+    async def send_async(self, payload: str | bytes):
+        content_type = payload_content_type(payload, self.fixture.encdec.content_type)
+        self.content_types.append(content_type)
+        self.recv_buffer.append((await self.fixture.post(payload, content_type)).content)
+
+
+def test_parts__binary_arguments_and_result_should_travel_out_of_band(fixture: RpcRouteFixture):
+    fixture.write_module('''
+received = []
+async def reverse(name: str, data: memoryview) -> bytes:
+    received.append(data)
+    return bytes(data[::-1])
+''')
+    transport = PostTransport(fixture)
+
+    @unasync
+    async def invoke():
+        from server import rpc  # noqa
+        stub = DefaultStub(transport, fixture.encdec, fixture.module_name)
+        stub.setup_functions(rpc.reverse)
+        return await stub.namespace.reverse('file.bin', b'\x01\x02\x03')
+
+    assert invoke() == b'\x03\x02\x01'
+    assert transport.content_types == [parts_content_type('text/plain')]
+    from server import rpc  # noqa
+    [data] = rpc.received
+    assert isinstance(data, memoryview)
+
+
+def test_parts__numeric_arrays_should_travel_out_of_band(fixture: RpcRouteFixture):
+    fixture.write_module('''
+import array
+async def scale(values: array.array, k: float) -> array.array:
+    return array.array(values.typecode, [v * k for v in values])
+''')
+    transport = PostTransport(fixture)
+
+    @unasync
+    async def invoke():
+        from server import rpc  # noqa
+        stub = DefaultStub(transport, fixture.encdec, fixture.module_name)
+        stub.setup_functions(rpc.scale)
+        return await stub.namespace.scale(array.array('d', [1, 2]), 1.5)
+
+    assert invoke() == array.array('d', [1.5, 3])
+    assert transport.content_types == [parts_content_type('text/plain')]
+
+
+def test_msgpack_batch(fixture: RpcRouteFixture):
+    fixture.write_module('def add(a: int, b: int) -> int: return a + b')
+    fixture.encdec = MsgpackEncoderDecoder()
+    requests = [fixture.request_content('add', (i, int), (i, int)) for i in range(3)]
+
+    @unasync
+    async def post_batch():
+        return await fixture.post(encode_batch(fixture.encdec, requests), batch_content_type('application/msgpack'))
+
+    responses = decode_batch(fixture.encdec, post_batch().content)
+
+    assert [fixture.decode_result(r, int) for r in responses] == [0, 2, 4]
+
+
+def test_websocket__calls_should_be_pipelined(fixture: RpcRouteFixture):
+    # language=python
+    fixture.write_module('''
+import asyncio
+released = asyncio.Event()
+
+async def slow() -> str:
+    await asyncio.wait_for(released.wait(), 5)
+    return 'slow'
+
+async def fast() -> str:
+    released.set()
+    return 'fast'
+''')
+    pool = WebsocketPool('/ws')
+    pool.on_message.append(fixture.target.on_websocket_message)
+
+    @unasync
+    async def call_both():
+        loop = asyncio.get_running_loop()
+        responses = asyncio.Queue()
+        endpoint = WebsocketEndpointIO(lambda m: loop.call_soon(responses.put_nowait, m))
+        pool.http_route.on_connect(endpoint)
+        endpoint.on_message(encode_frame(request_prefix, 1, fixture.request_content('slow')))
+        endpoint.on_message(encode_frame(request_prefix, 2, fixture.request_content('fast')))
+        return [decode_frame(response_prefix, await responses.get()) for _ in range(2)]
+
+    (first_id, first), (second_id, second) = call_both()
+
+    assert (first_id, fixture.decode_result(first, str)) == (2, 'fast')
+    assert (second_id, fixture.decode_result(second, str)) == (1, 'slow')
+
+
+def test_websocket__the_function_should_know_its_websocket(fixture: RpcRouteFixture):
+    # language=python
+    fixture.write_module('''
+from wwwpy.websocket import current_endpoint
+
+def who() -> str:
+    return current_endpoint().name
+''')
+    pool = WebsocketPool('/ws')
+    pool.on_message.append(fixture.target.on_websocket_message)
+
+    @unasync
+    async def call():
+        loop = asyncio.get_running_loop()
+        responses = asyncio.Queue()
+        endpoint = WebsocketEndpointIO(lambda m: loop.call_soon_threadsafe(responses.put_nowait, m))
+        endpoint.name = 'endpoint1'
+        pool.http_route.on_connect(endpoint)
+        endpoint.on_message(encode_frame(request_prefix, 1, fixture.request_content('who')))
+        return decode_frame(response_prefix, await responses.get())
+
+    _, response = call()
+
+    assert fixture.decode_result(response, str) == 'endpoint1'
+
+
+def test_websocket__not_a_request_should_be_ignored(fixture: RpcRouteFixture):
+    sent = []
+    endpoint = WebsocketEndpointIO(sent.append)
+
+    fixture.target.on_websocket_message(endpoint, '["module", "func", []]')
+
+    assert sent == []
+
+
+# language=python
+_streaming = '''
+import asyncio
+from typing import AsyncIterator
+
+closed = []
+
+async def count(n: int) -> AsyncIterator[int]:
+    for i in range(n):
+        yield i
+
+async def endless() -> AsyncIterator[int]:
+    try:
+        i = 0
+        while True:
+            await asyncio.sleep(0)
+            yield i
+            i += 1
+    finally:
+        closed.append(True)
+'''
+
+
+def _decode_stream_message(fixture: RpcRouteFixture, message: str) -> tuple[str, any]:
+    decoder = fixture.encdec.decoder(message)
+    status = decoder.decode(str)
+    return status, decoder.decode(int) if status == 'item' else None
+
+
+async def _wait_for(condition, timeout: float = 5):
+    async def wait():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(wait(), timeout)
+
+
+def test_stream__http_response_should_be_chunked(fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+
+    @unasync
+    async def read():
+        response = await fixture.post(fixture.request_content('count', (3, int)))
+        decoder = ChunkDecoder(text=True)
+        messages = []
+        async for chunk in response.content:
+            messages += decoder.feed(chunk)
+        return response.content_type, messages
+
+    content_type, messages = read()
+
+    assert is_stream(content_type)
+    assert [_decode_stream_message(fixture, m) for m in messages] == [
+        ('item', 0), ('item', 1), ('item', 2), ('end', None)]
+
+
+def test_stream__closed_http_response_should_close_the_function(fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+
+    @unasync
+    async def read_two():
+        response = await fixture.post(fixture.request_content('endless'))
+        chunks = [await response.content.__anext__(), await response.content.__anext__()]
+        await response.content.aclose()
+        return chunks
+
+    assert len(read_two()) == 2
+    from server import rpc  # noqa
+    assert rpc.closed == [True]
+
+
+def test_stream__should_hold_its_admission_slot_until_closed(fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+    fixture.target.admission.set_limit('server.rpc', 'endless', 1)
+
+    @unasync
+    async def post_while_open():
+        response = await fixture.post(fixture.request_content('endless'))
+        rejected = await fixture.post(fixture.request_content('endless'))
+        await response.content.aclose()  # never iterated
+        after = fixture.target.admission.function_stats('server.rpc', 'endless')
+        return rejected, after
+
+    rejected, after = post_while_open()
+
+    assert rejected.status == admission.overloaded_http_status
+    assert after.running == 0
+
+
+def test_admission__should_be_bounded_by_default(fixture: RpcRouteFixture):
+    assert 'wwwpy_rpc_admission_running 0\n' in fixture.target.admission.to_prometheus()  # the global cap
+
+
+def test_stream__should_not_be_batched(fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+    requests = [fixture.request_content('count', (1, int)), fixture.request_content('count', (2, int))]
+
+    @unasync
+    async def post_batch():
+        return await fixture.post(encode_batch(fixture.encdec, requests), batch_content_type('text/plain'))
+
+    responses = decode_batch(fixture.encdec, post_batch().content)
+
+    for response in responses:
+        with pytest.raises(RemoteException, match='batch'):
+            fixture.decode_result(response, int)
+
+
+def test_websocket_stream(fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+    pool = WebsocketPool('/ws')
+    pool.on_message.append(fixture.target.on_websocket_message)
+
+    @unasync
+    async def call():
+        frames = asyncio.Queue()
+        endpoint = WebsocketEndpointIO(frames.put_nowait)
+        pool.http_route.on_connect(endpoint)
+        endpoint.on_message(encode_frame(request_prefix, 7, fixture.request_content('count', (2, int))))
+        return [await frames.get() for _ in range(3)]
+
+    frames = call()
+
+    assert [decode_frame(stream_prefix, f)[0] for f in frames[:2]] == [7, 7]
+    assert [_decode_stream_message(fixture, decode_frame(stream_prefix, f)[1]) for f in frames[:2]] == [
+        ('item', 0), ('item', 1)]
+    call_id, last = decode_frame(response_prefix, frames[2])
+    assert (call_id, _decode_stream_message(fixture, last)) == (7, ('end', None))
+
+
+def test_websocket_stream__cancel_frame_should_close_the_function(fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+    pool = WebsocketPool('/ws')
+    pool.on_message.append(fixture.target.on_websocket_message)
+    from server import rpc  # noqa
+
+    @unasync
+    async def call_and_cancel():
+        frames = asyncio.Queue()
+        endpoint = WebsocketEndpointIO(frames.put_nowait)
+        pool.http_route.on_connect(endpoint)
+        endpoint.on_message(encode_frame(request_prefix, 1, fixture.request_content('endless')))
+        await frames.get()
+        endpoint.on_message(encode_frame(cancel_prefix, 1, ''))
+        await _wait_for(lambda: rpc.closed)
+
+    call_and_cancel()
+
+    assert rpc.closed == [True]
+
+
+def test_websocket_stream__disconnection_should_close_the_function(fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+    pool = WebsocketPool('/ws')
+    pool.on_message.append(fixture.target.on_websocket_message)
+    pool.on_after_change.append(fixture.target.on_websocket_change)
+    from server import rpc  # noqa
+
+    @unasync
+    async def call_and_disconnect():
+        frames = asyncio.Queue()
+        endpoint = WebsocketEndpointIO(frames.put_nowait)
+        pool.http_route.on_connect(endpoint)
+        endpoint.on_message(encode_frame(request_prefix, 1, fixture.request_content('endless')))
+        await frames.get()
+        endpoint.on_message(None)
+        await _wait_for(lambda: rpc.closed)
+
+    call_and_disconnect()
+
+    assert rpc.closed == [True]
+
+
+# language=python
+_cached = '''
+from wwwpy.common.rpc2.options import cache
+
+calls = []
+
+@cache()
+def lookup(key: str) -> str:
+    calls.append(key)
+    return key.upper()
+
+@cache(ttl=60)
+async def fail(key: str) -> str:
+    calls.append(key)
+    raise Exception('message 123')
+'''
+
+
+def test_cache__should_invoke_once_per_arguments(fixture: RpcRouteFixture):
+    fixture.write_module(_cached)
+    from server import rpc  # noqa
+
+    results = [fixture.invoke_sync('lookup', str, (key, str)) for key in ['a', 'a', 'b', 'a']]
+
+    assert results == ['A', 'A', 'B', 'A']
+    assert rpc.calls == ['a', 'b']
+    stats = fixture.target.result_cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (2, 2, 2)
+
+
+def test_cache__exceptions_should_not_be_cached(fixture: RpcRouteFixture):
+    fixture.write_module(_cached)
+    from server import rpc  # noqa
+
+    for _ in range(2):
+        with pytest.raises(RemoteException, match='message 123'):
+            fixture.invoke_sync('fail', str, ('a', str))
+
+    assert rpc.calls == ['a', 'a']
+
+
+def test_cache__invalidate(fixture: RpcRouteFixture):
+    fixture.write_module(_cached)
+    from server import rpc  # noqa
+    fixture.invoke_sync('lookup', str, ('a', str))
+
+    result_cache.invalidate(rpc.lookup)
+    fixture.invoke_sync('lookup', str, ('a', str))
+
+    assert rpc.calls == ['a', 'a']
+
+
+# language=python
+_single_flight = '''
+import asyncio
+from wwwpy.common.rpc2.options import single_flight
+
+calls = []
+release = asyncio.Event()
+
+@single_flight
+async def expensive(key: str) -> str:
+    calls.append(key)
+    await release.wait()
+    return key.upper()
+
+async def release_all() -> None:
+    release.set()
+'''
+
+
+def test_single_flight__concurrent_identical_calls_should_execute_once(fixture: RpcRouteFixture):
+    fixture.write_module(_single_flight)
+    from server import rpc  # noqa
+
+    @unasync
+    async def invoke_all():
+        calls = [fixture.invoke('expensive', str, (key, str)) for key in ['a', 'a', 'b', 'a']]
+        calls.append(fixture.invoke('release_all', type(None)))
+        return await asyncio.gather(*calls)
+
+    assert invoke_all() == ['A', 'A', 'B', 'A', None]
+    assert sorted(rpc.calls) == ['a', 'b']
+    assert fixture.target.single_flight.stats().coalesced == 2
+
+
+def test_single_flight__sequential_calls_should_execute_each(fixture: RpcRouteFixture):
+    fixture.write_module(_single_flight)
+    from server import rpc  # noqa
+    rpc.release.set()
+
+    results = [fixture.invoke_sync('expensive', str, ('a', str)) for _ in range(2)]
+
+    assert results == ['A', 'A']
+    assert rpc.calls == ['a', 'a']
+
+
+def test_metrics__should_record_calls_and_errors(fixture: RpcRouteFixture):
+    fixture.write_module('def add(a: int, b: int) -> int: return a + b\n'
+                         'def fail() -> None: raise Exception("message 123")')
+
+    fixture.invoke_sync('add', int, (1, int), (2, int))
+    fixture.invoke_sync('add', int, (3, int), (4, int))
+    with pytest.raises(RemoteException):
+        fixture.invoke_sync('fail', type(None))
+
+    add = fixture.target.metrics.get('server.rpc', 'add')
+    assert (add.calls, add.errors) == (2, 0)
+    assert add.request_bytes == 2 * len(fixture.request_content('add', (1, int), (2, int)))
+    assert add.response_bytes > 0
+    assert [h.count for h in add.phases.values()] == [2, 2, 2, 2]
+    fail = fixture.target.metrics.get('server.rpc', 'fail')
+    assert (fail.calls, fail.errors) == (1, 1)
+
+
+def test_metrics__stream_should_be_recorded_at_the_end(fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+
+    @unasync
+    async def read_all():
+        response = await fixture.post(fixture.request_content('count', (3, int)))
+        async for _ in response.content:
+            pass
+
+    read_all()
+
+    count = fixture.target.metrics.get('server.rpc', 'count')
+    assert (count.calls, count.errors) == (1, 0)
+
+
+def test_metrics_route__should_answer_in_prometheus_format(fixture: RpcRouteFixture):
+    fixture.write_module('def add(a: int, b: int) -> int: return a + b')
+    fixture.invoke_sync('add', int, (1, int), (2, int))
+    route = fixture.target.metrics_route('/wwwpy/metrics')
+
+    responses = []
+    route.callback(HttpRequest('GET', b'', ''), responses.append)
+
+    [response] = responses
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    assert 'wwwpy_rpc_calls_total{module="server.rpc",function="add"} 1\n' in response.content
+
+
+# language=python
+_idempotent = '''
+from wwwpy.common.rpc2.options import idempotent
+
+calls = []
+
+@idempotent(max_age=60)
+def find(key: str) -> str:
+    calls.append(key)
+    return key.upper()
+
+@idempotent()
+async def fail() -> str:
+    raise Exception('message 123')
+
+def not_idempotent() -> str:
+    calls.append('not_idempotent')
+    return 'ok'
+'''
+
+
+def test_get__should_answer_with_etag_and_cache_control(fixture: RpcRouteFixture):
+    fixture.write_module(_idempotent)
+
+    response = fixture.get_sync(fixture.request_content('find', ('a', str)))
+
+    assert response.status == 200
+    assert fixture.decode_result(response.content, str) == 'A'
+    assert response.headers['ETag'].startswith('"')
+    assert response.headers['Cache-Control'] == 'max-age=60'
+
+
+def test_get__matching_if_none_match_should_answer_304(fixture: RpcRouteFixture):
+    fixture.write_module(_idempotent)
+    request = fixture.request_content('find', ('a', str))
+    tag = fixture.get_sync(request).headers['ETag']
+
+    response = fixture.get_sync(request, {'if-none-match': tag})
+
+    assert response.status == 304
+    assert response.content == b''
+    assert response.headers['ETag'] == tag
+
+
+def test_get__changed_response_should_answer_200(fixture: RpcRouteFixture):
+    fixture.write_module(_idempotent)
+    tag = fixture.get_sync(fixture.request_content('find', ('a', str))).headers['ETag']
+
+    response = fixture.get_sync(fixture.request_content('find', ('b', str)), {'if-none-match': tag})
+
+    assert response.status == 200
+    assert fixture.decode_result(response.content, str) == 'B'
+
+
+def test_get__exception_should_not_be_cached(fixture: RpcRouteFixture):
+    fixture.write_module(_idempotent)
+
+    response = fixture.get_sync(fixture.request_content('fail'))
+
+    with pytest.raises(RemoteException, match='message 123'):
+        fixture.decode_result(response.content, str)
+    assert response.headers == {'Cache-Control': 'no-store'}
+
+
+def test_get__not_idempotent_function_should_not_be_invoked(fixture: RpcRouteFixture):
+    fixture.write_module(_idempotent)
+    from server import rpc  # noqa
+
+    response = fixture.get_sync(fixture.request_content('not_idempotent'))
+
+    with pytest.raises(RemoteException, match='Not idempotent'):
+        fixture.decode_result(response.content, str)
+    assert rpc.calls == []
+
+
+def test_get__without_request_should_answer_400(fixture: RpcRouteFixture):
+    @unasync
+    async def get():
+        responses = []
+        await fixture.target.route.callback(HttpRequest('GET', b'', '', 'x=1'), responses.append)
+        return responses[0]
+
+    assert get().status == 400
+
+
+# language=python
+_slow = '''
+import asyncio
+import threading
+
+started = []
+cancelled = []
+released = threading.Event()
+
+async def slow() -> None:
+    started.append(True)
+    try:
+        await asyncio.sleep(10)
+    except asyncio.CancelledError:
+        cancelled.append(True)
+        raise
+
+def slow_sync() -> None:
+    released.wait(5)
+'''
+
+
+def _status(fixture: RpcRouteFixture, content: str | bytes) -> str:
+    return fixture.encdec.decoder(content).decode(str)
+
+
+def test_timeout__should_cancel_the_function_and_answer_timeout(fixture: RpcRouteFixture):
+    fixture.write_module(_slow)
+    from server import rpc  # noqa
+
+    @unasync
+    async def post():
+        return await fixture.post(fixture.request_content('slow'), headers={timeout_header: '0.05'})
+
+    assert _status(fixture, post().content) == deadline.timeout_status
+    assert rpc.cancelled == [True]
+
+
+def test_timeout__running_sync_function_should_be_abandoned(fixture: RpcRouteFixture):
+    fixture.write_module(_slow)
+    from server import rpc  # noqa
+
+    @unasync
+    async def post():
+        return await fixture.post(fixture.request_content('slow_sync'), headers={timeout_header: '0.05'})
+
+    assert _status(fixture, post().content) == deadline.timeout_status
+    assert fixture.target.executor.stats().abandoned == 1
+    rpc.released.set()
+    unasync(_wait_for)(lambda: fixture.target.executor.stats().abandoned == 0)
+
+
+def test_timeout__expired_should_not_invoke_the_function(fixture: RpcRouteFixture):
+    fixture.write_module(_slow)
+    from server import rpc  # noqa
+
+    @unasync
+    async def post():
+        return await fixture.post(fixture.request_content('slow'), headers={timeout_header: '0'})
+
+    assert _status(fixture, post().content) == deadline.timeout_status
+    assert rpc.cancelled == []
+
+
+def test_cancelled_request__should_cancel_the_function(fixture: RpcRouteFixture):
+    """The webservers cancel the route callback when the client disconnects"""
+    fixture.write_module(_slow)
+    from server import rpc  # noqa
+
+    @unasync
+    async def post_and_cancel():
+        task = asyncio.ensure_future(fixture.post(fixture.request_content('slow')))
+        await _wait_for(lambda: rpc.started)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    post_and_cancel()
+
+    assert rpc.cancelled == [True]
+
+
+def test_websocket_cancel_frame__should_cancel_the_function(fixture: RpcRouteFixture):
+    fixture.write_module(_slow)
+    pool = WebsocketPool('/ws')
+    pool.on_message.append(fixture.target.on_websocket_message)
+    from server import rpc  # noqa
+
+    @unasync
+    async def call_and_cancel():
+        endpoint = WebsocketEndpointIO(lambda _: None)
+        pool.http_route.on_connect(endpoint)
+        endpoint.on_message(encode_frame(request_prefix, 1, fixture.request_content('slow')))
+        await asyncio.sleep(0.01)
+        endpoint.on_message(encode_frame(cancel_prefix, 1, ''))
+        await _wait_for(lambda: rpc.cancelled)
+
+    call_and_cancel()
+
+    assert rpc.cancelled == [True]
+
+
+def test_websocket_timeout__should_answer_timeout(fixture: RpcRouteFixture):
+    fixture.write_module(_slow)
+    pool = WebsocketPool('/ws')
+    pool.on_message.append(fixture.target.on_websocket_message)
+
+    @unasync
+    async def call():
+        frames = asyncio.Queue()
+        endpoint = WebsocketEndpointIO(frames.put_nowait)
+        pool.http_route.on_connect(endpoint)
+        endpoint.on_message(encode_frame(request_prefix, 1, fixture.request_content('slow'), 0.05))
+        return await asyncio.wait_for(frames.get(), 5)
+
+    call_id, payload = decode_frame(response_prefix, call())
+    assert call_id == 1
+    assert _status(fixture, payload) == deadline.timeout_status
+
+
+def test_admission__rejected_call_should_answer_503_with_retry_after(fixture: RpcRouteFixture):
+    fixture.write_module(_slow)
+    fixture.target.admission.set_limit('server.rpc', 'slow', 1)
+    from server import rpc  # noqa
+
+    @unasync
+    async def post_twice():
+        running = asyncio.ensure_future(fixture.post(fixture.request_content('slow')))
+        await _wait_for(lambda: rpc.started)
+        rejected = await fixture.post(fixture.request_content('slow'))
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        return rejected
+
+    response = post_twice()
+    assert response.status == admission.overloaded_http_status
+    assert response.headers[admission.retry_after_header] == '1'
+    assert fixture.target.admission.function_stats('server.rpc', 'slow').rejected == 1
+    assert len(rpc.started) == 1
+
+
+def test_admission__queued_call_should_run_when_the_slot_is_free(fixture: RpcRouteFixture):
+    fixture.write_module('''
+import asyncio
+release = asyncio.Event()
+async def wait() -> str:
+    await release.wait()
+    return 'done'
+''')
+    fixture.target.admission = AdmissionControl(max_concurrent=1, max_queue=1)
+    from server import rpc  # noqa
+
+    @unasync
+    async def post_twice():
+        calls = [asyncio.ensure_future(fixture.post(fixture.request_content('wait'))) for _ in range(2)]
+        await _wait_for(lambda: fixture.target.admission.stats().queue_depth == 1)
+        rpc.release.set()
+        return await asyncio.gather(*calls)
+
+    assert [fixture.decode_result(r.content, str) for r in post_twice()] == ['done', 'done']
+
+
+def test_admission__websocket_rejected_call_should_answer_overloaded(fixture: RpcRouteFixture):
+    fixture.write_module(_slow)
+    fixture.target.admission.set_limit('server.rpc', 'slow', 1)
+    pool = WebsocketPool('/ws')
+    pool.on_message.append(fixture.target.on_websocket_message)
+
+    @unasync
+    async def call_twice():
+        frames = asyncio.Queue()
+        endpoint = WebsocketEndpointIO(frames.put_nowait)
+        pool.http_route.on_connect(endpoint)
+        endpoint.on_message(encode_frame(request_prefix, 1, fixture.request_content('slow')))
+        endpoint.on_message(encode_frame(request_prefix, 2, fixture.request_content('slow')))
+        frame = await asyncio.wait_for(frames.get(), 5)
+        endpoint.on_message(encode_frame(cancel_prefix, 1, ''))
+        return frame
+
+    call_id, payload = decode_frame(response_prefix, call_twice())
+    assert call_id == 2
+    assert _status(fixture, payload) == admission.overloaded_status
+
+
+def test_admission__should_be_exported_by_the_metrics_route(fixture: RpcRouteFixture):
+    fixture.target.admission.set_limit('server.rpc', 'slow', 1, max_queue=2)
+    route = fixture.target.metrics_route('/wwwpy/metrics')
+
+    responses = []
+    route.callback(HttpRequest('GET', b'', ''), responses.append)
+
+    [response] = responses
+    assert 'wwwpy_rpc_admission_queue_depth{module="server.rpc",function="slow"} 0\n' in response.content
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import http.client
+import time
+
+from tests import for_all_webservers
+from tests.common import dyn_sys_path
+from tests.server.rpc.rpc_route_fixture import RpcRouteFixture, fixture
+from wwwpy.common.rpc2.stream import ChunkDecoder, is_stream
+from wwwpy.webserver import Webserver
+
+# language=python
+_streaming = '''
+import asyncio
+from typing import AsyncIterator
+
+closed = []
+
+async def count(n: int) -> AsyncIterator[int]:
+    for i in range(n):
+        await asyncio.sleep(0.01)
+        yield i
+
+async def endless() -> AsyncIterator[int]:
+    try:
+        i = 0
+        while True:
+            await asyncio.sleep(0.001)
+            yield i
+            i += 1
+    finally:
+        closed.append(True)
+'''
+
+
+def _post(webserver: Webserver, fixture: RpcRouteFixture, content: str) -> http.client.HTTPResponse:
+    connection = http.client.HTTPConnection(webserver.host, webserver.port, timeout=5)
+    connection.request('POST', fixture.target.route.path, body=content.encode(),
+                       headers={'Content-Type': 'text/plain'})
+    return connection.getresponse()
+
+
+def _status(fixture: RpcRouteFixture, message: str) -> str:
+    return fixture.encdec.decoder(message).decode(str)
+
+
+@for_all_webservers()
+def test_http_stream(webserver: Webserver, fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+    webserver.set_routes(fixture.target.route).start_listen().wait_ready()
+
+    response = _post(webserver, fixture, fixture.request_content('count', (3, int)))
+
+    assert is_stream(response.getheader('Content-Type'))
+    decoder = ChunkDecoder(text=True)
+    messages = []
+    while data := response.read1(65536):
+        messages += decoder.feed(data)
+    assert [_status(fixture, m) for m in messages] == ['item', 'item', 'item', 'end']
+
+
+@for_all_webservers()
+def test_http_stream__client_disconnection_should_close_the_function(webserver: Webserver,
+                                                                     fixture: RpcRouteFixture):
+    fixture.write_module(_streaming)
+    webserver.set_routes(fixture.target.route).start_listen().wait_ready()
+
+    response = _post(webserver, fixture, fixture.request_content('endless'))
+    decoder = ChunkDecoder(text=True)
+    messages = []
+    while len(messages) < 2:
+        messages += decoder.feed(response.read1(65536))
+    response.close()
+
+    from server import rpc  # noqa
+    deadline = time.monotonic() + 5
+    while not rpc.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert rpc.closed == [True]
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+
+from tornado.websocket import websocket_connect
+
+from wwwpy.server.tcp_port import find_port
+from wwwpy.unasync import unasync
+from wwwpy.webservers.tornado import WsTornado, _without_compressor
+from wwwpy.websocket import WebsocketRoute, WebsocketEndpoint, WebsocketCompression
+
+
+def _start(on_connect, webserver: WsTornado | None = None) -> str:
+    port = find_port()
+    (webserver or WsTornado()).set_routes(WebsocketRoute('/ws', on_connect)).set_port(port).start_listen().wait_ready()
+    return f'ws://127.0.0.1:{port}/ws'
+
+
+def test_binary_and_text_frames__should_keep_their_type():
+    def on_connect(endpoint: WebsocketEndpoint):
+        endpoint.add_listener(lambda message: message is not None and endpoint.send(message))
+
+    url = _start(on_connect)
+
+    @unasync
+    async def echo():
+        connection = await websocket_connect(url)
+        await connection.write_message(b'\x00\xff', binary=True)
+        await connection.write_message('text')
+        received = [await connection.read_message(), await connection.read_message()]
+        connection.close()
+        return received
+
+    assert echo() == [b'\x00\xff', 'text']
+
+
+def test_burst_from_a_thread__should_arrive_in_order():
+    count = 1000
+
+    def on_connect(endpoint: WebsocketEndpoint):
+        endpoint.add_listener(lambda message: None)
+
+        def burst():
+            for i in range(count):
+                endpoint.send(f'm{i}')
+
+        threading.Thread(target=burst).start()
+
+    url = _start(on_connect)
+
+    @unasync
+    async def receive():
+        connection = await websocket_connect(url)
+        received = [await connection.read_message() for _ in range(count)]
+        connection.close()
+        return received
+
+    assert receive() == [f'm{i}' for i in range(count)]
+
+
+def test_compression__should_deflate_only_the_messages_above_the_threshold():
+    compression = WebsocketCompression(min_size=100)
+    large = 'x' * 1000
+    multibyte = 'è' * 60  # 60 characters, 120 bytes
+
+    def on_connect(endpoint: WebsocketEndpoint):
+        endpoint.add_listener(lambda message: message is not None and endpoint.send(message))
+
+    url = _start(on_connect, WsTornado(compression))
+
+    @unasync
+    async def echo():
+        connection = await websocket_connect(url, compression_options={})
+        decompressor = connection.protocol._decompressor  # noqa, the compressed frames are not visible otherwise
+        decompress = decompressor.decompress
+        compressed = []
+        decompressor.decompress = lambda data: compressed.append(True) or decompress(data)
+        received = []
+        for message in ['small', multibyte, large]:
+            await connection.write_message(message)
+            received.append(await connection.read_message())
+        connection.close()
+        return received, len(compressed)
+
+    received, compressed = echo()
+
+    assert received == ['small', multibyte, large]
+    assert compressed == 2
+
+
+def test_compression__should_be_opt_in():
+    assert WsTornado().compression is None
+
+
+def test_without_compressor__should_set_it_aside_only_while_writing():
+    class Connection:
+        _compressor = 'compressor'
+
+    connection = Connection()
+    with _without_compressor(connection):
+        assert connection._compressor is None
+    assert connection._compressor == 'compressor'
+
+
+def test_without_compressor__connection_without_it_should_be_left_as_is():
+    connection = object()  # e.g., a tornado version that renamed the private attribute
+
+    with _without_compressor(connection):
+        pass
+    with _without_compressor(None):
+        pass
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+from wwwpy.unasync import unasync
+from wwwpy.websocket import WebsocketPool, WebsocketEndpointIO, SlowConsumerPolicy, BroadcastStats, SendBuffer
+
+
+class SlowClient:
+    """Its sends complete only when flush is set, like a client that does not read"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.flush = asyncio.Event()
+        self.endpoint = WebsocketEndpointIO(self._send)
+
+    def _send(self, message: str | bytes | None):
+        if message is None:
+            self.closed = True
+            return None
+        self.sent.append(message)
+        return self.flush.wait()
+
+
+class ProxyFake:
+    def __init__(self, send_endpoint):
+        self.send_endpoint = send_endpoint
+
+    def notify(self, value: int):
+        self.send_endpoint.dispatch('remote.rpc', 'ProxyFake.notify', value)
+
+
+def test_broadcast__should_send_the_same_message_to_all_the_clients():
+    pool = WebsocketPool('/ws')
+
+    @unasync
+    async def broadcast():
+        clients = [SlowClient() for _ in range(3)]
+        for client in clients:
+            client.flush.set()
+            pool.http_route.on_connect(client.endpoint)
+        pool.broadcast('message1')
+        await asyncio.sleep(0)
+        return clients
+
+    clients = broadcast()
+
+    assert [c.sent for c in clients] == [['message1']] * 3
+    assert clients[0].sent[0] is clients[2].sent[0]
+
+
+def test_broadcast_rpc__should_encode_once():
+    pool = WebsocketPool('/ws')
+
+    @unasync
+    async def broadcast():
+        clients = [SlowClient() for _ in range(2)]
+        for client in clients:
+            client.flush.set()
+            pool.http_route.on_connect(client.endpoint)
+        pool.broadcast_rpc(ProxyFake).notify(42)
+        await asyncio.sleep(0)
+        return clients
+
+    first, second = broadcast()
+
+    assert first.sent == ['["remote.rpc", "ProxyFake.notify", [42]]']
+    assert first.sent[0] is second.sent[0]
+
+
+def test_slow_client__should_wait_in_its_queue():
+    pool = WebsocketPool('/ws', max_queue=10)
+
+    @unasync
+    async def broadcast():
+        slow = SlowClient()
+        pool.http_route.on_connect(slow.endpoint)
+        for i in range(3):
+            pool.broadcast(f'm{i}')
+        await asyncio.sleep(0)
+        in_flight = list(slow.sent), pool.broadcast_stats()
+        slow.flush.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return in_flight, slow.sent, pool.broadcast_stats()
+
+    (sent_before, stats_before), sent_after, stats_after = broadcast()
+
+    assert sent_before == ['m0']
+    assert stats_before == BroadcastStats(clients=1, queue_depth=3, max_queue_depth=3, dropped=0, disconnected=0)
+    assert sent_after == ['m0', 'm1', 'm2']
+    assert stats_after.queue_depth == 0
+
+
+def test_slow_client_with_drop__should_miss_the_messages_beyond_the_queue():
+    pool = WebsocketPool('/ws', max_queue=2)
+
+    @unasync
+    async def broadcast():
+        slow, fast = SlowClient(), SlowClient()
+        fast.flush.set()
+        pool.http_route.on_connect(slow.endpoint)
+        pool.http_route.on_connect(fast.endpoint)
+        for i in range(4):
+            pool.broadcast(f'm{i}')
+            await asyncio.sleep(0)
+        slow.flush.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return slow, fast
+
+    slow, fast = broadcast()
+
+    assert fast.sent == ['m0', 'm1', 'm2', 'm3']
+    assert slow.sent == ['m0', 'm1']
+    assert not slow.closed
+    assert pool.broadcast_stats().dropped == 2
+
+
+def test_slow_client_with_disconnect__should_be_disconnected():
+    pool = WebsocketPool('/ws', max_queue=1, slow_consumer=SlowConsumerPolicy.disconnect)
+
+    @unasync
+    async def broadcast():
+        slow = SlowClient()
+        pool.http_route.on_connect(slow.endpoint)
+        pool.broadcast('m0')
+        pool.broadcast('m1')
+        await asyncio.sleep(0)
+        return slow
+
+    slow = broadcast()
+
+    assert slow.closed
+    assert slow.sent == []
+    stats = pool.broadcast_stats()
+    assert (stats.disconnected, stats.queue_depth) == (1, 0)
+
+
+def test_broadcast_from_another_thread__should_be_sent_on_the_loop():
+    pool = WebsocketPool('/ws')
+
+    @unasync
+    async def broadcast():
+        client = SlowClient()
+        client.flush.set()
+        pool.http_route.on_connect(client.endpoint)
+        await asyncio.get_running_loop().run_in_executor(None, pool.broadcast, 'message1')
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return client
+
+    assert broadcast().sent == ['message1']
+
+
+def test_disconnected_client__should_drop_its_queue():
+    pool = WebsocketPool('/ws')
+
+    @unasync
+    async def broadcast():
+        slow = SlowClient()
+        pool.http_route.on_connect(slow.endpoint)
+        pool.broadcast('m0')
+        pool.broadcast('m1')
+        slow.endpoint.on_message(None)
+        await asyncio.sleep(0)
+
+    broadcast()
+
+    assert pool.broadcast_stats() == BroadcastStats(0, 0, 0, 0, 0)
+
+
+def test_to_prometheus():
+    pool = WebsocketPool('/ws')
+
+    text = pool.to_prometheus()
+
+    assert '# TYPE wwwpy_websocket_queue_depth gauge\n' in text
+    assert 'wwwpy_websocket_dropped_total 0\n' in text
+
+
+def _connected(pool: WebsocketPool, count: int) -> list[SlowClient]:
+    clients = [SlowClient() for _ in range(count)]
+    for client in clients:
+        client.flush.set()
+        pool.http_route.on_connect(client.endpoint)
+    return clients
+
+
+def test_client_id__should_find_the_endpoint():
+    pool = WebsocketPool('/ws')
+    first, second = _connected(pool, 2)
+
+    first_id = pool.client_id(first.endpoint)
+
+    assert first_id != pool.client_id(second.endpoint)
+    assert pool.endpoint(first_id) is first.endpoint
+    assert pool.clients == [first.endpoint, second.endpoint]
+
+
+def test_disconnection__should_remove_the_client_from_the_registry():
+    pool = WebsocketPool('/ws')
+    first, second = _connected(pool, 2)
+    first_id = pool.client_id(first.endpoint)
+    pool.subscribe(first.endpoint, 'orders/42')
+    pool.add_key(first.endpoint, 'user:1')
+
+    first.endpoint.on_message(None)
+
+    assert pool.clients == [second.endpoint]
+    assert pool.endpoint(first_id) is None
+    assert pool.topic_counts() == {}
+    assert len(pool.keyed('user:1')) == 0
+
+
+def test_topic_rpc__should_reach_only_the_subscribers():
+    pool = WebsocketPool('/ws')
+
+    @unasync
+    async def push():
+        subscriber, other = _connected(pool, 2)
+        pool.subscribe(subscriber.endpoint, 'orders/42')
+        pool.subscribe(other.endpoint, 'orders/43')
+        pool.topic('orders/42').rpc(ProxyFake).notify(1)
+        await asyncio.sleep(0)
+        return subscriber, other
+
+    subscriber, other = push()
+
+    assert subscriber.sent == ['["remote.rpc", "ProxyFake.notify", [1]]']
+    assert other.sent == []
+
+
+def test_unsubscribe__should_stop_the_messages():
+    pool = WebsocketPool('/ws')
+
+    @unasync
+    async def push():
+        client, = _connected(pool, 1)
+        pool.subscribe(client.endpoint, 'news')
+        pool.unsubscribe(client.endpoint, 'news')
+        pool.topic('news').broadcast('m0')
+        await asyncio.sleep(0)
+        return client
+
+    assert push().sent == []
+    assert pool.topic_counts() == {}
+
+
+def test_keyed__should_reach_all_the_connections_of_the_key():
+    pool = WebsocketPool('/ws')
+
+    @unasync
+    async def push():
+        tab1, tab2, other = _connected(pool, 3)
+        pool.add_key(tab1.endpoint, 'user:1')
+        pool.add_key(tab2.endpoint, 'user:1')
+        pool.add_key(other.endpoint, 'user:2')
+        pool.keyed('user:1').broadcast('m0')
+        await asyncio.sleep(0)
+        return tab1, tab2, other
+
+    tab1, tab2, other = push()
+
+    assert (tab1.sent, tab2.sent, other.sent) == (['m0'], ['m0'], [])
+
+
+def test_topic_counts__should_be_exported():
+    pool = WebsocketPool('/ws')
+    first, second = _connected(pool, 2)
+    pool.subscribe(first.endpoint, 'a')
+    pool.subscribe(second.endpoint, 'a')
+    pool.subscribe(second.endpoint, 'b')
+
+    assert pool.topic_counts() == {'a': 2, 'b': 1}
+    assert len(pool.topic('a')) == 2
+    assert 'wwwpy_websocket_topic_subscribers{topic="a"} 2\n' in pool.to_prometheus()
+
+
+def test_subscriptions_from_threads__should_not_break_the_fan_out():
+    pool = WebsocketPool('/ws')
+    clients = _connected(pool, 20)
+
+    def churn(client: SlowClient):
+        for i in range(200):
+            pool.subscribe(client.endpoint, f'topic{i % 5}')
+            pool.add_key(client.endpoint, f'key{i % 5}')
+            pool.unsubscribe(client.endpoint, f'topic{(i + 2) % 5}')
+            pool.remove_key(client.endpoint, f'key{(i + 2) % 5}')
+
+    @unasync
+    async def fan_out():
+        threads = [threading.Thread(target=churn, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            for i in range(5):
+                pool.topic(f'topic{i}').broadcast('m')
+                pool.keyed(f'key{i}').broadcast('m')
+            pool.topic_counts()
+            await asyncio.sleep(0)
+        for thread in threads:
+            thread.join()
+
+    fan_out()
+
+    assert pool.topic_counts() == {'topic2': 20, 'topic3': 20, 'topic4': 20}
+
+
+def test_send_buffer__should_write_a_burst_from_a_thread_with_one_wakeup():
+    written = []
+
+    @unasync
+    async def send():
+        target = SendBuffer(asyncio.get_running_loop(), written.append)
+
+        def burst():
+            for i in range(100):
+                target.send(f'm{i}')
+
+        thread = threading.Thread(target=burst)
+        thread.start()
+        thread.join()  # the loop is busy meanwhile, as with a burst
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return target.wakeups
+
+    assert send() == 1
+    assert written == [f'm{i}' for i in range(100)]
+
+
+def test_send_buffer__should_await_the_writes_in_order():
+    written = []
+
+    async def write(message):
+        await asyncio.sleep(0)
+        written.append(message)
+
+    @unasync
+    async def send():
+        target = SendBuffer(asyncio.get_running_loop(), write)
+        first = target.send('m0')
+        second = target.send(b'm1')
+        target.send(None)
+        assert first is second
+        await first
+        return target.wakeups
+
+    assert send() == 1
+    assert written == ['m0', b'm1', None]